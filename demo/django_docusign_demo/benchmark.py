@@ -0,0 +1,248 @@
+"""Benchmarks of `django-docusign` hot paths against a fake DocuSign.
+
+:class:`Benchmark` drives :class:`~django_docusign.backend.DocuSignBackend`
+and :class:`~django_docusign_demo.views.SignerReturnView` against a
+:class:`~django_docusign_demo.fakedocusign.FakeDocuSignServer`, and measures
+every call: duration, database queries, requests to DocuSign and peak memory.
+:func:`compare` tells regressions against results of a previous run::
+
+    server = FakeDocuSignServer(latency=0.05)
+    server.start()
+    results = Benchmark(server, iterations=100).run()
+    regressions = compare(results, baseline)
+
+Peak memory is traced with :mod:`tracemalloc`, which slows calls down: use
+``trace_memory=False`` for absolute timings. It includes allocations of the
+fake server, which runs in the same process.
+
+"""
+from __future__ import unicode_literals
+
+import time
+import tracemalloc
+
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django_docusign import api as django_docusign
+
+from django_docusign_demo import models, views
+
+try:
+    from django.urls import reverse
+except ImportError:
+    from django.core.urlresolvers import reverse
+
+#: Metrics compared by :func:`compare`, i.e. the lower the better.
+COMPARED_METRICS = ['p50', 'p90', 'p99', 'queries', 'requests',
+                    'peak_memory']
+
+#: Metrics which are exact counts: any increase is a regression.
+EXACT_METRICS = ['queries']
+
+
+def percentile(values, rank):
+    """Return ``rank`` percentile (0-100) of ``values``, nearest-rank
+    method."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = max(int(round(rank / 100.0 * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class Measurement(object):
+    """Measures of a scenario."""
+    def __init__(self, name):
+        self.name = name
+        #: Duration of every call, in seconds.
+        self.durations = []
+        #: Number of calls which raised an exception.
+        self.errors = 0
+        #: Number of database queries, in total.
+        self.queries = 0
+        #: Number of requests received by fake DocuSign, in total.
+        self.requests = 0
+        #: Peak of memory traced during the scenario, in bytes.
+        self.peak_memory = None
+        #: Duration of the scenario, in seconds.
+        self.elapsed = 0.0
+
+    @property
+    def iterations(self):
+        return len(self.durations)
+
+    def as_dict(self):
+        """Return summary: throughput (calls per second), percentiles of
+        durations (milliseconds), counts per call."""
+        iterations = self.iterations or 1
+        return {
+            'iterations': self.iterations,
+            'errors': self.errors,
+            'throughput': self.iterations / self.elapsed
+            if self.elapsed else 0.0,
+            'p50': percentile(self.durations, 50) * 1000,
+            'p90': percentile(self.durations, 90) * 1000,
+            'p99': percentile(self.durations, 99) * 1000,
+            'queries': self.queries / float(iterations),
+            'requests': self.requests / float(iterations),
+            'peak_memory': self.peak_memory,
+        }
+
+
+class Benchmark(object):
+    """Run scenarios against ``server``, ``iterations`` calls each.
+
+    Every scenario has a ``prepare_<name>`` method, which returns the
+    arguments of calls (it is not measured), and a ``call_<name>`` method.
+    Backends are built with ``backend_options``. Objects are created in the
+    database: run benchmarks in a transaction which is rolled back.
+
+    """
+    #: Names of scenarios.
+    scenarios = ['create_signature', 'post_recipient_view', 'signer_return',
+                 'get_docusign_documents']
+
+    def __init__(self, server, iterations=50, backend_options=None,
+                 signers=2, document=b'%PDF-1.4 benchmark',
+                 trace_memory=True):
+        self.server = server
+        self.iterations = iterations
+        self.backend_options = dict(backend_options or {})
+        self.signers = signers
+        self.document = document
+        self.trace_memory = trace_memory
+        self.backend = self.get_backend()
+        self.request_factory = RequestFactory()
+
+    def get_backend(self):
+        return django_docusign.DocuSignBackend(root_url=self.server.root_url,
+                                               **self.backend_options)
+
+    def run(self, scenarios=None):
+        """Run ``scenarios`` (defaults to all), return dictionary of
+        summaries, by scenario."""
+        return {name: self.run_scenario(name).as_dict()
+                for name in scenarios or self.scenarios}
+
+    def run_scenario(self, name):
+        """Run scenario ``name``, return :class:`Measurement`."""
+        # Preparation calls DocuSign: do not let it fail.
+        error_rate, self.server.error_rate = self.server.error_rate, 0.0
+        try:
+            arguments = getattr(self, 'prepare_{name}'.format(name=name))()
+        finally:
+            self.server.error_rate = error_rate
+        call = getattr(self, 'call_{name}'.format(name=name))
+        measurement = Measurement(name)
+        if self.trace_memory:
+            tracemalloc.start()
+        requests = self.server.requests
+        started = time.perf_counter()
+        try:
+            for argument in arguments:
+                with CaptureQueriesContext(connection) as queries:
+                    call_started = time.perf_counter()
+                    try:
+                        call(argument)
+                    except Exception:
+                        measurement.errors += 1
+                    measurement.durations.append(
+                        time.perf_counter() - call_started)
+                measurement.queries += len(queries)
+            measurement.elapsed = time.perf_counter() - started
+            measurement.requests = self.server.requests - requests
+            if self.trace_memory:
+                measurement.peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            if self.trace_memory:
+                tracemalloc.stop()
+        return measurement
+
+    def create_signature(self):
+        """Return new signature, with document and signers, not sent."""
+        signature_type, _ = models.SignatureType.objects.get_or_create(
+            signature_backend_code='docusign', docusign_template_id='')
+        signature = models.Signature.objects.create(
+            signature_type=signature_type)
+        signature.document.save('benchmark.pdf', ContentFile(self.document))
+        for position in range(1, self.signers + 1):
+            signature.signers.create(
+                full_name='Signer %d' % position,
+                email='signer%d@example.com' % position,
+                signing_order=position)
+        return signature
+
+    def create_signatures(self):
+        """Return :attr:`iterations` signatures, sent to DocuSign."""
+        signatures = [self.create_signature()
+                      for _ in range(self.iterations)]
+        for signature in signatures:
+            self.backend.create_signature(signature)
+        return signatures
+
+    def prepare_create_signature(self):
+        return [self.create_signature() for _ in range(self.iterations)]
+
+    def call_create_signature(self, signature):
+        self.backend.create_signature(signature)
+
+    def prepare_post_recipient_view(self):
+        return [signature.signers.order_by('signing_order').first()
+                for signature in self.create_signatures()]
+
+    def call_post_recipient_view(self, signer):
+        self.backend.post_recipient_view(
+            signer, signer_return_url='https://example.com/return')
+
+    def prepare_signer_return(self):
+        signers = self.prepare_post_recipient_view()
+        for signer in signers:
+            envelope = self.server.envelopes[
+                signer.signature.signature_backend_id]
+            envelope['signers'][0]['status'] = 'completed'
+        return signers
+
+    def call_signer_return(self, signer):
+        url = reverse('anysign:signer_return', args=[signer.pk])
+        request = self.request_factory.get(url, {'event': 'signing_complete'})
+        request.session = {'root_url': self.server.root_url}
+        views.SignerReturnView.as_view()(request, pk=signer.pk)
+
+    def prepare_get_docusign_documents(self):
+        return self.create_signatures()
+
+    def call_get_docusign_documents(self, signature):
+        for document in self.backend.get_docusign_documents(signature):
+            document.read()
+            document.close()
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Return list of regressions of ``results`` against ``baseline``, as
+    messages.
+
+    Metrics of :data:`COMPARED_METRICS` regress when they exceed baseline by
+    more than ``tolerance`` (a fraction), or at all for
+    :data:`EXACT_METRICS`. Scenarios missing from ``baseline`` are ignored.
+
+    """
+    regressions = []
+    for name, summary in sorted(results.items()):
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for metric in COMPARED_METRICS:
+            value = summary.get(metric)
+            previous = reference.get(metric)
+            if value is None or previous is None:
+                continue
+            allowed = previous if metric in EXACT_METRICS \
+                else previous * (1 + tolerance)
+            if value > allowed:
+                regressions.append(
+                    '{name}: {metric} {value:.2f} > {previous:.2f} '
+                    '(baseline)'.format(name=name, metric=metric, value=value,
+                                        previous=previous))
+    return regressions
@@ -0,0 +1,413 @@
+"""Local stand-in for DocuSign's REST API, for tests.
+
+It implements the few endpoints used by `django-docusign`, keeps envelopes
+in memory, and can simulate latency and errors::
+
+    server = FakeDocuSignServer(latency=0.1, error_rate=0.01)
+    server.start()
+    backend = DocuSignBackend(root_url=server.root_url)
+    ...
+    server.stop()
+
+"""
+from __future__ import unicode_literals
+
+import datetime
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from django_docusign.sync import parse_date
+
+#: Account ID returned by ``/login_information``.
+ACCOUNT_ID = 'fake-account'
+
+#: Smallest valid PNG image (1x1 pixel).
+PNG = (
+    b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01'
+    b'\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\rIDATx\x9cc\xf8\x0f'
+    b'\x00\x00\x01\x01\x00\x05\x18\xd8N\x00\x00\x00\x00IEND\xaeB`\x82'
+)
+
+
+class FakeDocuSignHandler(BaseHTTPRequestHandler):
+    """Route requests to :class:`FakeDocuSignServer` methods."""
+    routes = [
+        ('POST', r'/oauth/token$', 'oauth_token'),
+        ('GET', r'/oauth/userinfo$', 'oauth_userinfo'),
+        ('GET', r'/login_information$', 'login_information'),
+        ('POST', r'/accounts/[^/]+/envelopes$', 'create_envelope'),
+        ('GET', r'/accounts/[^/]+/envelopes$', 'list_envelopes'),
+        ('GET', r'/accounts/[^/]+/envelopes/(?P<envelope_id>[^/]+)'
+                r'/recipients$', 'get_recipients'),
+        ('GET', r'/accounts/[^/]+/envelopes/(?P<envelope_id>[^/]+)'
+                r'/documents$', 'get_document_list'),
+        ('GET', r'/accounts/[^/]+/envelopes/(?P<envelope_id>[^/]+)'
+                r'/documents/(?P<document_id>[^/]+)$', 'get_document'),
+        ('GET', r'/accounts/[^/]+/envelopes/(?P<envelope_id>[^/]+)'
+                r'/documents/(?P<document_id>[^/]+)/pages/(?P<page>[^/]+)'
+                r'/page_image$', 'get_page_image'),
+        ('POST', r'/accounts/[^/]+/envelopes/(?P<envelope_id>[^/]+)'
+                 r'/views/recipient$', 'post_recipient_view'),
+        ('GET', r'/accounts/[^/]+/templates/(?P<template_id>[^/]+)$',
+         'get_template'),
+        ('POST', r'/accounts/[^/]+/templates$', 'create_template'),
+        ('GET', r'/accounts/[^/]+/templates$', 'list_templates'),
+    ]
+
+    def log_message(self, format, *args):
+        """Be quiet."""
+
+    def route(self, method):
+        server = self.server.fake
+        path, _, query = self.path.partition('?')
+        if path.startswith(server.prefix):
+            path = path[len(server.prefix):]
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('multipart/'):
+            body = server.parse_multipart(body, content_type)
+        for route_method, pattern, name in self.routes:
+            match = re.match(pattern, path)
+            if route_method == method and match and server.take_failure():
+                result = (503, 'application/json',
+                          {'errorCode': 'SERVICE_UNAVAILABLE'})
+                break
+            if route_method == method and match:
+                with server.track():
+                    result = getattr(server, name)(
+                        body=body, query=parse_qs(query),
+                        headers=self.headers, **match.groupdict())
+                break
+        else:
+            result = (404, 'application/json', {'errorCode': 'NOT_FOUND'})
+        status, content_type, content = result[:3]
+        if content_type == 'application/json':
+            content = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        headers = dict(result[3]) if len(result) > 3 else {}
+        headers.update(server.rate_limit_headers())
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self.route('GET')
+
+    def do_POST(self):
+        self.route('POST')
+
+
+class FakeDocuSignServer(object):
+    """In-memory DocuSign API, served in a thread.
+
+    Every request waits ``latency`` seconds before it gets a response.
+    Requests fail with "503 Service Unavailable" at random, with probability
+    ``error_rate``, or while ``failures`` is positive. Attribute
+    ``max_concurrency`` records the maximum number of requests that were
+    processed at the same time. Documents have ``pages`` pages.
+    Documents and page images have an ETag, and ``not_modified`` counts
+    "304 Not Modified" responses.
+
+    OAuth2 JWT grant is served at :attr:`base_uri`, ``/oauth/*``: tokens
+    last ``token_lifetime`` seconds, and ``tokens`` records the ones issued.
+    Users have access to ``accounts``, the first one is their default.
+
+    """
+    prefix = '/restapi/v2'
+
+    def __init__(self, latency=0.0, document=b'%PDF-1.4 fake', pages=10,
+                 error_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.document = document
+        self.pages = pages
+        self.envelopes = {}
+        self.uploads = []
+        self.templates = {}
+        self.clock = datetime.datetime(2020, 1, 1,
+                                       tzinfo=datetime.timezone.utc)
+        self.requests = 0
+        self.not_modified = 0
+        self.failures = 0
+        self.token_lifetime = 3600
+        self.tokens = []
+        self.accounts = [ACCOUNT_ID]
+        self.rate_limit = None
+        self.rate_limit_remaining = None
+        self.concurrency = 0
+        self.max_concurrency = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    @property
+    def base_uri(self):
+        return 'http://{host}:{port}'.format(
+            host=self._httpd.server_address[0],
+            port=self._httpd.server_address[1])
+
+    @property
+    def root_url(self):
+        return '{base_uri}{prefix}'.format(base_uri=self.base_uri,
+                                           prefix=self.prefix)
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0),
+                                          FakeDocuSignHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        thread = threading.Thread(target=self._httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def track(self):
+        """Context manager that simulates latency and counts requests."""
+        server = self
+
+        class Tracker(object):
+            def __enter__(self):
+                with server._lock:
+                    server.requests += 1
+                    server.concurrency += 1
+                    server.max_concurrency = max(server.max_concurrency,
+                                                 server.concurrency)
+                if server.latency:
+                    time.sleep(server.latency)
+
+            def __exit__(self, *exc_info):
+                with server._lock:
+                    server.concurrency -= 1
+
+        return Tracker()
+
+    def take_failure(self):
+        """Return whether request fails with "503 Service Unavailable", i.e.
+        whether ``failures`` requests are still to fail, or at random."""
+        with self._lock:
+            if self.failures > 0:
+                self.failures -= 1
+                self.requests += 1
+                return True
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.requests += 1
+                return True
+        return False
+
+    def rate_limit_headers(self):
+        """Return ``X-RateLimit-*`` headers, if ``rate_limit`` is set.
+
+        Every request takes one of ``rate_limit_remaining`` calls, reset an
+        hour later.
+
+        """
+        if self.rate_limit is None:
+            return {}
+        with self._lock:
+            if self.rate_limit_remaining is None:
+                self.rate_limit_remaining = self.rate_limit
+            self.rate_limit_remaining = max(self.rate_limit_remaining - 1, 0)
+            remaining = self.rate_limit_remaining
+        return {'X-RateLimit-Limit': str(self.rate_limit),
+                'X-RateLimit-Remaining': str(remaining),
+                'X-RateLimit-Reset': str(int(time.time()) + 3600)}
+
+    def touch(self, envelope_id, status=None):
+        """Change ``status`` of envelope, return date of change."""
+        envelope = self.envelopes[envelope_id]
+        with self._lock:
+            self.clock += datetime.timedelta(seconds=1)
+            # DocuSign's format: 7 fractional digits, "Z".
+            envelope['statusChangedDateTime'] = self.clock.strftime(
+                '%Y-%m-%dT%H:%M:%S.%f0Z')
+        if status is not None:
+            envelope['status'] = status
+        return envelope['statusChangedDateTime']
+
+    def parse_multipart(self, body, content_type):
+        """Record documents of multipart ``body`` in ``uploads``, return
+        first part (JSON)."""
+        boundary = content_type.split('boundary=', 1)[1].encode('ascii')
+        parts = body.split(b'--' + boundary)[1:-1]
+        definition = None
+        for part in parts:
+            headers, _, payload = part[2:].partition(b'\r\n\r\n')
+            payload = payload[:-2]  # Trailing CRLF.
+            if definition is None:
+                definition = payload
+            else:
+                self.uploads.append({'headers': headers.decode('utf-8'),
+                                     'content': payload})
+        return definition
+
+    def oauth_token(self, body, query, headers):
+        data = parse_qs(body.decode('utf-8'))
+        if data.get('grant_type') != [
+                'urn:ietf:params:oauth:grant-type:jwt-bearer'] \
+                or not data.get('assertion'):
+            return 400, 'application/json', {'error': 'invalid_grant'}
+        with self._lock:
+            token = 'fake-token-{number}'.format(number=len(self.tokens) + 1)
+            self.tokens.append(token)
+        return 200, 'application/json', {
+            'access_token': token,
+            'token_type': 'Bearer',
+            'expires_in': self.token_lifetime,
+        }
+
+    def oauth_userinfo(self, body, query, headers):
+        token = headers.get('Authorization', '').replace('Bearer ', '', 1)
+        if token not in self.tokens:
+            return 401, 'application/json', {'error': 'invalid_token'}
+        return 200, 'application/json', {
+            'sub': 'fake-user',
+            'accounts': [{'account_id': account_id, 'is_default': not index,
+                          'base_uri': self.base_uri}
+                         for index, account_id in enumerate(self.accounts)],
+        }
+
+    def login_information(self, body, query, headers):
+        return 200, 'application/json', {
+            'loginAccounts': [{'accountId': ACCOUNT_ID}],
+        }
+
+    def create_envelope(self, body, query, headers):
+        data = json.loads(body.decode('utf-8'))
+        envelope_id = str(uuid.uuid4())
+        signers = data.get('recipients', {}).get('signers', []) \
+            or data.get('templateRoles', [])
+        documents = data.get('documents', [])
+        for composite in data.get('compositeTemplates', []):
+            for template in composite.get('serverTemplates', []):
+                documents = documents \
+                    + self.templates[template['templateId']]['documents']
+            for template in composite.get('inlineTemplates', []):
+                documents = documents + template.get('documents', [])
+                if not signers:
+                    signers = template.get('recipients', {}) \
+                        .get('signers', [])
+        self.envelopes[envelope_id] = {
+            'signers': [
+                {'clientUserId': str(signer.get('clientUserId')),
+                 'email': signer.get('email'),
+                 'name': signer.get('name'),
+                 'recipientId': str(signer.get('recipientId', index)),
+                 'routingOrder': str(signer.get('routingOrder', index)),
+                 'status': 'sent'}
+                for index, signer in enumerate(signers, 1)
+            ],
+            'documents': [
+                {'documentId': str(document['documentId']),
+                 'name': document.get('name', '')}
+                for document in documents
+            ] or [{'documentId': '1', 'name': 'document.pdf'}],
+            'request': data,
+        }
+        self.touch(envelope_id, 'sent')
+        return 201, 'application/json', {'envelopeId': envelope_id}
+
+    def list_envelopes(self, body, query, headers):
+        from_date = parse_date(query['from_date'][0])
+        start = int(query.get('start_position', ['0'])[0])
+        count = int(query.get('count', ['100'])[0])
+        envelopes = sorted(
+            [{'envelopeId': envelope_id,
+              'status': envelope['status'],
+              'statusChangedDateTime': envelope['statusChangedDateTime'],
+              'recipients': {'signers': envelope['signers']}}
+             for envelope_id, envelope in self.envelopes.items()
+             if parse_date(envelope['statusChangedDateTime']) >= from_date],
+            key=lambda envelope: parse_date(
+                envelope['statusChangedDateTime']))
+        page = envelopes[start:start + count]
+        return 200, 'application/json', {
+            'envelopes': page,
+            'resultSetSize': str(len(page)),
+            'totalSetSize': str(len(envelopes)),
+            'startPosition': str(start),
+            'endPosition': str(start + len(page) - 1),
+        }
+
+    def get_recipients(self, body, query, headers, envelope_id):
+        envelope = self.envelopes.get(envelope_id, {'signers': []})
+        return 200, 'application/json', {'signers': envelope['signers']}
+
+    def get_document_list(self, body, query, headers, envelope_id):
+        envelope = self.envelopes.get(envelope_id, {'documents': []})
+        documents = envelope['documents'] + [{'documentId': 'certificate'}]
+        return 200, 'application/json', {'envelopeDocuments': documents}
+
+    def conditional(self, headers, content_type, content):
+        """Return response for ``content``, with ETag, or "304 Not Modified"
+        if request's ``If-None-Match`` matches."""
+        etag = '"{digest}"'.format(digest=hashlib.sha1(content).hexdigest())
+        if headers.get('If-None-Match') == etag:
+            self.not_modified += 1
+            return 304, content_type, b'', {'ETag': etag}
+        return 200, content_type, content, {'ETag': etag}
+
+    def get_document(self, body, query, headers, envelope_id, document_id):
+        return self.conditional(headers, 'application/pdf', self.document)
+
+    def get_page_image(self, body, query, headers, envelope_id, document_id,
+                       page):
+        if int(page) > self.pages:
+            return 400, 'application/json', {'errorCode': 'INVALID_PAGE'}
+        return self.conditional(headers, 'image/png', PNG)
+
+    def post_recipient_view(self, body, query, headers, envelope_id):
+        data = json.loads(body.decode('utf-8'))
+        return 201, 'application/json', {
+            'url': 'https://fake.docusign.net/signing/{envelope}/{user}'
+                   .format(envelope=envelope_id, user=data['clientUserId']),
+        }
+
+    def get_template(self, body, query, headers, template_id):
+        return 200, 'application/json', {
+            'recipients': {
+                'signers': [{'roleName': 'Signer %d' % position}
+                            for position in range(1, 11)],
+            },
+        }
+
+    def create_template(self, body, query, headers):
+        data = json.loads(body.decode('utf-8'))
+        template_id = str(uuid.uuid4())
+        self.templates[template_id] = {
+            'name': data['envelopeTemplateDefinition']['name'],
+            'description': data['envelopeTemplateDefinition'].get(
+                'description', ''),
+            'documents': [
+                {'documentId': str(document['documentId']),
+                 'name': document.get('name', '')}
+                for document in data.get('documents', [])
+            ],
+        }
+        return 201, 'application/json', {'templateId': template_id}
+
+    def list_templates(self, body, query, headers):
+        search_text = query.get('search_text', [''])[0]
+        templates = [
+            {'templateId': template_id, 'name': template['name'],
+             'description': template['description']}
+            for template_id, template in self.templates.items()
+            if search_text in template['name']
+        ]
+        return 200, 'application/json', {
+            'envelopeTemplates': templates,
+            'resultSetSize': str(len(templates)),
+        }
@@ -0,0 +1,112 @@
+"""Management command to benchmark `django-docusign` against a fake
+DocuSign."""
+from __future__ import unicode_literals
+
+import json
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from django_docusign_demo.benchmark import Benchmark, compare
+from django_docusign_demo.fakedocusign import FakeDocuSignServer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark DocuSignBackend hot paths against a fake DocuSign.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            choices=Benchmark.scenarios,
+            help='Scenario to run, repeat for several. Defaults to all.')
+        parser.add_argument(
+            '--iterations', type=int, default=50,
+            help='Number of calls per scenario. Defaults to 50.')
+        parser.add_argument(
+            '--latency', type=float, default=0.0,
+            help='Seconds fake DocuSign waits before every response.')
+        parser.add_argument(
+            '--error-rate', type=float, default=0.0,
+            help='Probability (0-1) fake DocuSign answers 503.')
+        parser.add_argument(
+            '--document-size', type=int, default=1024,
+            help='Size of documents, in bytes. Defaults to 1024.')
+        parser.add_argument(
+            '--signers', type=int, default=2,
+            help='Number of signers per signature. Defaults to 2.')
+        parser.add_argument(
+            '--retries', type=int, default=0,
+            help='Retries of failed DocuSign calls.')
+        parser.add_argument(
+            '--no-memory', action='store_false', dest='trace_memory',
+            help='Do not trace peak memory, which slows calls down.')
+        parser.add_argument(
+            '--seed', type=int,
+            help='Seed of random errors.')
+        parser.add_argument(
+            '--baseline',
+            help='JSON file of results to compare with.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Allowed increase of metrics over baseline, as a fraction. '
+                 'Defaults to 0.25.')
+        parser.add_argument(
+            '--save-baseline',
+            help='JSON file where results are written.')
+
+    def handle(self, *args, **options):
+        document = b'%PDF-1.4 ' + b'x' * max(options['document_size'] - 9, 0)
+        server = FakeDocuSignServer(latency=options['latency'],
+                                    document=document,
+                                    error_rate=options['error_rate'],
+                                    seed=options['seed'])
+        media_root = tempfile.mkdtemp()
+        server.start()
+        try:
+            with override_settings(DOCUSIGN_ROOT_URL=server.root_url,
+                                   MEDIA_ROOT=media_root), \
+                    transaction.atomic():
+                benchmark = Benchmark(
+                    server,
+                    iterations=options['iterations'],
+                    backend_options={'retries': options['retries'],
+                                     'retry_backoff': 0.01},
+                    signers=options['signers'],
+                    document=document,
+                    trace_memory=options['trace_memory'])
+                results = benchmark.run(options['scenarios'])
+                transaction.set_rollback(True)
+        finally:
+            server.stop()
+            shutil.rmtree(media_root)
+        self.write_results(results)
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline_file:
+                json.dump(results, baseline_file, indent=2, sort_keys=True)
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = compare(results, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n'
+                                   + '\n'.join(regressions))
+            self.stdout.write('No regression against baseline.')
+
+    def write_results(self, results):
+        self.stdout.write(
+            '{:<24} {:>6} {:>7} {:>9} {:>8} {:>8} {:>8} {:>8} {:>9} {:>10}'
+            .format('scenario', 'calls', 'errors', 'calls/s', 'p50 ms',
+                    'p90 ms', 'p99 ms', 'queries', 'requests', 'peak KiB'))
+        for name, summary in sorted(results.items()):
+            peak_memory = summary['peak_memory']
+            self.stdout.write(
+                '{name:<24} {iterations:>6} {errors:>7} {throughput:>9.1f} '
+                '{p50:>8.2f} {p90:>8.2f} {p99:>8.2f} {queries:>8.1f} '
+                '{requests:>9.1f} {peak:>10}'.format(
+                    name=name,
+                    peak='-' if peak_memory is None
+                    else '{:.0f}'.format(peak_memory / 1024.0),
+                    **summary))
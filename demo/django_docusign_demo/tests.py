@@ -1,16 +1,61 @@
 # coding=utf8
 from __future__ import unicode_literals
 
+import asyncio
+import base64
+import datetime
+import hashlib
+import hmac
+import io
+import json
 import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
 import uuid
 from contextlib import contextmanager
 
 import django.test
+import pydocusign
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import CommandError, call_command
 from django.test.utils import override_settings
 from django_docusign import api as django_docusign
+from django_docusign import views as docusign_views
+from django_docusign.auth import JWTTokenProvider, jwt
+from django_docusign.async_backend import AsyncDocuSignBackend, httpx
+from django_docusign.cache import (DjangoCache, LRUCache, SizedLRUCache,
+                                   reset_caches)
+from django_docusign.client import (ClientPool, DocuSignClient,
+                                    reset_client_pool)
+from django_docusign.dedup import DocumentIndex, hash_stream
+from django_docusign.documents import (DocumentIntegrityError,
+                                       MultipartEnvelopeBody, SpooledDocument,
+                                       spool_document)
+from django_docusign.instrumentation import reset_observers, start_call
+from django_docusign.resilience import (CircuitBreaker, CircuitOpen,
+                                        get_operation, reset_circuit_breakers)
+from django_docusign.signals import docusign_call
+from django_docusign.sync import (CacheCheckpoint, EnvelopeSync,
+                                  FileCheckpoint, get_checkpoint, parse_date)
+from django_docusign.tasks import reset_task_runner
+from django_docusign.tenants import TenantRouter, reset_tenant_router
+from django_docusign.throttle import (CacheBucketStore, FileBucketStore,
+                                      LocalBucketStore, RateLimiter,
+                                      RateLimitExceeded, reset_bucket_store)
 
 from django_docusign_demo import models, views
+from django_docusign_demo.benchmark import Benchmark, compare, percentile
+from django_docusign_demo.fakedocusign import PNG, FakeDocuSignServer
 
 try:
     from unittest import mock
@@ -401,6 +446,21 @@ class DocuSignBackendTestCase(unittest.TestCase):
             key = key.lower()[len('DOCUSIGN_'):]
             self.assertEqual(getattr(backend.docusign_client, key), value)
 
+    def test_settings_snapshot(self):
+        """Settings are read once, until a DOCUSIGN_* setting changes."""
+        backend = django_docusign.DocuSignBackend()
+        with override_settings(DOCUSIGN_ROOT_URL='http://example.com'):
+            self.assertEqual(backend.get_client_kwargs()['root_url'],
+                             'http://example.com')
+            with mock.patch('django_docusign.backend.settings', object()):
+                self.assertEqual(backend.get_client_kwargs()['root_url'],
+                                 'http://example.com')
+            self.assertEqual(
+                backend.get_client_kwargs(root_url='http://tenant.example.com')
+                ['root_url'], 'http://tenant.example.com')
+        self.assertNotEqual(backend.get_client_kwargs().get('root_url'),
+                            'http://example.com')
+
     def test_setup_priority(self):
         """Explicit arguments have priority over settings."""
         explicit_options = {
@@ -436,3 +496,2146 @@ class DocuSignBackendTestCase(unittest.TestCase):
         backend.get_page_image(signature, 1, 1, 72, 300)
 
         mock_get_page_image.assert_called_once_with(999, 1, 1, 72, 300, None)
+
+
+class ClientPoolTestCase(unittest.TestCase):
+    """Tests around :class:`~django_docusign.client.ClientPool`."""
+    def setUp(self):
+        reset_client_pool()
+        self.addCleanup(reset_client_pool)
+
+    def test_backends_share_client(self):
+        """Backends with same options share the same client."""
+        backend1 = django_docusign.DocuSignBackend(username='johndoe')
+        backend2 = django_docusign.DocuSignBackend(username='johndoe')
+        self.assertIs(backend1.docusign_client, backend2.docusign_client)
+        self.assertIsInstance(backend1.docusign_client, DocuSignClient)
+
+    def test_distinct_options(self):
+        """Backends with distinct options use distinct clients."""
+        backend1 = django_docusign.DocuSignBackend(username='johndoe')
+        backend2 = django_docusign.DocuSignBackend(username='janedoe')
+        self.assertIsNot(backend1.docusign_client, backend2.docusign_client)
+        self.assertEqual(backend2.docusign_client.username, 'janedoe')
+
+    @override_settings(DOCUSIGN_POOL_SIZE=3)
+    def test_pool_size(self):
+        """settings.DOCUSIGN_POOL_SIZE sets size of connection pool."""
+        backend = django_docusign.DocuSignBackend()
+        adapter = backend.docusign_client.session.get_adapter(
+            'https://example.com')
+        self.assertEqual(adapter._pool_maxsize, 3)
+
+    def test_idle_eviction(self):
+        """Clients unused for more than ``max_idle`` seconds are evicted."""
+        pool = ClientPool(max_idle=60)
+        with mock.patch('time.monotonic', return_value=1000):
+            client = pool.get(username='johndoe')
+        with mock.patch('time.monotonic', return_value=1030):
+            self.assertIs(pool.get(username='johndoe'), client)
+        with mock.patch('time.monotonic', return_value=1100):
+            pool.get(username='janedoe')
+            self.assertEqual(len(pool), 1)
+            self.assertIsNot(pool.get(username='johndoe'), client)
+
+    def test_reset(self):
+        """reset_client_pool() drops pooled clients."""
+        client = django_docusign.DocuSignBackend().docusign_client
+        reset_client_pool()
+        self.assertIsNot(django_docusign.DocuSignBackend().docusign_client,
+                         client)
+
+
+def mock_signature(template_id='', signers=2):
+    """Return mock of a Signature with ``signers`` signers."""
+    signature = mock.Mock()
+    signature.signature_backend_id = 'envelope-id'
+    signature.signature_type.docusign_template_id = template_id
+    signature.signers.all.return_value = [
+        mock.Mock(pk=position, email='signer%d@example.com' % position,
+                  full_name='Signer %d' % position, signing_order=position)
+        for position in range(1, signers + 1)
+    ]
+    # As if signers were prefetched.
+    signature._prefetched_objects_cache = {
+        'signers': signature.signers.all.return_value}
+    return signature
+
+
+class TemplateCacheTestCase(unittest.TestCase):
+    """Tests around cache of template definitions."""
+    backend_options = {
+        'root_url': 'http://example.com',
+        'account_id': 'some-uuid',
+    }
+    template_definition = {
+        'recipients': {
+            'signers': [{'roleName': 'Employee'}, {'roleName': 'Manager'}],
+        },
+    }
+
+    def setUp(self):
+        reset_caches()
+        self.addCleanup(reset_caches)
+        patcher = mock.patch('pydocusign.DocuSignClient.get_template',
+                             return_value=self.template_definition)
+        self.mock_get_template = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cached(self):
+        """get_docusign_roles() fetches template definition once."""
+        backend = django_docusign.DocuSignBackend(**self.backend_options)
+        signature = mock_signature(template_id='template-id')
+        backend.get_docusign_roles(signature)
+        roles = django_docusign.DocuSignBackend(**self.backend_options) \
+            .get_docusign_roles(signature)
+        self.mock_get_template.assert_called_once_with('template-id')
+        self.assertEqual([role.roleName for role in roles],
+                         ['Employee', 'Manager'])
+        self.assertEqual(backend.template_cache.hits, 1)
+        self.assertEqual(backend.template_cache.misses, 1)
+
+    def test_invalidate(self):
+        """invalidate_template() removes template definition from cache."""
+        backend = django_docusign.DocuSignBackend(**self.backend_options)
+        backend.get_template_definition('template-id')
+        backend.invalidate_template('template-id')
+        backend.get_template_definition('template-id')
+        self.assertEqual(self.mock_get_template.call_count, 2)
+
+    @override_settings(DOCUSIGN_TEMPLATE_CACHE=False)
+    def test_disabled(self):
+        """settings.DOCUSIGN_TEMPLATE_CACHE=False disables cache."""
+        backend = django_docusign.DocuSignBackend(**self.backend_options)
+        self.assertIsNone(backend.template_cache)
+        backend.get_template_definition('template-id')
+        backend.get_template_definition('template-id')
+        self.assertEqual(self.mock_get_template.call_count, 2)
+
+    @override_settings(DOCUSIGN_TEMPLATE_CACHE_ALIAS='default')
+    def test_django_cache(self):
+        """settings.DOCUSIGN_TEMPLATE_CACHE_ALIAS uses Django's cache."""
+        backend = django_docusign.DocuSignBackend(**self.backend_options)
+        self.assertIsInstance(backend.template_cache, DjangoCache)
+        backend.get_template_definition('template-id')
+        reset_caches()
+        backend = django_docusign.DocuSignBackend(**self.backend_options)
+        backend.get_template_definition('template-id')
+        self.mock_get_template.assert_called_once_with('template-id')
+        backend.invalidate_template('template-id')
+
+    def test_lru_timeout(self):
+        """LRUCache items expire after ``timeout`` seconds."""
+        cache = LRUCache(timeout=60)
+        with mock.patch('time.monotonic', return_value=1000):
+            cache.set('key', 'value')
+        with mock.patch('time.monotonic', return_value=1059):
+            self.assertEqual(cache.get('key'), 'value')
+        with mock.patch('time.monotonic', return_value=1061):
+            self.assertIsNone(cache.get('key'))
+
+    def test_lru_maxsize(self):
+        """LRUCache evicts least recently used items."""
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+
+class RecipientCacheTestCase(unittest.TestCase):
+    """Tests around cache of envelope recipients."""
+    def setUp(self):
+        reset_caches()
+        self.addCleanup(reset_caches)
+        patcher = mock.patch(
+            'pydocusign.DocuSignClient.get_envelope_recipients',
+            return_value={'signers': [
+                {'clientUserId': '1', 'status': 'completed'},
+                {'clientUserId': '2', 'status': 'sent'},
+            ]})
+        self.mock_recipients = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.signature = mock_signature()
+        self.signers = self.signature.signers.all()
+        for signer in self.signers:
+            signer.signature = self.signature
+
+    def test_request_cache(self):
+        """Recipients are fetched once per backend instance."""
+        backend = django_docusign.DocuSignBackend()
+        recipient1 = backend.get_docusign_recipient(self.signers[0])
+        recipient2 = backend.get_docusign_recipient(self.signers[1])
+        self.assertEqual(recipient1['status'], 'completed')
+        self.assertEqual(recipient2['status'], 'sent')
+        self.mock_recipients.assert_called_once_with('envelope-id')
+        # Another backend, i.e. another request, fetches recipients again.
+        django_docusign.DocuSignBackend() \
+            .get_docusign_recipient(self.signers[0])
+        self.assertEqual(self.mock_recipients.call_count, 2)
+
+    @override_settings(DOCUSIGN_RECIPIENT_CACHE='shared')
+    def test_shared_cache(self):
+        """Shared recipient cache is used by every backend instance."""
+        django_docusign.DocuSignBackend() \
+            .get_docusign_recipient(self.signers[0])
+        django_docusign.DocuSignBackend() \
+            .get_docusign_recipient(self.signers[1])
+        self.mock_recipients.assert_called_once_with('envelope-id')
+
+    @override_settings(DOCUSIGN_RECIPIENT_CACHE=None)
+    def test_disabled(self):
+        """settings.DOCUSIGN_RECIPIENT_CACHE=None disables cache."""
+        backend = django_docusign.DocuSignBackend()
+        backend.get_docusign_recipient(self.signers[0])
+        backend.get_docusign_recipient(self.signers[0])
+        self.assertEqual(self.mock_recipients.call_count, 2)
+
+    def test_unknown_signer(self):
+        """get_docusign_recipient() raises exception for unknown signer."""
+        backend = django_docusign.DocuSignBackend()
+        signer = mock.Mock(pk=3, signature=self.signature)
+        with self.assertRaises(Exception):
+            backend.get_docusign_recipient(signer)
+
+    @mock.patch('pydocusign.DocuSignClient.post_recipient_view',
+                return_value={'url': 'https://example.com/signing'})
+    def test_post_recipient_view_invalidates(self, mock_post_view):
+        """post_recipient_view() invalidates cached recipients."""
+        backend = django_docusign.DocuSignBackend()
+        signer = self.signers[0]
+        backend.get_docusign_recipient(signer)
+        url = backend.post_recipient_view(
+            signer, signer_return_url='https://example.com/return')
+        self.assertEqual(url, 'https://example.com/signing')
+        self.mock_recipients.assert_called_once_with('envelope-id')
+        backend.get_docusign_recipient(signer)
+        self.assertEqual(self.mock_recipients.call_count, 2)
+
+
+class CreateSignaturesTestCase(django.test.TestCase):
+    """Tests around ``DocuSignBackend.create_signatures()``."""
+    backend_options = {
+        'root_url': 'http://example.com',
+        'account_id': 'some-uuid',
+    }
+
+    def setUp(self):
+        reset_caches()
+        self.addCleanup(reset_caches)
+        signature_type = models.SignatureType.objects.create(
+            signature_backend_code='docusign',
+            docusign_template_id='template-id')
+        self.signatures = []
+        for position in range(1, 6):
+            signature = models.Signature.objects.create(
+                signature_type=signature_type)
+            signature.signers.create(
+                full_name='Signer %d' % position,
+                email='signer%d@example.com' % position,
+                signing_order=1)
+            self.signatures.append(signature)
+
+    def send(self, envelope):
+        """Fake DocuSign: fails for signer3."""
+        email = envelope.templateRoles[0].email
+        if email == 'signer3@example.com':
+            raise pydocusign.exceptions.DocuSignException('Failure')
+        return 'envelope-' + email
+
+    @mock.patch('pydocusign.DocuSignClient.get_template',
+                return_value={'recipients': {'signers': [{'roleName': 'R'}]}})
+    def test_create_signatures(self, mock_get_template):
+        """create_signatures() registers signatures and collects failures."""
+        backend = django_docusign.DocuSignBackend(**self.backend_options)
+        with mock.patch(
+                'pydocusign.DocuSignClient.create_envelope_from_template',
+                side_effect=self.send):
+            result = backend.create_signatures(self.signatures,
+                                               subject='Bulk',
+                                               max_workers=2)
+        self.assertEqual(len(result.succeeded), 4)
+        self.assertEqual(len(result.failed), 1)
+        self.assertEqual(result.failed[0][0], self.signatures[2])
+        self.assertEqual(len(result.latencies), 5)
+        self.assertGreater(result.throughput, 0)
+        self.assertLessEqual(result.latency_percentile(50),
+                             result.latency_percentile(99))
+        backend_ids = dict(
+            models.Signature.objects.values_list('pk',
+                                                 'signature_backend_id'))
+        self.assertEqual(backend_ids[self.signatures[0].pk],
+                         'envelope-signer1@example.com')
+        self.assertEqual(backend_ids[self.signatures[2].pk], '')
+
+    @mock.patch('pydocusign.DocuSignClient.get_template',
+                return_value={'recipients': {'signers': [{'roleName': 'R'}]}})
+    def test_rate_limit(self, mock_get_template):
+        """create_signatures() sends at most ``rate_limit`` envelopes/sec."""
+        backend = django_docusign.DocuSignBackend(**self.backend_options)
+        with mock.patch(
+                'pydocusign.DocuSignClient.create_envelope_from_template',
+                return_value='envelope-id'), \
+                mock.patch('time.sleep') as mock_sleep:
+            backend.create_signatures(self.signatures, rate_limit=10)
+        total_delay = sum(call[0][0] for call in mock_sleep.call_args_list)
+        self.assertGreater(total_delay, 0.3)
+
+
+class FakeDocuSignMixin(object):
+    """Run :class:`~django_docusign_demo.fakedocusign.FakeDocuSignServer`
+    during tests."""
+    latency = 0.0
+
+    def setUp(self):
+        super(FakeDocuSignMixin, self).setUp()
+        reset_caches()
+        reset_client_pool()
+        self.addCleanup(reset_caches)
+        self.addCleanup(reset_client_pool)
+        self.server = FakeDocuSignServer(latency=self.latency)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+    def create_signature(self, signers=2, template_id=''):
+        signature_type = models.SignatureType.objects.create(
+            signature_backend_code='docusign',
+            docusign_template_id=template_id)
+        signature = models.Signature.objects.create(
+            signature_type=signature_type)
+        if not template_id:
+            signature.document.save('test.pdf',
+                                    ContentFile(b'%PDF-1.4 test'))
+        for position in range(1, signers + 1):
+            signature.signers.create(
+                full_name='Signer %d' % position,
+                email='signer%d@example.com' % position,
+                signing_order=position)
+        return signature
+
+
+@unittest.skipIf(httpx is None, 'httpx is not installed')
+class AsyncDocuSignBackendTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around
+    :class:`~django_docusign.async_backend.AsyncDocuSignBackend`."""
+
+    def get_backend(self, backend_class=AsyncDocuSignBackend):
+        return backend_class(root_url=self.server.root_url)
+
+    def test_concurrent_calls(self):
+        """Concurrent calls overlap."""
+        self.server.latency = 0.2
+        backend = self.get_backend()
+        signature = mock.Mock(signature_backend_id='envelope-id')
+
+        async def get_page_images():
+            await backend.async_client.login_information()
+            return await asyncio.gather(*[
+                backend.aget_page_image(signature, 1, page_no)
+                for page_no in range(1, 6)
+            ])
+
+        started = time.monotonic()
+        images = async_to_sync(get_page_images)()
+        elapsed = time.monotonic() - started
+        self.assertEqual(images, [PNG] * 5)
+        self.assertEqual(self.server.max_concurrency, 5)
+        self.assertLess(elapsed, 1.0)
+
+    def test_signature_workflow(self):
+        """Create signature, post recipient view, get recipient, get
+        documents."""
+        signature = self.create_signature()
+        signer = signature.signers.order_by('signing_order')[0]
+        backend = self.get_backend()
+
+        async def workflow():
+            await backend.acreate_signature(signature, subject='Async')
+            url = await backend.apost_recipient_view(
+                signer, signer_return_url='http://example.com/return')
+            recipient = await backend.aget_docusign_recipient(signer)
+            documents = [document.read() async for document
+                         in backend.aget_docusign_documents(signature)]
+            return url, recipient, documents
+
+        url, recipient, documents = async_to_sync(workflow)()
+        signature.refresh_from_db()
+        self.assertIn(signature.signature_backend_id, self.server.envelopes)
+        self.assertTrue(url.endswith('/%d' % signer.pk))
+        self.assertEqual(recipient['status'], 'sent')
+        self.assertEqual(documents, [self.server.document])
+
+    def test_template_workflow(self):
+        """Create signature from template."""
+        signature = self.create_signature(template_id='template-id')
+        backend = self.get_backend()
+        async_to_sync(backend.acreate_signature)(signature)
+        envelope = self.server.envelopes[signature.signature_backend_id]
+        self.assertEqual(len(envelope['signers']), 2)
+
+    @override_settings(DOCUSIGN_TEMPLATE_CACHE=False)
+    def test_template_fetched_once(self):
+        """Without template cache, template is fetched once, not
+        synchronously."""
+        signature = self.create_signature(template_id='template-id')
+        backend = self.get_backend()
+        with mock.patch('pydocusign.DocuSignClient.get_template') \
+                as get_template:
+            async_to_sync(backend.acreate_signature)(signature)
+        self.assertFalse(get_template.called)
+        self.assertIn(signature.signature_backend_id, self.server.envelopes)
+
+    def test_caches_out_of_event_loop(self):
+        """Caches, which may do blocking I/O, are not used in event
+        loop."""
+        signature = self.create_signature(template_id='template-id')
+        backend = self.get_backend()
+        loops = []
+
+        def get(key, default=None):
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                loops.append(None)
+
+        backend.template_cache = mock.Mock(get=get)
+        backend.recipient_cache = mock.Mock(get=get)
+        async_to_sync(backend.acreate_signature)(signature)
+        async_to_sync(backend.aget_envelope_recipients)(
+            signature.signature_backend_id)
+        self.assertEqual(loops, [None, None])
+
+    def test_document_error(self):
+        """Error responses are not stored as documents."""
+        backend = self.get_backend()
+        self.server.envelopes['envelope-id'] = {'signers': [],
+                                                'documents': []}
+        self.server.failures = 1
+        with self.assertRaises(pydocusign.exceptions.DocuSignException):
+            async_to_sync(backend.async_client.get_envelope_document)(
+                'envelope-id', '1')
+
+    def test_hooks(self):
+        """Synchronous hooks such as get_docusign_tabs() are used."""
+        calls = []
+
+        class Backend(AsyncDocuSignBackend):
+            def get_docusign_tabs(self, signer):
+                calls.append(signer.pk)
+                return []
+
+        signature = self.create_signature()
+        async_to_sync(self.get_backend(Backend).acreate_signature)(signature)
+        self.assertEqual(len(calls), 2)
+
+
+@unittest.skipIf(httpx is None, 'httpx is not installed')
+class AsyncSignerReturnViewTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around
+    :class:`~django_docusign.views.AsyncSignerReturnView`."""
+    def setUp(self):
+        super(AsyncSignerReturnViewTestCase, self).setUp()
+        overrides = override_settings(DOCUSIGN_ROOT_URL=self.server.root_url)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.signature = self.create_signature(signers=1)
+        django_docusign.DocuSignBackend().create_signature(self.signature)
+        self.signer = self.signature.signers.get()
+        self.recipient = self.server.envelopes[
+            self.signature.signature_backend_id]['signers'][0]
+
+    async def get(self, query_string=''):
+        url = reverse('anysign:signer_return_async', args=[self.signer.pk])
+        return await django.test.AsyncClient().get(url + query_string)
+
+    async def test_completed(self):
+        """Signed document is downloaded, statuses are updated."""
+        self.recipient['status'] = 'completed'
+        self.server.document = b'%PDF-1.4 signed'
+        response = await self.get()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            response['Location'],
+            reverse('anysign:signer_signed', args=[self.signer.pk]))
+        await sync_to_async(self.signature.refresh_from_db)()
+        await sync_to_async(self.signer.refresh_from_db)()
+        self.assertEqual(self.signature.status, 'completed')
+        self.assertEqual(self.signer.status, 'completed')
+        with self.signature.document as document:
+            self.assertEqual(document.read(), b'%PDF-1.4 signed')
+
+    async def test_declined(self):
+        """Declined status is recorded."""
+        self.recipient['status'] = 'declined'
+        self.recipient['declinedReason'] = 'No way.'
+        response = await self.get()
+        self.assertEqual(
+            response['Location'],
+            reverse('anysign:signer_declined', args=[self.signer.pk]))
+        await sync_to_async(self.signer.refresh_from_db)()
+        self.assertEqual(self.signer.status, 'declined')
+        self.assertEqual(self.signer.status_details, 'No way.')
+
+    async def test_canceled(self):
+        """Cancel event does not call DocuSign."""
+        requests = self.server.requests
+        response = await self.get('?event=cancel')
+        self.assertEqual(
+            response['Location'],
+            reverse('anysign:signer_canceled', args=[self.signer.pk]))
+        self.assertEqual(self.server.requests, requests)
+
+    async def test_method_not_allowed(self):
+        """POST is rejected with "405 Method Not Allowed"."""
+        url = reverse('anysign:signer_return_async', args=[self.signer.pk])
+        response = await django.test.AsyncClient().post(url)
+        self.assertEqual(response.status_code, 405)
+
+
+class SpoolDocumentTestCase(unittest.TestCase):
+    """Tests around :func:`~django_docusign.documents.spool_document`."""
+    content = b'%PDF-1.4 ' + b'x' * 100000
+
+    def test_spool(self):
+        """Large documents are spooled to disk, checksum is computed."""
+        document = spool_document(io.BytesIO(self.content), chunk_size=4096,
+                                  max_memory_size=10000)
+        self.assertTrue(document.file._rolled)
+        self.assertEqual(document.size, len(self.content))
+        self.assertEqual(document.checksum,
+                         hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(b''.join(document.chunks()), self.content)
+
+    def test_small(self):
+        """Small documents are kept in memory."""
+        document = spool_document(io.BytesIO(b'%PDF-1.4'))
+        self.assertFalse(document.file._rolled)
+        self.assertEqual(document.read(), b'%PDF-1.4')
+
+    def test_size_mismatch(self):
+        """Truncated documents raise DocumentIntegrityError."""
+        stream = io.BytesIO(self.content)
+        stream.headers = {'Content-Length': str(len(self.content) + 1)}
+        with self.assertRaises(DocumentIntegrityError):
+            spool_document(stream)
+
+    def test_checksum_mismatch(self):
+        """Documents not matching expected checksum raise
+        DocumentIntegrityError."""
+        with self.assertRaises(DocumentIntegrityError):
+            spool_document(io.BytesIO(self.content),
+                           expected_checksum=hashlib.sha256().hexdigest())
+
+
+class SaveDocuSignDocumentTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around ``DocuSignBackend.save_docusign_document()``."""
+    def test_save(self):
+        """Document is streamed to storage."""
+        self.server.document = b'%PDF-1.4 ' + b'x' * 200000
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        signature = mock.Mock(signature_backend_id='envelope-id')
+        storage_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, storage_dir)
+        storage = FileSystemStorage(location=storage_dir)
+        name = backend.save_docusign_document(
+            signature, '1', storage, 'signed.pdf',
+            expected_checksum=hashlib.sha256(
+                self.server.document).hexdigest())
+        with storage.open(name) as document:
+            self.assertEqual(document.read(), self.server.document)
+
+
+@override_settings(DOCUSIGN_TASK_RUNNER='django_docusign.tasks.'
+                                        'ImmediateTaskRunner')
+class DeferredSignedDocumentTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around ``SignerReturnView.defer_signed_document``."""
+    def setUp(self):
+        super(DeferredSignedDocumentTestCase, self).setUp()
+        reset_task_runner()
+        self.addCleanup(reset_task_runner)
+        self.addCleanup(caches['default'].clear)
+        self.signature = self.create_signature(signers=1)
+        django_docusign.DocuSignBackend(
+            root_url=self.server.root_url).create_signature(self.signature)
+        self.signer = self.signature.signers.get()
+        self.server.envelopes[self.signature.signature_backend_id][
+            'signers'][0]['status'] = 'completed'
+        self.server.document = b'%PDF-1.4 signed'
+
+    def get(self):
+        request = django.test.RequestFactory().get('/')
+        request.session = {'root_url': self.server.root_url}
+        view = views.SignerReturnView.as_view(defer_signed_document=True)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = view(request, pk=self.signer.pk)
+        return response, callbacks
+
+    def test_deferred(self):
+        """Signer is updated, then document is downloaded once committed."""
+        response, callbacks = self.get()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(callbacks), 1)
+        self.signature.refresh_from_db()
+        self.signer.refresh_from_db()
+        self.assertEqual(self.signer.status, 'completed')
+        self.assertEqual(self.signature.status, 'completed')
+        with self.signature.document as document:
+            self.assertEqual(document.read(), b'%PDF-1.4 signed')
+
+    def test_idempotent(self):
+        """Signer coming back twice does not trigger a second download."""
+        self.get()
+        response, callbacks = self.get()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(callbacks, [])
+
+    def test_failure_releases_key(self):
+        """Failed download can be retried."""
+        with mock.patch.object(views.SignerReturnView, 'get_signed_document',
+                               side_effect=IOError):
+            self.get()
+        self.signature.refresh_from_db()
+        self.assertEqual(self.signature.status, 'draft')
+        response, callbacks = self.get()
+        self.assertEqual(len(callbacks), 1)
+        self.signature.refresh_from_db()
+        self.assertEqual(self.signature.status, 'completed')
+
+    def test_rollback_releases_key(self):
+        """Signer can retry if the transaction fails."""
+        with mock.patch.object(views.SignerReturnView, 'update_signer',
+                               side_effect=IOError):
+            with self.assertRaises(IOError):
+                self.get()
+        response, callbacks = self.get()
+        self.assertEqual(len(callbacks), 1)
+
+    def test_scheduling_failure_releases_key(self):
+        """Signer can retry if the task cannot be scheduled."""
+        with mock.patch.object(views.SignerReturnView,
+                               'schedule_signed_document_task',
+                               side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.get()
+        self.signer.refresh_from_db()
+        self.assertEqual(self.signer.status, 'completed')
+        response, callbacks = self.get()
+        self.assertEqual(len(callbacks), 1)
+        self.signature.refresh_from_db()
+        self.assertEqual(self.signature.status, 'completed')
+
+    def test_lost_task(self):
+        """Signer can retry if the task never ran, once pending key
+        expired."""
+        with override_settings(DOCUSIGN_IDEMPOTENCY_PENDING_TIMEOUT=0.01):
+            with mock.patch.object(views.SignerReturnView,
+                                   'schedule_signed_document_task'):
+                self.get()
+            time.sleep(0.02)
+            response, callbacks = self.get()
+        self.assertEqual(len(callbacks), 1)
+        self.signature.refresh_from_db()
+        self.assertEqual(self.signature.status, 'completed')
+
+    def test_slug(self):
+        """Idempotency key does not depend on URL arguments."""
+        view = views.SignerReturnView(kwargs={'slug': 'signer'})
+        view.get_object = lambda: self.signer
+        self.assertEqual(
+            view.get_idempotency_key(),
+            'docusign:signed-document:{envelope}:{signer}'.format(
+                envelope=self.signature.signature_backend_id,
+                signer=self.signer.pk))
+
+
+class GetDocuSignDocumentsTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around ``DocuSignBackend.get_docusign_documents()``."""
+    latency = 0.2
+
+    def setUp(self):
+        super(GetDocuSignDocumentsTestCase, self).setUp()
+        self.server.envelopes['envelope-id'] = {
+            'signers': [],
+            'documents': [{'documentId': str(document_id)}
+                          for document_id in range(1, 6)],
+        }
+        self.signature = mock.Mock(signature_backend_id='envelope-id')
+
+    def test_parallel(self):
+        """Documents are downloaded concurrently, yielded in order."""
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        backend.docusign_client.login_information()
+        started = time.monotonic()
+        documents = list(backend.get_docusign_documents(self.signature,
+                                                        max_workers=5))
+        elapsed = time.monotonic() - started
+        self.assertEqual([document.name for document in documents],
+                         ['envelope-id-%d.pdf' % document_id
+                          for document_id in range(1, 6)])
+        self.assertEqual(self.server.max_concurrency, 5)
+        self.assertLess(elapsed, 0.2 * 4)
+
+    def test_sequential(self):
+        """Documents downloaded one after another are spooled too."""
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        documents = list(backend.get_docusign_documents(self.signature,
+                                                        max_workers=1))
+        self.assertEqual(len(documents), 5)
+        for document in documents:
+            self.assertIsInstance(document, SpooledDocument)
+            self.assertEqual(document.checksum, hashlib.sha256(
+                self.server.document).hexdigest())
+
+    def test_signed_document(self):
+        """Signed document is returned as is, documents generator is closed.
+        """
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        documents = backend.get_docusign_documents(self.signature,
+                                                   max_workers=5)
+        view = docusign_views.SignerReturnView()
+        view._signature = self.signature
+        view._signature_backend = mock.Mock(
+            get_docusign_documents=mock.Mock(return_value=documents))
+        with mock.patch('django_docusign.views.spool_document') as spool:
+            document = view.get_signed_document()
+        self.assertFalse(spool.called)
+        self.assertEqual(document.read(), self.server.document)
+        self.assertIsNone(documents.gi_frame)
+
+    def test_error(self):
+        """Error responses are not taken for documents."""
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        backend.docusign_client.login_information()
+        self.server.failures = 1
+        with self.assertRaises(pydocusign.exceptions.DocuSignException):
+            backend.download_docusign_document(self.signature, '1')
+
+    def test_signer_completed_closes_document(self):
+        """Signed document is closed once stored, or if storage fails."""
+        view = docusign_views.SignerReturnView()
+        view.replace_document = mock.Mock(side_effect=IOError('Disk full'))
+        document = mock.Mock()
+        with self.assertRaises(IOError):
+            view.signer_completed(document, is_last_signer=False)
+        document.close.assert_called_once_with()
+
+    def test_combined(self):
+        """Combined mode downloads a single document."""
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        backend.docusign_client.login_information()
+        requests = self.server.requests
+        documents = list(backend.get_docusign_documents(self.signature,
+                                                        combined=True))
+        self.assertEqual(len(documents), 1)
+        self.assertEqual(documents[0].read(), self.server.document)
+        self.assertEqual(self.server.requests, requests + 1)
+
+    @unittest.skipIf(httpx is None, 'httpx is not installed')
+    def test_async_parallel(self):
+        """Async documents are downloaded concurrently, yielded in order."""
+        backend = AsyncDocuSignBackend(root_url=self.server.root_url)
+
+        async def get_documents():
+            await backend.async_client.login_information()
+            return [document async for document in
+                    backend.aget_docusign_documents(self.signature,
+                                                    max_workers=5)]
+
+        documents = async_to_sync(get_documents)()
+        self.assertEqual([document.name for document in documents],
+                         ['envelope-id-%d.pdf' % document_id
+                          for document_id in range(1, 6)])
+        self.assertEqual(self.server.max_concurrency, 5)
+
+
+@override_settings(DOCUSIGN_CONNECT_HMAC_KEYS=['old-key', 'secret-key'])
+class DocuSignConnectViewTestCase(django.test.TestCase):
+    """Tests around :class:`~django_docusign.views.DocuSignConnectView`."""
+    def setUp(self):
+        reset_caches()
+        self.addCleanup(reset_caches)
+        signature_type = models.SignatureType.objects.create(
+            signature_backend_code='docusign')
+        self.signature = models.Signature.objects.create(
+            signature_type=signature_type,
+            signature_backend_id='envelope-id')
+        self.signer = self.signature.signers.create(
+            full_name='Signer', email='signer@example.com', signing_order=1)
+
+    def post(self, payload, content_type='text/xml', key='secret-key'):
+        signature = base64.b64encode(
+            hmac.new(key.encode('utf-8'), payload,
+                     hashlib.sha256).digest()).decode('ascii')
+        return self.client.post(reverse('connect'), payload,
+                                content_type=content_type,
+                                HTTP_X_DOCUSIGN_SIGNATURE_1='invalid',
+                                HTTP_X_DOCUSIGN_SIGNATURE_2=signature)
+
+    def fixture(self, name, client_user_id):
+        with open(os.path.join(fixtures_dir, name), 'rb') as fixture:
+            payload = fixture.read()
+        payload = re.sub(b'<EnvelopeID>[^<]+',
+                         b'<EnvelopeID>envelope-id', payload)
+        return re.sub(b'<ClientUserId>[^<]+',
+                      b'<ClientUserId>%d' % client_user_id, payload)
+
+    def test_completed(self):
+        """XML notification updates signers and signature."""
+        response = self.post(self.fixture('callback_completed.xml',
+                                          self.signer.pk))
+        self.assertEqual(response.status_code, 200)
+        self.signer.refresh_from_db()
+        self.signature.refresh_from_db()
+        self.assertEqual(self.signer.status, 'completed')
+        self.assertEqual(self.signature.status, 'completed')
+        self.assertEqual(
+            self.signature.signature_backend.get_envelope_completed(
+                'envelope-id'),
+            datetime.datetime(2014, 9, 16, 3, 28, 35, 863000,
+                              tzinfo=datetime.timezone.utc).timestamp())
+
+    def test_declined(self):
+        """Decline reason is recorded."""
+        self.post(self.fixture('callback_declined.xml', self.signer.pk))
+        self.signer.refresh_from_db()
+        self.assertEqual(self.signer.status, 'declined')
+        self.assertTrue(self.signer.status_details)
+
+    def test_json(self):
+        """JSON notification updates signers and signature."""
+        payload = json.dumps({
+            'event': 'envelope-delivered',
+            'data': {
+                'envelopeId': 'envelope-id',
+                'envelopeSummary': {
+                    'status': 'delivered',
+                    'recipients': {'signers': [
+                        {'clientUserId': str(self.signer.pk),
+                         'status': 'delivered'},
+                        {'clientUserId': '0', 'status': 'sent'},
+                    ]},
+                },
+            },
+        }).encode('utf-8')
+        response = self.post(payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.signer.refresh_from_db()
+        self.signature.refresh_from_db()
+        self.assertEqual(self.signer.status, 'delivered')
+        self.assertEqual(self.signature.status, 'delivered')
+
+    def test_invalid_hmac(self):
+        """Notifications signed with unknown key are rejected."""
+        response = self.post(self.fixture('callback_completed.xml',
+                                          self.signer.pk),
+                             key='unknown-key')
+        self.assertEqual(response.status_code, 403)
+        self.signer.refresh_from_db()
+        self.assertEqual(self.signer.status, 'draft')
+
+    def test_invalid_payload(self):
+        """Malformed notifications are rejected."""
+        response = self.post(b'<DocuSignEnvelopeInformation>')
+        self.assertEqual(response.status_code, 400)
+
+    def test_hmac_before_parsing(self):
+        """Payloads are not parsed unless they are authenticated."""
+        with mock.patch('django_docusign.views.ConnectXMLParser.feed') \
+                as feed:
+            response = self.post(b'<DocuSignEnvelopeInformation>',
+                                 key='unknown-key')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(feed.called)
+
+    @override_settings(DOCUSIGN_CONNECT_MAX_SIZE=100)
+    def test_max_size(self):
+        """Payloads larger than maximum size are rejected."""
+        response = self.post(self.fixture('callback_completed.xml',
+                                          self.signer.pk))
+        self.assertEqual(response.status_code, 413)
+        self.signer.refresh_from_db()
+        self.assertEqual(self.signer.status, 'draft')
+
+    def envelope_json(self, status, client_user_id):
+        return json.dumps({
+            'event': 'envelope-{}'.format(status),
+            'data': {
+                'envelopeId': 'envelope-id',
+                'envelopeSummary': {
+                    'status': status,
+                    'recipients': {'signers': [
+                        {'clientUserId': client_user_id, 'status': status},
+                    ]},
+                },
+            },
+        }).encode('utf-8')
+
+    def test_foreign_client_user_id(self):
+        """Recipients whose clientUserId is not a signer's pk are ignored."""
+        response = self.post(self.envelope_json('delivered', 'external-42'),
+                             content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.signer.refresh_from_db()
+        self.signature.refresh_from_db()
+        self.assertEqual(self.signer.status, 'draft')
+        self.assertEqual(self.signature.status, 'delivered')
+
+    def test_outdated_status(self):
+        """Delayed notifications do not overwrite newer statuses."""
+        self.post(self.fixture('callback_completed.xml', self.signer.pk))
+        response = self.post(self.envelope_json('sent', str(self.signer.pk)),
+                             content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.signer.refresh_from_db()
+        self.signature.refresh_from_db()
+        self.assertEqual(self.signer.status, 'completed')
+        self.assertEqual(self.signature.status, 'completed')
+
+    def test_unknown_envelope(self):
+        """Notifications about unknown envelopes are acknowledged."""
+        self.signature.signature_backend_id = 'other-id'
+        self.signature.save()
+        response = self.post(self.fixture('callback_completed.xml',
+                                          self.signer.pk))
+        self.assertEqual(response.status_code, 200)
+
+
+class EnvelopeSyncTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around :class:`~django_docusign.sync.EnvelopeSync`."""
+    def setUp(self):
+        super(EnvelopeSyncTestCase, self).setUp()
+        self.backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        self.signatures = []
+        for index in range(3):
+            signature = self.create_signature(signers=1)
+            self.backend.create_signature(signature)
+            self.signatures.append(signature)
+        checkpoint_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, checkpoint_dir)
+        self.checkpoint_file = os.path.join(checkpoint_dir, 'checkpoint')
+
+    def complete(self, signature):
+        envelope_id = signature.signature_backend_id
+        self.server.envelopes[envelope_id]['signers'][0]['status'] = \
+            'completed'
+        return self.server.touch(envelope_id, 'completed')
+
+    def test_run(self):
+        """Statuses are updated page by page, checkpoint is saved."""
+        last_change = self.complete(self.signatures[0])
+        sync = EnvelopeSync(self.backend,
+                            checkpoint=FileCheckpoint(self.checkpoint_file),
+                            page_size=2)
+        result = sync.run(from_date='2019-01-01T00:00:00')
+        self.assertEqual(result.envelopes, 3)
+        self.assertEqual(result.pages, 2)
+        self.assertEqual(result.signatures, 3)
+        self.assertEqual(result.signers, 3)
+        self.assertEqual(parse_date(sync.checkpoint.load()),
+                         parse_date(last_change))
+        statuses = dict(models.Signature.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[self.signatures[0].pk], 'completed')
+        self.assertEqual(statuses[self.signatures[1].pk], 'sent')
+        signer = self.signatures[0].signers.get()
+        self.assertEqual(signer.status, 'completed')
+
+    def test_resume(self):
+        """Next run starts from checkpoint."""
+        sync = EnvelopeSync(self.backend,
+                            checkpoint=FileCheckpoint(self.checkpoint_file))
+        sync.run(from_date='2019-01-01T00:00:00')
+        self.complete(self.signatures[1])
+        result = sync.run()
+        self.assertEqual(result.envelopes, 2)  # Checkpoint is inclusive.
+        self.assertEqual(result.signatures, 1)
+        self.signatures[1].refresh_from_db()
+        self.assertEqual(self.signatures[1].status, 'completed')
+
+    def test_parse_date(self):
+        """Dates of DocuSign and checkpoints compare chronologically."""
+        self.assertLess(parse_date('2020-01-01T10:00:00.9000000Z'),
+                        parse_date('2020-01-01T10:00:01+00:00'))
+        self.assertEqual(parse_date('2020-01-01T12:00:00+02:00'),
+                         parse_date('2020-01-01T10:00:00'))
+        with self.assertRaises(ValueError):
+            parse_date('yesterday')
+
+    def test_resume_mixed_formats(self):
+        """Checkpoint in another format than DocuSign's does not skip
+        changes."""
+        last_change = parse_date(self.complete(self.signatures[0]))
+        checkpoint = FileCheckpoint(self.checkpoint_file)
+        checkpoint.save(last_change.isoformat())
+        self.complete(self.signatures[1])
+        result = EnvelopeSync(self.backend, checkpoint=checkpoint).run()
+        self.assertEqual(result.envelopes, 2)
+        self.assertEqual(result.signatures, 2)
+
+    def test_checkpoint_persistent(self):
+        """Checkpoints are not kept in caches lost with the process."""
+        with self.assertRaises(ImproperlyConfigured):
+            get_checkpoint()
+        with self.assertRaises(CommandError):
+            call_command('docusign_sync', stdout=io.StringIO())
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.'
+                           'FileBasedCache',
+                'LOCATION': location}}):
+            self.assertIsInstance(get_checkpoint(), CacheCheckpoint)
+
+    def test_command(self):
+        """docusign_sync command reports throughput."""
+        stdout = io.StringIO()
+        with override_settings(DOCUSIGN_ROOT_URL=self.server.root_url):
+            call_command('docusign_sync', '--from-date=2019-01-01T00:00:00',
+                         '--checkpoint-file', self.checkpoint_file,
+                         stdout=stdout)
+        self.assertIn('Synchronized 3 envelopes', stdout.getvalue())
+        self.assertIn('envelopes/s', stdout.getvalue())
+
+
+class SignerQueriesTestCase(django.test.TestCase):
+    """Signers are fetched once, however many helpers run."""
+    def setUp(self):
+        signature_type = models.SignatureType.objects.create(
+            signature_backend_code='docusign',
+            docusign_template_id='template-id')
+        signature = models.Signature.objects.create(
+            signature_type=signature_type,
+            signature_backend_id='envelope-id')
+        for position in (3, 1, 2):
+            signature.signers.create(
+                full_name='Signer %d' % position,
+                email='signer%d@example.com' % position,
+                signing_order=position)
+        self.signature = models.Signature.objects \
+            .select_related('signature_type').get(pk=signature.pk)
+        self.backend = django_docusign.DocuSignBackend(
+            root_url='http://example.com', account_id='some-uuid')
+        self.backend.template_cache = None
+
+    @mock.patch('pydocusign.DocuSignClient.get_template',
+                return_value={'recipients': {'signers': [
+                    {'roleName': 'Role %d' % position}
+                    for position in range(1, 4)]}})
+    def test_one_query(self, mock_get_template):
+        """Building envelope and checking last signer query signers once."""
+        with self.assertNumQueries(1):
+            envelope = self.backend.build_envelope_from_template(
+                self.signature)
+            self.backend.get_docusign_signers(self.signature)
+            signers = self.backend.get_signers(self.signature)
+            last_signers = [self.backend.is_last_signer(signer)
+                            for signer in signers]
+        self.assertEqual([role.roleName for role in envelope.templateRoles],
+                         ['Role 1', 'Role 2', 'Role 3'])
+        self.assertEqual(last_signers, [False, False, True])
+
+    @mock.patch('pydocusign.DocuSignClient.post_recipient_view',
+                return_value={'url': 'https://example.com/signing'})
+    @mock.patch('pydocusign.DocuSignClient.get_envelope_recipients',
+                return_value={'signers': []})
+    def test_post_recipient_view(self, mock_recipients, mock_post_view):
+        """post_recipient_view() posts signer's row, without fetching other
+        signers nor recipients."""
+        signer = self.signature.signers.get(signing_order=2)
+        signer.signature = self.signature
+        with self.assertNumQueries(0):
+            url = self.backend.post_recipient_view(
+                signer, signer_return_url='https://example.com/return')
+        self.assertEqual(url, 'https://example.com/signing')
+        self.assertFalse(mock_recipients.called)
+        mock_post_view.assert_called_once_with(
+            envelopeId='envelope-id', returnUrl='https://example.com/return',
+            clientUserId=signer.pk, email='signer2@example.com',
+            userId=None, userName='Signer 2')
+
+    @mock.patch('pydocusign.DocuSignClient.post_recipient_view',
+                return_value={'url': 'https://example.com/signing'})
+    @mock.patch('pydocusign.DocuSignClient.get_envelope_recipients',
+                return_value={'signers': []})
+    def test_post_recipient_view_custom(self, mock_recipients,
+                                        mock_post_view):
+        """post_recipient_view() builds every signer if
+        get_docusign_signers() is overridden, without fetching
+        recipients."""
+        class Backend(django_docusign.DocuSignBackend):
+            def get_docusign_signers(self, signature, signers=None):
+                docusign_signers = super(Backend, self).get_docusign_signers(
+                    signature, signers)
+                for docusign_signer in docusign_signers:
+                    docusign_signer.email = 'custom@example.com'
+                return docusign_signers
+
+        backend = Backend(root_url='http://example.com',
+                          account_id='some-uuid')
+        signer = self.signature.signers.get(signing_order=2)
+        signer.signature = self.signature
+        backend.post_recipient_view(
+            signer, signer_return_url='https://example.com/return')
+        self.assertEqual(mock_post_view.call_args[1]['email'],
+                         'custom@example.com')
+        self.assertFalse(mock_recipients.called)
+
+    def test_create_signatures(self):
+        """create_signatures() prefetches signers of every signature."""
+        signatures = list(models.Signature.objects.all())
+        with mock.patch(
+                'pydocusign.DocuSignClient.create_envelope_from_template',
+                return_value='envelope-id'), \
+                mock.patch('pydocusign.DocuSignClient.get_template',
+                           return_value={'recipients': {'signers': [
+                               {'roleName': 'Role'}] * 3}}):
+            # Signature types, signers, bulk update.
+            with self.assertNumQueries(3):
+                self.backend.create_signatures(signatures)
+
+
+class MultipartUploadTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around multipart upload of documents."""
+    def get_envelope(self, data):
+        return pydocusign.Envelope(
+            emailSubject='Multipart',
+            documents=[pydocusign.Document(name='big.pdf', documentId=1,
+                                           data=data)],
+            recipients=[])
+
+    def test_body(self):
+        """Body is iterated by chunks, its size is known in advance."""
+        content = b'%PDF-1.4 ' + b'x' * 300000
+        body = MultipartEnvelopeBody(self.get_envelope(io.BytesIO(content)),
+                                     chunk_size=4096)
+        chunks = list(body)
+        self.assertEqual(len(body), len(b''.join(chunks)))
+        self.assertLessEqual(max(len(chunk) for chunk in chunks[2:]), 4096)
+        self.assertIn(content, b''.join(chunks))
+
+    def test_unknown_size(self):
+        """Size of non-seekable streams is known once body is iterated."""
+        stream = mock.Mock(spec=['read'])
+        stream.read.side_effect = [b'%PDF-1.4', b'']
+        body = MultipartEnvelopeBody(self.get_envelope(stream))
+        self.assertIsNone(body.size)
+        self.assertEqual(len(body), 0)
+        content = b''.join(body)
+        self.assertEqual(body.size, len(content))
+
+    def test_create_signature(self):
+        """settings.DOCUSIGN_MULTIPART_UPLOAD streams documents."""
+        signature = self.create_signature()
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        with override_settings(DOCUSIGN_MULTIPART_UPLOAD=True):
+            envelope = backend.create_signature_from_document(signature)
+        self.assertIn(envelope.envelopeId, self.server.envelopes)
+        self.assertEqual(
+            len(self.server.envelopes[envelope.envelopeId]['signers']), 2)
+        self.assertEqual(len(self.server.uploads), 1)
+        self.assertEqual(self.server.uploads[0]['content'], b'%PDF-1.4 test')
+        self.assertIn('documentid=1', self.server.uploads[0]['headers'])
+        self.assertGreater(envelope.payload_size,
+                           len(b'%PDF-1.4 test'))
+
+    @unittest.skipIf(httpx is None, 'httpx is not installed')
+    def test_async_create_signature(self):
+        """AsyncDocuSignBackend streams documents too."""
+        signature = self.create_signature()
+        backend = AsyncDocuSignBackend(root_url=self.server.root_url)
+        with override_settings(DOCUSIGN_MULTIPART_UPLOAD=True):
+            async_to_sync(backend.acreate_signature)(signature)
+        self.assertIn(signature.signature_backend_id, self.server.envelopes)
+        self.assertEqual(self.server.uploads[0]['content'], b'%PDF-1.4 test')
+
+
+@override_settings(DOCUSIGN_DOCUMENT_INDEX=True,
+                   DOCUSIGN_DOCUMENT_INDEX_ALIAS='default')
+class DocumentIndexTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around :class:`~django_docusign.dedup.DocumentIndex`."""
+    def setUp(self):
+        super(DocumentIndexTestCase, self).setUp()
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+
+    def test_hash_stream(self):
+        """hash_stream() rewinds stream, ignores non-seekable ones."""
+        stream = io.BytesIO(b'%PDF-1.4 test')
+        self.assertEqual(hash_stream(stream, chunk_size=4),
+                         hashlib.sha256(b'%PDF-1.4 test').hexdigest())
+        self.assertEqual(stream.tell(), 0)
+        self.assertIsNone(hash_stream(mock.Mock(spec=['read'])))
+
+    def test_register_repeated_document(self):
+        """Document sent twice is registered as template, then referenced."""
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        requests = []
+        for index in range(3):
+            signature = self.create_signature()
+            envelope = backend.create_signature_from_document(signature)
+            requests.append(
+                self.server.envelopes[envelope.envelopeId]['request'])
+            self.assertEqual(
+                len(self.server.envelopes[envelope.envelopeId]['signers']),
+                2)
+        self.assertEqual(len(self.server.templates), 1)
+        self.assertIn('documents', requests[0])
+        self.assertNotIn('compositeTemplates', requests[0])
+        template_id = list(self.server.templates)[0]
+        for data in requests[1:]:
+            self.assertNotIn('documents', data)
+            composite = data['compositeTemplates'][0]
+            self.assertEqual(composite['serverTemplates'][0]['templateId'],
+                             template_id)
+            self.assertNotIn('documents', composite['inlineTemplates'][0])
+
+    def test_index_lost(self):
+        """Templates are reused when index loses its entries, e.g. in
+        another process."""
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        for index in range(2):
+            backend.create_signature_from_document(self.create_signature())
+        caches['default'].clear()
+        for index in range(3):
+            backend.create_signature_from_document(self.create_signature())
+        self.assertEqual(len(self.server.templates), 1)
+
+    def test_concurrent_senders(self):
+        """Concurrent senders of a document register one template."""
+        self.server.latency = 0.05
+        index = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url).document_index
+        template_ids = []
+
+        def send():
+            document = pydocusign.Document(
+                name='test.pdf', documentId=1,
+                data=io.BytesIO(b'%PDF-1.4 test'))
+            template_ids.append(index.get_template_id(document))
+
+        send()
+        threads = [threading.Thread(target=send) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.server.templates), 1)
+        self.assertEqual(len(set(filter(None, template_ids))), 1)
+
+    @override_settings(DOCUSIGN_DOCUMENT_INDEX_ALIAS=None)
+    def test_shared_cache_required(self):
+        """Index is not kept per process."""
+        with self.assertRaises(ImproperlyConfigured):
+            django_docusign.DocuSignBackend(root_url=self.server.root_url)
+
+    def test_tabbed_document_is_uploaded(self):
+        """Documents referenced by tabs are always uploaded."""
+        index = DocumentIndex(mock.Mock(account_url='http://example.com'),
+                              caches['default'], threshold=1)
+        index.client.find_templates.return_value = []
+        index.client.create_template.return_value = 'template-1'
+        signer = pydocusign.Signer(
+            email='signer@example.com', name='Signer', recipientId=1,
+            tabs=[pydocusign.SignHereTab(documentId=1, pageNumber=1,
+                                         xPosition=1, yPosition=1)])
+        envelope = pydocusign.Envelope(
+            emailSubject='Dedup',
+            documents=[
+                pydocusign.Document(name='tabbed.pdf', documentId=1,
+                                    data=io.BytesIO(b'%PDF-1.4 tabbed')),
+                pydocusign.Document(name='annex.pdf', documentId=2,
+                                    data=io.BytesIO(b'%PDF-1.4 annex')),
+            ],
+            recipients=[signer])
+        data = index.build_request(envelope)
+        index.client.create_template.assert_called_once()
+        uploaded, registered = data['compositeTemplates']
+        inline = uploaded['inlineTemplates'][0]
+        self.assertEqual(
+            [document['name'] for document in inline['documents']],
+            ['tabbed.pdf'])
+        self.assertIn('tabs', inline['recipients']['signers'][0])
+        self.assertEqual(registered['serverTemplates'][0]['templateId'],
+                         'template-1')
+        self.assertNotIn(
+            'tabs',
+            registered['inlineTemplates'][0]['recipients']['signers'][0])
+
+    def test_order(self):
+        """Composite templates keep order and IDs of documents."""
+        index = DocumentIndex(mock.Mock(account_url='http://example.com'),
+                              caches['default'], threshold=1)
+        index.client.find_templates.return_value = []
+        index.client.create_template.side_effect = ['template-2']
+        signer = pydocusign.Signer(
+            email='signer@example.com', name='Signer', recipientId=1,
+            tabs=[pydocusign.SignHereTab(documentId=1, pageNumber=1,
+                                         xPosition=1, yPosition=1),
+                  pydocusign.SignHereTab(documentId=3, pageNumber=1,
+                                         xPosition=1, yPosition=1)])
+        envelope = pydocusign.Envelope(
+            emailSubject='Dedup',
+            documents=[
+                pydocusign.Document(name='first.pdf', documentId=1,
+                                    data=io.BytesIO(b'%PDF-1.4 first')),
+                pydocusign.Document(name='annex.pdf', documentId=2,
+                                    data=io.BytesIO(b'%PDF-1.4 annex')),
+                pydocusign.Document(name='last.pdf', documentId=3,
+                                    data=io.BytesIO(b'%PDF-1.4 last')),
+            ],
+            recipients=[signer])
+        first, annex, last = index.build_request(envelope)[
+            'compositeTemplates']
+        self.assertEqual(
+            [document['documentId']
+             for document in first['inlineTemplates'][0]['documents']],
+            [1])
+        self.assertEqual(annex['serverTemplates'][0]['templateId'],
+                         'template-2')
+        self.assertEqual(
+            index.client.create_template.call_args[1]['document']
+                 .documentId, 2)
+        self.assertEqual(
+            [document['documentId']
+             for document in last['inlineTemplates'][0]['documents']],
+            [3])
+        tabs = last['inlineTemplates'][0]['recipients']['signers'][0]['tabs']
+        self.assertEqual([tab['documentId'] for tab in tabs['signHereTabs']],
+                         [3])
+
+    def test_registration_failure(self):
+        """Documents are uploaded if DocuSign fails to register them."""
+        index = DocumentIndex(mock.Mock(account_url='http://example.com'),
+                              caches['default'], threshold=1)
+        index.client.find_templates.return_value = []
+
+        def create_template(name, document, description=''):
+            document.data.read()
+            raise pydocusign.exceptions.DocuSignException('Unavailable')
+
+        index.client.create_template.side_effect = create_template
+        envelope = pydocusign.Envelope(
+            emailSubject='Dedup',
+            documents=[
+                pydocusign.Document(name='annex.pdf', documentId=1,
+                                    data=io.BytesIO(b'%PDF-1.4 annex')),
+            ],
+            recipients=[])
+        self.assertIsNone(index.build_request(envelope))
+        self.assertEqual(envelope.documents[0].data.read(),
+                         b'%PDF-1.4 annex')
+
+
+class PageImageCacheTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around cache of page images."""
+    def setUp(self):
+        super(PageImageCacheTestCase, self).setUp()
+        reset_task_runner()
+        self.addCleanup(reset_task_runner)
+
+    def test_sized_lru_cache(self):
+        """SizedLRUCache evicts items to stay under ``maxbytes``."""
+        cache = SizedLRUCache(maxbytes=10)
+        cache.set('a', b'aaaa')
+        cache.set('b', b'bbbb')
+        cache.get('a')
+        cache.set('c', b'cccc')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'aaaa')
+        self.assertEqual(cache.size, 8)
+        cache.set('d', b'd' * 11)
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(cache.size, 8)
+
+    @override_settings(DOCUSIGN_PAGE_IMAGE_CACHE=True)
+    def test_get_page_image(self):
+        """Page images are fetched once per set of options."""
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        backend.docusign_client.login_information()
+        signature = mock.Mock(signature_backend_id='envelope-id')
+        requests = self.server.requests
+        for _ in range(3):
+            self.assertEqual(backend.get_page_image(signature, 1, 1, 72), PNG)
+        backend.get_page_image(signature, 1, 1, 150)
+        self.assertEqual(self.server.requests - requests, 2)
+
+    def test_storage_tier(self):
+        """Images evicted from memory are read from storage."""
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        overrides = override_settings(
+            DOCUSIGN_PAGE_IMAGE_CACHE=True,
+            DOCUSIGN_PAGE_IMAGE_CACHE_BYTES=len(PNG),
+            DOCUSIGN_PAGE_IMAGE_STORAGE='django.core.files.storage'
+                                        '.FileSystemStorage',
+            MEDIA_ROOT=location)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        backend.docusign_client.login_information()
+        signature = mock.Mock(signature_backend_id='envelope-id')
+        backend.get_page_image(signature, 1, 1)
+        backend.get_page_image(signature, 1, 2)
+        requests = self.server.requests
+        self.assertEqual(backend.get_page_image(signature, 1, 1), PNG)
+        self.assertEqual(self.server.requests, requests)
+        self.assertTrue(os.path.exists(os.path.join(
+            location, 'docusign', 'page-images', 'fake-account',
+            'envelope-id', '1', '1--x.png')))
+
+    @override_settings(
+        DOCUSIGN_PAGE_IMAGE_CACHE=True,
+        DOCUSIGN_PAGE_IMAGE_PREFETCH=3,
+        DOCUSIGN_PAGE_IMAGE_PREFETCH_OPTIONS={'dpi': 72},
+        DOCUSIGN_TASK_RUNNER='django_docusign.tasks.ImmediateTaskRunner')
+    def test_prefetch_on_create(self):
+        """First pages of new envelopes are fetched in the background."""
+        self.server.pages = 2
+        signature = self.create_signature()
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        backend.create_signature(signature)
+        requests = self.server.requests
+        backend.get_page_image(signature, 1, 1, dpi=72)
+        backend.get_page_image(signature, 1, 2, dpi=72)
+        self.assertEqual(self.server.requests, requests)
+        future = backend.prefetch_page_images(signature, pages=5)
+        self.assertEqual(future.result(), 2)
+
+    @override_settings(DOCUSIGN_PAGE_IMAGE_CACHE=True)
+    def test_prefetch_pending(self):
+        """Pending prefetches are not queued again, other options are."""
+        self.addCleanup(caches['default'].clear)
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        signature = mock.Mock(signature_backend_id='envelope-id')
+        with mock.patch('django_docusign.backend.get_task_runner') as runner:
+            self.assertIsNotNone(
+                backend.prefetch_page_images(signature, pages=2, dpi=72))
+            self.assertIsNone(
+                backend.prefetch_page_images(signature, pages=2, dpi=72))
+            backend.prefetch_page_images(signature, pages=2, dpi=150)
+        calls = runner().apply_async.call_args_list
+        self.assertEqual(len(calls), 2)
+        # Claim is released once done.
+        backend.prefetch_page_images_task(*calls[0][1]['args'])
+        with mock.patch('django_docusign.backend.get_task_runner') as runner:
+            self.assertIsNotNone(
+                backend.prefetch_page_images(signature, pages=2, dpi=72))
+
+
+@override_settings(DOCUSIGN_PAGE_IMAGE_CACHE=True,
+                   DOCUSIGN_PAGE_IMAGE_CACHE_TIMEOUT=0)
+class ConditionalRequestTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around conditional requests and cache validators."""
+    def get_backend(self):
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        backend.docusign_client.login_information()
+        return backend
+
+    def test_revalidate_page_image(self):
+        """Stale page images are revalidated with ETag."""
+        backend = self.get_backend()
+        signature = mock.Mock(signature_backend_id='envelope-id')
+        self.assertEqual(backend.get_page_image(signature, 1, 1), PNG)
+        self.assertEqual(backend.get_page_image(signature, 1, 1), PNG)
+        self.assertEqual(self.server.not_modified, 1)
+
+    def test_completed_envelope(self):
+        """Page images of completed envelopes are not revalidated."""
+        backend = self.get_backend()
+        signature = mock.Mock(signature_backend_id='envelope-id')
+        backend.get_page_image(signature, 1, 1)
+        backend.mark_envelope_completed('envelope-id',
+                                        '2020-01-01T10:00:00.000Z')
+        requests = self.server.requests
+        self.assertEqual(backend.get_page_image(signature, 1, 1), PNG)
+        self.assertEqual(self.server.requests, requests)
+        validators = backend.get_page_image_validators(signature, 1, 1)
+        self.assertEqual(validators['last_modified'], 1577872800)
+        self.assertNotEqual(
+            validators['etag'],
+            backend.get_page_image_validators(signature, 1, 2)['etag'])
+
+    def test_download_document_if_modified(self):
+        """Documents are downloaded again only if they changed."""
+        backend = self.get_backend()
+        signature = mock.Mock(signature_backend_id='envelope-id')
+        document, validators = backend.download_docusign_document_if_modified(
+            signature, '1')
+        with document:
+            self.assertEqual(document.read(), self.server.document)
+        self.assertIn('etag', validators)
+        document, validators = backend.download_docusign_document_if_modified(
+            signature, '1', validators=validators)
+        self.assertIsNone(document)
+        self.assertEqual(self.server.not_modified, 1)
+        backend.mark_envelope_completed('envelope-id')
+        requests = self.server.requests
+        document, _ = backend.download_docusign_document_if_modified(
+            signature, '1', validators=validators)
+        self.assertIsNone(document)
+        self.assertEqual(self.server.requests, requests)
+
+    def test_page_image_view(self):
+        """PageImageView answers "304 Not Modified" to conditional requests.
+        """
+        signature = self.create_signature()
+        signature.signature_backend_id = 'envelope-id'
+        signature.save()
+        session = self.client.session
+        session['root_url'] = self.server.root_url
+        session.save()
+        url = reverse('page_image', kwargs={'pk': signature.pk,
+                                            'document_id': '1',
+                                            'page_no': 1})
+        response = self.client.get(url, {'dpi': 72})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, PNG)
+        response = self.client.get(url, {'dpi': 72},
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(url, {'dpi': 'x'}).status_code, 400)
+        # Completed envelope: no request to DocuSign at all.
+        self.get_backend().mark_envelope_completed('envelope-id')
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        requests = self.server.requests
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.server.requests, requests)
+
+
+class RateLimiterTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around :class:`~django_docusign.throttle.RateLimiter`."""
+    def setUp(self):
+        super(RateLimiterTestCase, self).setUp()
+        reset_bucket_store()
+        self.addCleanup(reset_bucket_store)
+
+    def test_token_bucket(self):
+        """Calls beyond burst wait for tokens, or fail fast."""
+        limiter = RateLimiter(LocalBucketStore(), 'key', rate=10, burst=2)
+        self.assertEqual(limiter.reserve(), 0)
+        self.assertEqual(limiter.reserve(), 0)
+        self.assertAlmostEqual(limiter.reserve(), 0.1, places=2)
+        self.assertAlmostEqual(limiter.reserve(), 0.2, places=2)
+        limiter.block = False
+        with self.assertRaises(RateLimitExceeded) as context:
+            limiter.reserve()
+        self.assertAlmostEqual(context.exception.wait, 0.3, places=2)
+        limiter.block = True
+        limiter.max_wait = 0.1
+        with self.assertRaises(RateLimitExceeded):
+            limiter.reserve()
+
+    def test_shared_stores(self):
+        """Limiters with the same store and key share their bucket."""
+        path = os.path.join(tempfile.mkdtemp(), 'buckets.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        for store in [FileBucketStore(path), CacheBucketStore('default')]:
+            limiters = [RateLimiter(store, 'shared', rate=1, burst=1,
+                                    block=False)
+                        for _ in range(2)]
+            limiters[0].acquire()
+            with self.assertRaises(RateLimitExceeded):
+                limiters[1].acquire()
+        caches['default'].clear()
+
+    def test_cache_store_lock(self):
+        """Cache store gives up on locked buckets, and releases only its own
+        locks."""
+        self.addCleanup(caches['default'].clear)
+        store = CacheBucketStore('default', lock_timeout=0.05)
+        limiter = RateLimiter(store, 'locked', rate=1, burst=1)
+        caches['default'].set('locked:lock', 'other', 10)
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire()
+        self.assertEqual(caches['default'].get('locked:lock'), 'other')
+
+        def take(state):
+            # Lock expired, and another caller claimed it meanwhile.
+            caches['default'].set('locked:lock', 'other', 10)
+            return 'state', 'result'
+        caches['default'].delete('locked:lock')
+        with self.assertRaises(RateLimitExceeded):
+            store.update('locked', take)
+        self.assertIsNone(caches['default'].get('locked'))
+        self.assertEqual(caches['default'].get('locked:lock'), 'other')
+
+    def test_adapt_to_headers(self):
+        """Remaining quota of response headers slows calls down."""
+        limiter = RateLimiter(LocalBucketStore(), 'key', rate=100, burst=10,
+                              block=False)
+        reset = time.time() + 10
+        limiter.observe(200, {'X-RateLimit-Remaining': '5',
+                              'X-RateLimit-Reset': str(reset)})
+        for _ in range(5):
+            limiter.reserve()
+        with self.assertRaises(RateLimitExceeded) as context:
+            limiter.reserve()
+        # 5 calls in 10 seconds.
+        self.assertAlmostEqual(context.exception.wait, 2.0, places=1)
+        limiter.observe(429, {'Retry-After': '30'})
+        with self.assertRaises(RateLimitExceeded) as context:
+            limiter.reserve()
+        self.assertAlmostEqual(context.exception.wait, 30, places=0)
+
+    @override_settings(DOCUSIGN_RATE_LIMIT=100,
+                       DOCUSIGN_RATE_LIMIT_BLOCK=False)
+    def test_client(self):
+        """Client stops calling DocuSign once quota is exhausted."""
+        self.server.rate_limit = 2
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url)
+        backend.docusign_client.login_information()
+        backend.docusign_client.get_envelope_document_list('envelope-id')
+        requests = self.server.requests
+        with self.assertRaises(RateLimitExceeded):
+            backend.docusign_client.get_envelope_document_list('envelope-id')
+        self.assertEqual(self.server.requests, requests)
+
+
+class ResilienceTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around retries, circuit breaker and timeouts."""
+    def setUp(self):
+        super(ResilienceTestCase, self).setUp()
+        reset_circuit_breakers()
+        self.addCleanup(reset_circuit_breakers)
+
+    def get_backend(self, **kwargs):
+        backend = django_docusign.DocuSignBackend(
+            root_url=self.server.root_url, **kwargs)
+        backend.docusign_client.login_information()
+        return backend
+
+    def test_get_operation(self):
+        """Requests are classified by operation."""
+        url = 'https://example.com/restapi/v2/accounts/1/envelopes/2'
+        self.assertEqual(get_operation('GET', url + '/recipients'),
+                         'recipients')
+        self.assertEqual(get_operation('GET', url + '/documents/1'),
+                         'document')
+        self.assertEqual(
+            get_operation('GET', url + '/documents/1/pages/1/page_image'),
+            'page_image')
+        self.assertEqual(get_operation('DELETE', url), 'default')
+
+    def test_timeouts(self):
+        """Timeouts are set per operation, connect timeout apart."""
+        with override_settings(DOCUSIGN_OPERATION_TIMEOUTS={'recipients': 2},
+                               DOCUSIGN_CONNECT_TIMEOUT=1):
+            backend = django_docusign.DocuSignBackend(timeout=30)
+        client = backend.docusign_client
+        self.assertEqual(client.get_operation_timeout('recipients'), (1, 2))
+        self.assertEqual(client.get_operation_timeout('document'), (1, 30))
+        # Upstream API is untouched.
+        self.assertEqual(client.get_timeout(), 30)
+
+    def test_retry_idempotent(self):
+        """GET requests are retried on server errors."""
+        backend = self.get_backend(retries=2, retry_backoff=0)
+        self.server.failures = 2
+        requests = self.server.requests
+        backend.docusign_client.get_envelope_document_list('envelope-id')
+        self.assertEqual(self.server.requests - requests, 3)
+
+    def test_no_retry_post(self):
+        """Envelope creation is not retried on server errors."""
+        backend = self.get_backend(retries=2, retry_backoff=0)
+        self.server.failures = 1
+        with self.assertRaises(pydocusign.exceptions.DocuSignException):
+            backend.create_signature(self.create_signature())
+        self.assertEqual(self.server.envelopes, {})
+        self.assertEqual(self.server.failures, 0)
+
+    def test_circuit_breaker(self):
+        """Circuit opens when error rate crosses threshold, then lets a
+        trial call through after cooldown."""
+        breaker = CircuitBreaker(threshold=0.5, min_calls=4, cooldown=0.05)
+        for failed in [False, True, False]:
+            breaker.before_call()
+            breaker.record(failed)
+        self.assertEqual(breaker.state, 'closed')
+        breaker.record(True)
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()
+        time.sleep(0.06)
+        breaker.before_call()  # Trial call.
+        with self.assertRaises(CircuitOpen):
+            breaker.before_call()
+        breaker.record(False)
+        self.assertEqual(breaker.state, 'closed')
+
+    @override_settings(DOCUSIGN_CIRCUIT_BREAKER=True,
+                       DOCUSIGN_CIRCUIT_BREAKER_MIN_CALLS=2)
+    def test_client_fails_fast(self):
+        """Once circuit is open, client does not call DocuSign."""
+        backend = self.get_backend()
+        self.server.failures = 2
+        for _ in range(2):
+            with self.assertRaises(pydocusign.exceptions.DocuSignException):
+                backend.docusign_client.get_envelope_document_list('id')
+        requests = self.server.requests
+        with self.assertRaises(CircuitOpen):
+            backend.docusign_client.get_envelope_document_list('id')
+        self.assertEqual(self.server.requests, requests)
+
+
+#: Calls recorded by :func:`record_call`.
+observed_calls = []
+
+
+def record_call(call):
+    """Instrumentation observer used in tests."""
+    observed_calls.append(call)
+
+
+def failing_observer(call):
+    raise RuntimeError('Observer failure')
+
+
+class InstrumentationTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around instrumentation of DocuSign calls."""
+    def setUp(self):
+        super(InstrumentationTestCase, self).setUp()
+        reset_observers()
+        self.addCleanup(reset_observers)
+        del observed_calls[:]
+        self.calls = []
+
+        def receiver(sender, call, **kwargs):
+            self.calls.append(call)
+
+        self.receiver = receiver
+        docusign_call.connect(receiver)
+        self.addCleanup(docusign_call.disconnect, receiver)
+
+    def get_backend(self, backend_class=django_docusign.DocuSignBackend,
+                    **kwargs):
+        backend = backend_class(root_url=self.server.root_url, **kwargs)
+        backend.docusign_client.login_information()
+        return backend
+
+    def test_disabled(self):
+        """Calls are not measured when nobody listens."""
+        docusign_call.disconnect(self.receiver)
+        self.assertIsNone(start_call(DocuSignClient, 'default', 'GET', '/'))
+
+    def test_signal(self):
+        """Every call is reported with operation, envelope, status code,
+        retries, duration and size."""
+        backend = self.get_backend(retries=1, retry_backoff=0)
+        self.server.failures = 1
+        del self.calls[:]
+        backend.docusign_client.get_envelope_document_list('envelope-id')
+        self.assertEqual(len(self.calls), 1)
+        call = self.calls[0]
+        self.assertEqual(call.sender, DocuSignClient)
+        self.assertEqual(call.operation, 'document_list')
+        self.assertEqual(call.envelope_id, 'envelope-id')
+        self.assertEqual(call.status_code, 200)
+        self.assertEqual(call.retries, 1)
+        self.assertGreater(call.response_size, 0)
+        self.assertGreaterEqual(call.duration, 0)
+        self.assertFalse(call.failed)
+
+    def test_failed_call(self):
+        """Failed calls are reported with their exception."""
+        backend = self.get_backend()
+        self.server.failures = 1
+        del self.calls[:]
+        with self.assertRaises(pydocusign.exceptions.DocuSignException):
+            backend.docusign_client.get_envelope_document_list('envelope-id')
+        self.assertEqual(self.calls[0].status_code, 503)
+        self.assertTrue(self.calls[0].failed)
+
+    @override_settings(DOCUSIGN_INSTRUMENTATION=[
+        'django_docusign_demo.tests.failing_observer',
+        'django_docusign_demo.tests.record_call'])
+    def test_observers(self):
+        """Observers configured in settings receive calls, failing
+        observers do not break calls."""
+        backend = self.get_backend()
+        backend.create_signature(self.create_signature())
+        self.assertEqual([call.operation for call in observed_calls],
+                         ['login', 'create_envelope'])
+        self.assertGreater(observed_calls[1].request_size, 0)
+
+    @unittest.skipIf(httpx is None, 'httpx is not installed')
+    def test_async(self):
+        """Async client reports calls too."""
+        backend = self.get_backend(AsyncDocuSignBackend)
+        del self.calls[:]
+        async_to_sync(backend.async_client.get_envelope_document_list)(
+            'envelope-id')
+        self.assertEqual(self.calls[0].operation, 'document_list')
+        self.assertEqual(self.calls[0].envelope_id, 'envelope-id')
+        self.assertEqual(self.calls[0].status_code, 200)
+
+
+class BenchmarkTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around :mod:`django_docusign_demo.benchmark`."""
+    def test_run(self):
+        """Every scenario is measured."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            results = Benchmark(self.server, iterations=2).run()
+        self.assertEqual(sorted(results), sorted(Benchmark.scenarios))
+        for summary in results.values():
+            self.assertEqual(summary['iterations'], 2)
+            self.assertEqual(summary['errors'], 0)
+            self.assertGreater(summary['peak_memory'], 0)
+        self.assertEqual(results['post_recipient_view']['requests'], 1)
+        self.assertEqual(results['post_recipient_view']['queries'], 0)
+
+    def test_error_rate(self):
+        """Fake server fails at random, errors are counted."""
+        self.server.error_rate = 1.0
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            measurement = Benchmark(self.server, iterations=2) \
+                .run_scenario('post_recipient_view')
+        self.assertEqual(measurement.errors, 2)
+
+    def test_compare(self):
+        """Metrics over baseline and tolerance are regressions."""
+        baseline = {'create_signature': {'p50': 10.0, 'queries': 2.0}}
+        self.assertEqual(
+            compare({'create_signature': {'p50': 12.0, 'queries': 2.0}},
+                    baseline, tolerance=0.25), [])
+        self.assertEqual(
+            len(compare({'create_signature': {'p50': 13.0, 'queries': 3.0}},
+                        baseline, tolerance=0.25)), 2)
+        self.assertEqual(percentile([3, 1, 2, 4], 50), 2)
+
+
+class ImportTestCase(unittest.TestCase):
+    """Tests around cost of importing :mod:`django_docusign`."""
+    #: Modules importing ``django_docusign`` must not load.
+    heavy_modules = ['pydocusign', 'httpx', 'jwt', 'requests', 'PIL',
+                     'django_docusign.backend', 'django_docusign.client']
+
+    def run_python(self, code):
+        """Run ``code`` in a new interpreter, with Django set up, return its
+        output."""
+        setup = 'import django, sys; django.setup()\n'
+        return subprocess.check_output(
+            [sys.executable, '-c', setup + code],
+            env=dict(os.environ,
+                     DJANGO_SETTINGS_MODULE='django_docusign_demo.settings'),
+            universal_newlines=True).strip()
+
+    def test_lazy_import(self):
+        """Importing API and forms does not import pydocusign nor
+        backends."""
+        output = self.run_python(
+            'from django_docusign import api\n'
+            'api.SignerForm\n'
+            'print(sorted(name for name in ["pydocusign",'
+            ' "django_docusign.backend"] if name in sys.modules))\n'
+            'api.DocuSignBackend\n'
+            'print("pydocusign" in sys.modules)')
+        self.assertEqual(output.splitlines(), ['[]', 'True'])
+
+    def test_package_import(self):
+        """Importing package does not import pkg_resources."""
+        output = subprocess.check_output(
+            [sys.executable, '-c', 'import sys, django_docusign; '
+             'print("pkg_resources" in sys.modules)'],
+            universal_newlines=True).strip()
+        self.assertEqual(output, 'False')
+
+    def test_version(self):
+        """__version__ is read on first access."""
+        import django_docusign
+        with open(os.path.join(os.path.dirname(os.path.dirname(
+                os.path.dirname(os.path.abspath(__file__)))),
+                'VERSION')) as version_file:
+            version = version_file.read().strip()
+        self.assertEqual(django_docusign.__version__, version)
+
+    def test_heavy_imports(self):
+        """Importing package and API does not import heavy dependencies."""
+        output = self.run_python(
+            'import django_docusign, django_docusign.api\n'
+            'print(sorted(name for name in {!r} if name in sys.modules))'
+            .format(self.heavy_modules))
+        self.assertEqual(output, '[]')
+
+
+class TenantTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around :class:`~django_docusign.backend.TenantDocuSignBackend`
+    and :class:`~django_docusign.tenants.TenantRouter`."""
+    def setUp(self):
+        super(TenantTestCase, self).setUp()
+        reset_tenant_router()
+        self.addCleanup(reset_tenant_router)
+
+    def get_backend(self, tenant, **kwargs):
+        return django_docusign.TenantDocuSignBackend(
+            root_url=self.server.root_url, account_id=tenant, **kwargs)
+
+    def test_routing(self):
+        """Backends of a tenant share client, caches and rate-limit
+        bucket."""
+        acme = self.get_backend('acme')
+        self.assertIs(self.get_backend('acme').docusign_client,
+                      acme.docusign_client)
+        self.assertIs(self.get_backend('acme').template_cache,
+                      acme.template_cache)
+        globex = self.get_backend('globex')
+        self.assertIsNot(globex.docusign_client, acme.docusign_client)
+        self.assertIsNot(globex.template_cache, acme.template_cache)
+        self.assertNotEqual(globex.docusign_client.rate_limit_key,
+                            acme.docusign_client.rate_limit_key)
+        self.assertIsNone(
+            django_docusign.TenantDocuSignBackend().tenant)
+
+    @override_settings(DOCUSIGN_RECIPIENT_CACHE='shared')
+    def test_recipients(self):
+        """Recipients are cached per tenant."""
+        backend = self.get_backend('acme')
+        signature = self.create_signature()
+        backend.create_signature(signature)
+        requests = self.server.requests
+        self.get_backend('acme').get_envelope_recipients(
+            signature.signature_backend_id)
+        self.get_backend('acme').get_envelope_recipients(
+            signature.signature_backend_id)
+        self.assertEqual(self.server.requests - requests, 1)
+        self.assertIsNot(self.get_backend('globex').recipient_cache,
+                         backend.recipient_cache)
+
+    def test_lru(self):
+        """Least recently used tenants are evicted."""
+        router = TenantRouter(max_tenants=2)
+        acme = router.get('acme', root_url=self.server.root_url)
+        router.get('globex', root_url=self.server.root_url)
+        router.get('acme', root_url=self.server.root_url)
+        router.get('initech', root_url=self.server.root_url)
+        self.assertEqual(len(router), 2)
+        self.assertIn('acme', router)
+        self.assertNotIn('globex', router)
+        self.assertIs(router.get('acme', root_url=self.server.root_url),
+                      acme)
+
+    def test_evicted_client_not_closed(self):
+        """Clients of evicted tenants are left to their last users."""
+        router = TenantRouter(max_tenants=1)
+        client = router.get('acme', root_url=self.server.root_url).client
+        with mock.patch.object(client, 'close') as close:
+            router.get('globex', root_url=self.server.root_url)
+        self.assertNotIn('acme', router)
+        self.assertFalse(close.called)
+
+    @override_settings(DOCUSIGN_PAGE_IMAGE_CACHE=True)
+    def test_page_images(self):
+        """Page images and validators are cached per tenant."""
+        acme = self.get_backend('acme')
+        globex = self.get_backend('globex')
+        self.assertIs(self.get_backend('acme').page_image_cache,
+                      acme.page_image_cache)
+        self.assertIsNot(globex.page_image_cache, acme.page_image_cache)
+        self.assertIsNot(globex.validator_cache, acme.validator_cache)
+        acme.mark_envelope_completed('envelope-id')
+        self.assertIsNone(globex.get_envelope_completed('envelope-id'))
+
+    def test_credentials(self):
+        """Rotated OAuth2 tokens update client, other options replace
+        it."""
+        router = TenantRouter()
+        client = router.get('acme', oauth2_token='first').client
+        self.assertIs(router.get('acme', oauth2_token='second').client,
+                      client)
+        self.assertEqual(client.oauth2_token, 'second')
+        self.assertIsNot(
+            router.get('acme', oauth2_token='second', timeout=5).client,
+            client)
+
+    @override_settings(DOCUSIGN_TEMPLATE_CACHE_ALIAS='default')
+    def test_template_cache_alias(self):
+        """Templates of tenants are stored in Django cache, if set."""
+        acme = self.get_backend('acme').template_cache
+        globex = self.get_backend('globex').template_cache
+        self.assertIsInstance(acme, DjangoCache)
+        self.assertNotEqual(acme.key_prefix, globex.key_prefix)
+
+    @override_settings(DOCUSIGN_JWT_USER_ID='user',
+                       DOCUSIGN_JWT_PRIVATE_KEY='',
+                       DOCUSIGN_INTEGRATOR_KEY='integrator')
+    def test_jwt(self):
+        """With JWT grant, tenants get tokens and URLs of their account."""
+        self.addCleanup(caches['default'].clear)
+        self.server.accounts = ['fake-account', 'acme', 'globex']
+        with override_settings(DOCUSIGN_JWT_OAUTH_URL=self.server.base_uri), \
+                mock.patch.object(JWTTokenProvider, 'build_assertion',
+                                  FakeAssertionTokenProvider.build_assertion):
+            acme = self.get_backend('acme')
+            globex = self.get_backend('globex')
+            self.assertIs(self.get_backend('acme').docusign_client,
+                          acme.docusign_client)
+        self.assertEqual(acme.docusign_client.account_url,
+                         self.server.root_url + '/accounts/acme')
+        self.assertEqual(globex.docusign_client.account_url,
+                         self.server.root_url + '/accounts/globex')
+        self.assertIsNot(acme.docusign_client.token_provider,
+                         globex.docusign_client.token_provider)
+
+
+class FakeAssertionTokenProvider(JWTTokenProvider):
+    """Token provider which does not sign assertions."""
+    def build_assertion(self, now):
+        return 'assertion-{user}-{now}'.format(user=self.user_id, now=now)
+
+
+@override_settings(DOCUSIGN_TASK_RUNNER='django_docusign.tasks.'
+                                        'ImmediateTaskRunner')
+class JWTTokenProviderTestCase(FakeDocuSignMixin, django.test.TestCase):
+    """Tests around :class:`~django_docusign.auth.JWTTokenProvider`."""
+    def setUp(self):
+        super(JWTTokenProviderTestCase, self).setUp()
+        reset_task_runner()
+        self.addCleanup(reset_task_runner)
+        caches['default'].clear()
+        self.addCleanup(caches['default'].clear)
+
+    def get_provider(self, **kwargs):
+        return FakeAssertionTokenProvider(
+            integrator_key='integrator', user_id='user', private_key='',
+            oauth_url=self.server.base_uri, **kwargs)
+
+    def test_cache(self):
+        """Tokens are shared by providers through Django cache."""
+        provider = self.get_provider()
+        self.assertEqual(provider.get_token(), 'fake-token-1')
+        self.assertEqual(provider.get_token(), 'fake-token-1')
+        self.assertEqual(self.get_provider().get_token(), 'fake-token-1')
+        self.assertEqual(self.server.tokens, ['fake-token-1'])
+
+    def test_proactive_refresh(self):
+        """Tokens about to expire are refreshed in the background, current
+        token is used meanwhile."""
+        provider = self.get_provider(refresh_margin=300)
+        self.server.token_lifetime = 600
+        self.assertEqual(provider.get_token(), 'fake-token-1')
+        with mock.patch('time.time', return_value=time.time() + 400):
+            self.assertEqual(provider.get_token(), 'fake-token-1')
+            self.assertEqual(self.server.tokens,
+                             ['fake-token-1', 'fake-token-2'])
+            self.assertEqual(provider.get_token(), 'fake-token-2')
+        with mock.patch('time.time', return_value=time.time() + 1200):
+            # Expired: refreshed before use.
+            self.assertEqual(self.get_provider().get_token(),
+                             'fake-token-3')
+
+    def test_single_flight(self):
+        """Concurrent refreshes, in threads or processes, send one
+        request."""
+        self.server.latency = 0.1
+        tokens = []
+        threads = [
+            threading.Thread(
+                target=lambda provider: tokens.append(provider.get_token()),
+                args=(provider,))
+            for provider in [self.get_provider()] * 3
+            + [self.get_provider() for _ in range(3)]
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(tokens, ['fake-token-1'] * 6)
+        self.assertEqual(self.server.tokens, ['fake-token-1'])
+
+    def test_account(self):
+        """Account is discovered once, clients do not log in."""
+        provider = self.get_provider()
+        client_kwargs = provider.get_client_kwargs()
+        self.assertEqual(client_kwargs['root_url'], self.server.root_url)
+        self.assertEqual(client_kwargs['account_id'], 'fake-account')
+        self.assertIs(client_kwargs['token_provider'], provider)
+        requests = self.server.requests
+        other_kwargs = self.get_provider().get_client_kwargs()
+        self.assertEqual(other_kwargs['account_url'],
+                         client_kwargs['account_url'])
+        self.assertEqual(self.server.requests, requests)
+
+        backend_class = type(str('JWTBackend'),
+                             (django_docusign.DocuSignBackend,),
+                             {'get_token_provider': lambda self: provider})
+        backend = backend_class()
+        self.assertEqual(backend.docusign_client.oauth2_token,
+                         'fake-token-1')
+        backend.create_signature(self.create_signature())
+        self.assertEqual(self.server.requests, requests + 1)
+
+    def test_instrumentation(self):
+        """Token and account requests are reported like API calls."""
+        calls = []
+
+        def receiver(sender, call, **kwargs):
+            calls.append(call)
+
+        docusign_call.connect(receiver)
+        self.addCleanup(docusign_call.disconnect, receiver)
+        self.get_provider().get_client_kwargs()
+        self.assertEqual([(call.sender, call.operation, call.method,
+                           call.status_code) for call in calls],
+                         [(FakeAssertionTokenProvider, 'oauth_token', 'POST',
+                           200),
+                          (FakeAssertionTokenProvider, 'oauth_userinfo',
+                           'GET', 200)])
+        self.assertTrue(all(call.response_size for call in calls))
+
+    def test_pooled_client(self):
+        """Pooled client is kept when token is refreshed, and sends the
+        current token."""
+        provider = self.get_provider(refresh_margin=300)
+        backend_class = type(str('JWTBackend'),
+                             (django_docusign.DocuSignBackend,),
+                             {'get_token_provider': lambda self: provider})
+        client = backend_class().docusign_client
+        self.assertEqual(client.base_headers()['Authorization'],
+                         'Bearer fake-token-1')
+        with mock.patch('time.time', return_value=time.time() + 4000):
+            self.assertIs(backend_class().docusign_client, client)
+            self.assertEqual(client.base_headers()['Authorization'],
+                             'Bearer fake-token-2')
+
+    @unittest.skipIf(jwt is None, 'PyJWT is not installed')
+    def test_assertion(self):
+        """Assertions are signed with RS256."""
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        provider = JWTTokenProvider(
+            integrator_key='integrator', user_id='user',
+            private_key=key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption()))
+        claims = jwt.decode(provider.build_assertion(time.time()),
+                            key.public_key(), algorithms=['RS256'],
+                            audience='account-d.docusign.com')
+        self.assertEqual(claims['iss'], 'integrator')
+        self.assertEqual(claims['sub'], 'user')
+        self.assertEqual(claims['scope'], 'signature impersonation')
@@ -15,10 +15,13 @@ create_signature_view = views.CreateSignatureView.as_view()
 create_signature_template_view = views.CreateSignatureTemplateView.as_view()
 signer_view = views.SignerView.as_view()
 signer_return_view = views.SignerReturnView.as_view()
+async_signer_return_view = views.AsyncSignerReturnView.as_view()
 signer_canceled_view = views.SignerCanceledView.as_view()
 signer_error_view = views.SignerErrorView.as_view()
 signer_declined_view = views.SignerDeclinedView.as_view()
 signer_signed_view = views.SignerSignedView.as_view()
+connect_view = views.DocuSignConnectView.as_view()
+page_image_view = views.PageImageView.as_view()
 
 
 anysign_patterns = [
@@ -28,6 +31,11 @@ anysign_patterns = [
         signer_return_view,
         name='signer_return'
     ),
+    path(
+        'signer/<int:pk>/return/async/',
+        async_signer_return_view,
+        name='signer_return_async'
+    ),
     path(
         'signer/<int:pk>/canceled/',
         signer_canceled_view,
@@ -62,6 +70,12 @@ urlpatterns = [
         'signature/add/template/', create_signature_template_view,
         name='create_signature_template'
     ),
+    path('connect/', connect_view, name='connect'),
+    path(
+        'signature/<int:pk>/documents/<str:document_id>/pages/<int:page_no>/',
+        page_image_view,
+        name='page_image'
+    ),
 
     path('', include(anysign_patterns, namespace='anysign')),
 ]
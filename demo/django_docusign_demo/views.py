@@ -3,7 +3,7 @@ from __future__ import unicode_literals
 
 import os
 
-from django.core.files.base import ContentFile
+from django.core.files import File
 from django.utils.text import slugify
 from django.utils.timezone import now
 from django.views.generic import FormView, RedirectView, TemplateView
@@ -237,11 +237,51 @@ class SignerReturnView(django_docusign.SignerReturnView):
             filename = "%s.pdf" % slugify(
                 self.signature.document_title)
         self.signature.document.delete(save=False)
-        self.signature.document.save(filename,
-                                     ContentFile(signed_document.read()),
+        self.signature.document.save(filename, File(signed_document),
                                      save=True)
 
 
+class AsyncSignerReturnView(SignerReturnView,
+                            django_docusign.AsyncSignerReturnView):
+    """Welcome the signer back from DocuSign, asynchronously."""
+
+    def get_signature_backend(self):
+        """Return signature backend instance."""
+        backend_settings = docusign_settings(self.request)
+        return django_docusign.AsyncDocuSignBackend(**backend_settings)
+
+
+class DocuSignConnectView(django_docusign.DocuSignConnectView):
+    """Receive DocuSign Connect notifications."""
+
+    def update_signers(self, signature, updates):
+        """Update signers with a single query."""
+        signers = []
+        for signer, recipient in updates:
+            signer.status = recipient['status']
+            signer.status_datetime = now()
+            signer.status_details = recipient.get('declinedReason') or ''
+            signers.append(signer)
+        models.Signer.objects.bulk_update(
+            signers, ['status', 'status_datetime', 'status_details'])
+
+    def update_signature(self, signature, status):
+        signature.status = status
+        signature.status_datetime = now()
+        signature.save()
+
+
+class PageImageView(django_docusign.PageImageView):
+    """Serve images of pages of signature's documents."""
+
+    def get_signature_backend(self, signature):
+        """Return signature backend instance."""
+        return django_anysign.get_signature_backend(
+            'docusign',
+            **docusign_settings(self.request)
+        )
+
+
 class SignerCanceledView(TemplateView):
     template_name = 'signer_canceled.html'
 
@@ -28,7 +28,11 @@ CLASSIFIERS = [
     'Programming Language :: Python :: 3.6',
     'Framework :: Django']
 KEYWORDS = []
-PACKAGES = ['django_docusign_demo']
+PACKAGES = [
+    'django_docusign_demo',
+    'django_docusign_demo.management',
+    'django_docusign_demo.management.commands',
+]
 REQUIREMENTS = [
     'django-docusign',
     'django-nose',
@@ -1,6 +1,22 @@
 # -*- coding: utf-8 -*-
-import pkg_resources
+"""Django application for DocuSign signature SAAS platform.
 
+Importing this package is cheap: ``__version__`` (module version, as defined
+in PEP-0396) is read from package metadata on first access only.
 
-#: Module version, as defined in PEP-0396.
-__version__ = pkg_resources.get_distribution(__package__).version
+"""
+
+
+def __getattr__(name):
+    if name == '__version__':
+        try:
+            from importlib.metadata import version
+        except ImportError:  # Python < 3.8.
+            import pkg_resources
+
+            def version(distribution):
+                return pkg_resources.get_distribution(distribution).version
+        globals()['__version__'] = version('django-docusign')
+        return globals()['__version__']
+    raise AttributeError('module {module!r} has no attribute {name!r}'.format(
+        module=__name__, name=name))
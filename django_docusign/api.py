@@ -22,9 +22,38 @@ It also means that things not exposed in :mod:`django_docusign.api` are not
 part of the deprecation policy. They can be moved, changed, removed without
 notice.
 
+Attributes are imported on first access, so that importing this module
+does not import :mod:`pydocusign` nor backends until they are used.
+
 """
-from django_docusign.backend import DocuSignBackend
-from django_docusign.forms import SignerForm
-from django_docusign.views import SignerReturnView
+import importlib
+
+#: Modules of exposed attributes.
+_modules = {
+    'AsyncDocuSignBackend': 'django_docusign.async_backend',
+    'AsyncSignerReturnView': 'django_docusign.views',
+    'DocuSignBackend': 'django_docusign.backend',
+    'DocuSignConnectView': 'django_docusign.views',
+    'PageImageView': 'django_docusign.views',
+    'SignerForm': 'django_docusign.forms',
+    'SignerReturnView': 'django_docusign.views',
+    'TenantDocuSignBackend': 'django_docusign.backend',
+}
+
+__all__ = sorted(_modules)
+
+
+def __getattr__(name):
+    try:
+        module = _modules[name]
+    except KeyError:
+        raise AttributeError(
+            'module {module!r} has no attribute {name!r}'.format(
+                module=__name__, name=name))
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
 
-__all__ = ['DocuSignBackend', 'SignerForm', 'SignerReturnView']
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
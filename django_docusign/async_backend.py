@@ -0,0 +1,588 @@
+"""Asyncio variant of :class:`~django_docusign.backend.DocuSignBackend`.
+
+Requires `httpx`_: ``pip install django-docusign[async]``.
+
+.. _`httpx`: https://pypi.org/project/httpx/
+
+"""
+from __future__ import unicode_literals
+
+import asyncio
+import logging
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from pydocusign import exceptions
+
+from django_docusign.backend import (COMBINED_DOCUMENT_ID,
+                                     DEFAULT_DOCUMENT_WORKERS, DocuSignBackend)
+from django_docusign.client import DEFAULT_POOL_SIZE
+from django_docusign.documents import (DocumentSpooler,
+                                       MultipartEnvelopeBody, get_chunk_size)
+from django_docusign.instrumentation import start_call
+from django_docusign.resilience import RetryPolicy, get_operation
+
+try:
+    import httpx
+except ImportError:  # Optional dependency.
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+
+#: Shared HTTP clients, one per event loop.
+_http_clients = weakref.WeakKeyDictionary()
+
+
+def get_http_client():
+    """Return :class:`httpx.AsyncClient` shared by every backend running in
+    current event loop.
+
+    Size of connection pool is ``settings.DOCUSIGN_POOL_SIZE``.
+
+    """
+    if httpx is None:
+        raise ImportError(
+            'AsyncDocuSignBackend requires httpx. '
+            'Install it with "pip install django-docusign[async]".')
+    loop = asyncio.get_running_loop()
+    try:
+        return _http_clients[loop]
+    except KeyError:
+        pool_size = getattr(settings, 'DOCUSIGN_POOL_SIZE', DEFAULT_POOL_SIZE)
+        _http_clients[loop] = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size,
+                                max_keepalive_connections=pool_size))
+        return _http_clients[loop]
+
+
+class AsyncDocuSignClient(object):
+    """Asyncio DocuSign client, for the operations used by backends.
+
+    Configuration (credentials, account, timeout) is read from ``client``, a
+    :class:`pydocusign.DocuSignClient` instance.
+
+    """
+    def __init__(self, client):
+        #: Synchronous client, holds configuration.
+        self.client = client
+
+    async def request(self, url, method='GET', json_data=None,
+                      expected_status_code=200, sobo_email=None,
+                      headers=None, content=None):
+        """Perform HTTP request, return JSON, bytes or text depending on
+        response's content type."""
+        do_url = '{root}{path}'.format(root=self.client.root_url, path=url)
+        do_headers = await self.base_headers(sobo_email)
+        do_headers.update(headers or {})
+        operation = get_operation(method, do_url)
+        call = start_call(self.__class__, operation, method, do_url,
+                          content, do_headers)
+        try:
+            response = await self.perform(operation, call, method, do_url,
+                                          headers=do_headers, json=json_data,
+                                          content=content)
+        except Exception as exception:
+            if call is not None:
+                call.finish(exception=exception)
+            raise
+        if call is not None:
+            call.finish(response=response,
+                        response_size=len(response.content))
+        if response.status_code != expected_status_code:
+            msg = "DocuSign request failed: " \
+                  "{method} {url} returned code {status} " \
+                  "while expecting code {expected}; " \
+                  "Message: {message} ; " \
+                  .format(
+                      method=method,
+                      url=do_url,
+                      status=response.status_code,
+                      expected=expected_status_code,
+                      message=response.text,
+                  )
+            logger.error(msg)
+            raise exceptions.DocuSignException(msg)
+        content_type = response.headers.get('Content-Type', '')
+        if content_type.startswith('application/json'):
+            return response.json()
+        elif content_type.startswith('image/'):
+            return response.content
+        return response.text
+
+    async def base_headers(self, sobo_email=None):
+        """Return headers of :attr:`client`, out of the event loop: token
+        providers may request a token, or read it from a Django cache."""
+        return await sync_to_async(self.client.base_headers,
+                                   thread_sensitive=False)(sobo_email)
+
+    async def perform(self, operation, call, method, url, content=None,
+                      **kwargs):
+        """Perform HTTP request, with retries, return
+        :class:`httpx.Response` whatever its status."""
+        retry_policy = getattr(self.client, 'retry_policy', RetryPolicy())
+        attempt = 0
+        while True:
+            self.before_call()
+            await self.throttle()
+            try:
+                response = await get_http_client().request(
+                    method, url, content=content,
+                    timeout=self.get_operation_timeout(operation),
+                    **kwargs)
+            except httpx.HTTPError as exception:
+                self.record_outcome(failed=True)
+                if attempt < retry_policy.retries \
+                        and retry_policy.can_retry_exception(
+                            method, exception, content):
+                    attempt += 1
+                    if call is not None:
+                        call.retries = attempt
+                    await asyncio.sleep(retry_policy.get_delay(attempt))
+                    continue
+                msg = "DocuSign request error: " \
+                      "{method} {url} failed ; " \
+                      "Error: {exception}" \
+                      .format(method=method, url=url, exception=exception)
+                logger.error(msg)
+                raise exceptions.DocuSignException(msg)
+            await self.observe_rate_limit(response)
+            self.record_outcome(failed=response.status_code >= 500)
+            if attempt < retry_policy.retries \
+                    and retry_policy.can_retry_response(method, response):
+                attempt += 1
+                if call is not None:
+                    call.retries = attempt
+                await asyncio.sleep(retry_policy.get_delay(attempt, response))
+                continue
+            return response
+
+    def get_operation_timeout(self, operation):
+        """Return :class:`httpx.Timeout` of ``operation``, see
+        :meth:`~django_docusign.client.DocuSignClient.get_operation_timeout`.
+        """
+        if not hasattr(self.client, 'get_operation_timeout'):
+            return self.client.timeout
+        connect_timeout, read_timeout = self.client.get_operation_timeout(
+            operation)
+        return httpx.Timeout(read_timeout, connect=connect_timeout)
+
+    def before_call(self):
+        """Raise :class:`~django_docusign.resilience.CircuitOpen` if
+        :attr:`client`'s circuit breaker is open."""
+        circuit_breaker = getattr(self.client, 'circuit_breaker', None)
+        if circuit_breaker is not None:
+            circuit_breaker.before_call()
+
+    def record_outcome(self, failed):
+        """Record outcome of a request in :attr:`client`'s circuit
+        breaker."""
+        circuit_breaker = getattr(self.client, 'circuit_breaker', None)
+        if circuit_breaker is not None:
+            circuit_breaker.record(failed)
+
+    async def throttle(self):
+        """Async version of
+        :meth:`~django_docusign.client.DocuSignClient.throttle`, using
+        :attr:`client`'s rate limiter."""
+        rate_limiter = getattr(self.client, 'rate_limiter', None)
+        if rate_limiter is not None:
+            # Shared stores do blocking I/O.
+            wait = await sync_to_async(rate_limiter.reserve,
+                                       thread_sensitive=False)()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+    async def observe_rate_limit(self, response):
+        """Adapt :attr:`client`'s rate limiter to ``response``'s headers."""
+        rate_limiter = getattr(self.client, 'rate_limiter', None)
+        if rate_limiter is not None:
+            await sync_to_async(rate_limiter.observe, thread_sensitive=False)(
+                response.status_code, response.headers)
+
+    async def login_information(self):
+        """Return dictionary of /login_information.
+
+        Populate ``account_id`` and ``account_url`` of :attr:`client`.
+
+        """
+        data = await self.request('/login_information')
+        self.client.account_id = data['loginAccounts'][0]['accountId']
+        self.client.account_url = '{root}/accounts/{account}'.format(
+            root=self.client.root_url,
+            account=self.client.account_id)
+        return data
+
+    async def account_path(self):
+        """Return path of account in API, login if necessary."""
+        if not self.client.account_url:
+            await self.login_information()
+        return '/accounts/{accountId}'.format(
+            accountId=self.client.account_id)
+
+    async def create_envelope(self, data):
+        """POST to /envelopes and return created envelope ID."""
+        url = '{account}/envelopes'.format(account=await self.account_path())
+        response_data = await self.request(
+            url, method='POST', json_data=data, expected_status_code=201)
+        return response_data['envelopeId']
+
+    async def create_envelope_multipart(self, envelope):
+        """POST ``envelope`` to /envelopes as a multipart request, streaming
+        documents, and return created envelope ID.
+
+        See
+        :meth:`~django_docusign.client.DocuSignClient.create_envelope_from_documents_multipart`.
+
+        """
+        url = '{account}/envelopes'.format(account=await self.account_path())
+        body = MultipartEnvelopeBody(envelope)
+        headers = {'Content-Type': body.content_type}
+        if body.size is not None:
+            headers['Content-Length'] = str(body.size)
+
+        async def content():
+            # Documents are read from files, or storages: not in event loop.
+            chunks = iter(body)
+            read = sync_to_async(next, thread_sensitive=False)
+            end = object()
+            while True:
+                chunk = await read(chunks, end)
+                if chunk is end:
+                    break
+                yield chunk
+
+        response_data = await self.request(
+            url, method='POST', headers=headers, content=content(),
+            expected_status_code=201)
+        envelope.payload_size = body.size
+        return response_data['envelopeId']
+
+    async def get_envelope_recipients(self, envelopeId):
+        """GET envelope's recipients."""
+        url = '{account}/envelopes/{envelopeId}/recipients'.format(
+            account=await self.account_path(), envelopeId=envelopeId)
+        return await self.request(url)
+
+    async def get_envelope_document_list(self, envelopeId):
+        """GET the list of envelope's documents."""
+        url = '{account}/envelopes/{envelopeId}/documents'.format(
+            account=await self.account_path(), envelopeId=envelopeId)
+        data = await self.request(url)
+        return data['envelopeDocuments']
+
+    async def get_envelope_document(self, envelopeId, documentId):
+        """Download one document in envelope, return
+        :class:`~django_docusign.documents.SpooledDocument`.
+
+        Document is read by chunks, see
+        :func:`~django_docusign.documents.spool_document`.
+
+        """
+        url = '{root}{account}/envelopes/{envelopeId}/documents/{documentId}' \
+              .format(root=self.client.root_url,
+                      account=await self.account_path(),
+                      envelopeId=envelopeId,
+                      documentId=documentId)
+        call = start_call(self.__class__, 'document', 'GET', url)
+        response = None
+        try:
+            self.before_call()
+            await self.throttle()
+            headers = await self.base_headers()
+            timeout = self.get_operation_timeout('document')
+            async with get_http_client().stream(
+                    'GET', url, headers=headers, timeout=timeout) as response:
+                await self.observe_rate_limit(response)
+                self.record_outcome(failed=response.status_code >= 500)
+                if response.status_code != 200:
+                    # Do not store error message as document.
+                    await response.aread()
+                    msg = "DocuSign request failed: " \
+                          "GET {url} returned code {status} " \
+                          "while expecting code 200; " \
+                          "Message: {message} ; " \
+                          .format(url=url, status=response.status_code,
+                                  message=response.text)
+                    logger.error(msg)
+                    raise exceptions.DocuSignException(msg)
+                if 'Content-Encoding' in response.headers:
+                    expected_size = None
+                else:
+                    expected_size = int(response.headers['Content-Length']) \
+                        if 'Content-Length' in response.headers else None
+                spooler = DocumentSpooler(
+                    name='{envelope_id}-{document_id}.pdf'.format(
+                        envelope_id=envelopeId, document_id=documentId),
+                    expected_size=expected_size)
+                async for chunk in response.aiter_bytes(get_chunk_size()):
+                    spooler.write(chunk)
+        except Exception as exception:
+            if call is not None:
+                call.finish(response=response, exception=exception)
+            raise
+        if call is not None:
+            call.finish(response=response,
+                        response_size=response.num_bytes_downloaded)
+        return spooler.finish()
+
+    async def get_template(self, templateId):
+        """GET the definition of the template."""
+        url = '{account}/templates/{templateId}'.format(
+            account=await self.account_path(), templateId=templateId)
+        return await self.request(url)
+
+    async def post_recipient_view(self, authenticationMethod=None,
+                                  clientUserId='', email='', envelopeId='',
+                                  returnUrl='', userId='', userName=''):
+        """POST to {account}/envelopes/{envelopeId}/views/recipient."""
+        url = '{account}/envelopes/{envelopeId}/views/recipient'.format(
+            account=await self.account_path(), envelopeId=envelopeId)
+        if authenticationMethod is None:
+            authenticationMethod = 'none'
+        data = {
+            'authenticationMethod': authenticationMethod,
+            'clientUserId': clientUserId,
+            'email': email,
+            'envelopeId': envelopeId,
+            'returnUrl': returnUrl,
+            'userId': userId,
+            'userName': userName,
+        }
+        return await self.request(url, method='POST', json_data=data,
+                                  expected_status_code=201)
+
+    async def get_page_image(self, envelopeId, documentId, pageId, dpi=None,
+                             max_width=None, max_height=None):
+        """Retrieve a PNG of a page of a document in an envelope."""
+        url = '{account}/envelopes/{envelopeId}/documents/{documentId}' \
+              '/pages/{pageId}/page_image' \
+              .format(account=await self.account_path(),
+                      envelopeId=envelopeId,
+                      documentId=documentId,
+                      pageId=pageId)
+        qs_params = []
+        if dpi is not None:
+            qs_params.append('dpi=' + str(dpi))
+        if max_width is not None:
+            qs_params.append('max_width=' + str(max_width))
+        if max_height is not None:
+            qs_params.append('max_height=' + str(max_height))
+        if qs_params:
+            url += '?{}'.format('&'.join(qs_params))
+        return await self.request(url)
+
+
+class AsyncDocuSignBackend(DocuSignBackend):
+    """DocuSign backend with ``async`` variants of methods that call
+    DocuSign API.
+
+    Async methods are named after their synchronous counterparts, with an
+    ``a`` prefix, e.g. :meth:`acreate_signature`. They share one connection
+    pool per event loop.
+
+    Hooks that read the database, such as
+    :meth:`~django_docusign.backend.DocuSignBackend.get_docusign_signers` or
+    :meth:`~django_docusign.backend.DocuSignBackend.get_docusign_tabs`, are
+    still synchronous: they are run with ``sync_to_async``.
+
+    """
+    def __init__(self, *args, **kwargs):
+        super(AsyncDocuSignBackend, self).__init__(*args, **kwargs)
+        #: Instance of :class:`AsyncDocuSignClient`.
+        self.async_client = AsyncDocuSignClient(self.docusign_client)
+
+    async def aget_template_definition(self, template_id):
+        """Async version of :meth:`get_template_definition`."""
+        if self.template_cache is None:
+            return await self.async_client.get_template(template_id)
+        if not self.docusign_client.account_url:
+            await self.async_client.login_information()
+        key = self.get_template_cache_key(template_id)
+        # Cache may be a Django cache: blocking I/O.
+        template_definition = await sync_to_async(
+            self.template_cache.get, thread_sensitive=False)(key)
+        if template_definition is None:
+            template_definition = await self.async_client.get_template(
+                template_id)
+            await sync_to_async(self.template_cache.set,
+                                thread_sensitive=False)(key,
+                                                        template_definition)
+        return template_definition
+
+    async def acreate_signature(self, signature, subject='', blurb='',
+                                sobo_email=None, **env_params):
+        """Async version of :meth:`create_signature`."""
+        signature_type = await sync_to_async(getattr)(signature,
+                                                      'signature_type')
+        template_id = signature_type.docusign_template_id
+        if template_id:
+            # Fetch definition here, so that building roles does not block.
+            template_definition = await self.aget_template_definition(
+                template_id)
+            envelope = await sync_to_async(self.build_envelope_from_template)(
+                signature, subject, blurb, sobo_email,
+                template_definition=template_definition, **env_params)
+            data = envelope.to_dict()
+        else:
+            envelope = await sync_to_async(self.build_envelope_from_document)(
+                signature, subject, blurb, sobo_email, **env_params)
+            data = None
+            if self.document_index is not None:
+                data = await sync_to_async(self.document_index.build_request)(
+                    envelope)
+            if data is None and getattr(settings, 'DOCUSIGN_MULTIPART_UPLOAD',
+                                        False):
+                envelope.envelopeId = await self.async_client \
+                    .create_envelope_multipart(envelope)
+            elif data is None:
+                data = await sync_to_async(
+                    self.docusign_client
+                        ._create_envelope_from_documents_request)(envelope)
+        if data is not None:
+            envelope.envelopeId = await self.async_client.create_envelope(data)
+        signature.signature_backend_id = envelope.envelopeId
+        await sync_to_async(self.invalidate_recipients,
+                            thread_sensitive=False)(envelope.envelopeId)
+        await sync_to_async(signature.save)()
+        # Prefetches are claimed in a Django cache.
+        await sync_to_async(self.schedule_page_image_prefetch,
+                            thread_sensitive=False)(signature)
+        return signature
+
+    async def aget_envelope_recipients(self, envelope_id):
+        """Async version of :meth:`get_envelope_recipients`."""
+        if self.recipient_cache is not None:
+            key = self.get_recipient_cache_key(envelope_id)
+            # Cache may be a Django cache: blocking I/O.
+            recipients = await sync_to_async(
+                self.recipient_cache.get, thread_sensitive=False)(key)
+            if recipients is not None:
+                return recipients
+        response = await self.async_client.get_envelope_recipients(
+            envelope_id)
+        recipients = self.index_recipients(response)
+        if self.recipient_cache is not None:
+            await sync_to_async(self.recipient_cache.set,
+                                thread_sensitive=False)(key, recipients)
+        return recipients
+
+    async def aget_docusign_recipient(self, signer):
+        """Async version of :meth:`get_docusign_recipient`."""
+        signature = await sync_to_async(getattr)(signer, 'signature')
+        recipients = await self.aget_envelope_recipients(
+            signature.signature_backend_id)
+        try:
+            return recipients[str(signer.pk)]
+        except KeyError:
+            raise Exception("Failed to retrieve Signer")
+
+    async def aget_docusign_documents(self, signature, max_workers=None,
+                                      combined=False):
+        """Async version of :meth:`get_docusign_documents`.
+
+        Asynchronous generator of file-like objects. With ``max_workers``
+        greater than 1, up to ``max_workers`` documents are downloaded
+        concurrently.
+
+        """
+        envelope_id = signature.signature_backend_id
+        if combined:
+            yield await self.async_client.get_envelope_document(
+                envelope_id, COMBINED_DOCUMENT_ID)
+            return
+        if max_workers is None:
+            max_workers = getattr(settings, 'DOCUSIGN_DOCUMENT_WORKERS',
+                                  DEFAULT_DOCUMENT_WORKERS)
+        document_list = await self.async_client.get_envelope_document_list(
+            envelope_id)
+        document_ids = [document_data['documentId']
+                        for document_data in document_list
+                        if document_data['documentId'] != 'certificate']
+        if max_workers <= 1:
+            for document_id in document_ids:
+                yield await self.async_client.get_envelope_document(
+                    envelope_id, document_id)
+            return
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def download(document_id):
+            async with semaphore:
+                return await self.async_client.get_envelope_document(
+                    envelope_id, document_id)
+
+        tasks = [asyncio.ensure_future(download(document_id))
+                 for document_id in document_ids]
+        yielded = 0
+        try:
+            for task in tasks:
+                document = await task
+                yielded += 1
+                yield document
+        finally:
+            for task in tasks[yielded:]:
+                task.cancel()
+            for task in tasks[yielded:]:
+                try:
+                    document = await task
+                except (asyncio.CancelledError, Exception):
+                    continue
+                document.close()
+
+    async def apost_recipient_view(self, signer, signer_return_url=None,
+                                   signers=None):
+        """Async version of :meth:`post_recipient_view`."""
+        signature = await sync_to_async(getattr)(signer, 'signature')
+        envelope_id = signature.signature_backend_id
+        if signer_return_url is None:
+            signer_return_url = self.get_signer_return_url(signer)
+        if signers is None and self.has_default_docusign_signers():
+            data = self.get_recipient_view_data(signer, envelope_id)
+        else:
+            docusign_signers = await sync_to_async(
+                self.get_docusign_signers)(signature, signers=signers)
+            docusign_signer = [ds for ds in docusign_signers
+                               if ds.clientUserId == signer.pk][0]
+            data = {
+                'clientUserId': docusign_signer.clientUserId,
+                'email': docusign_signer.email,
+                'userId': docusign_signer.userId,
+                'userName': docusign_signer.name,
+            }
+        response_data = await self.async_client.post_recipient_view(
+            envelopeId=envelope_id, returnUrl=signer_return_url, **data)
+        # Signer is about to change recipient's status.
+        await sync_to_async(self.invalidate_recipients,
+                            thread_sensitive=False)(envelope_id)
+        return response_data['url']
+
+    async def aget_page_image(self, signature, document_id, page_no,
+                              dpi=None, max_width=None, max_height=None):
+        """Async version of :meth:`get_page_image`.
+
+        Stale images are fetched again, without conditional request.
+
+        """
+        envelope_id = signature.signature_backend_id
+        if self.page_image_cache is None:
+            return await self.async_client.get_page_image(
+                envelope_id, document_id, page_no, dpi, max_width,
+                max_height)
+        if not self.docusign_client.account_id:
+            await self.async_client.login_information()
+        key = self.get_page_image_cache_key(
+            envelope_id, document_id, page_no, dpi, max_width, max_height)
+        # Storage tier of cache, if any, does blocking I/O.
+        image = await sync_to_async(self.page_image_cache.get,
+                                    thread_sensitive=False)(key)
+        # Validators may be stored in a Django cache: blocking I/O too.
+        if image is not None and await sync_to_async(
+                self.is_page_image_fresh,
+                thread_sensitive=False)(envelope_id, key):
+            return image
+        image = await self.async_client.get_page_image(
+            envelope_id, document_id, page_no, dpi, max_width, max_height)
+        await sync_to_async(self.store_page_image,
+                            thread_sensitive=False)(key, image, {})
+        return image
@@ -0,0 +1,371 @@
+"""OAuth2 JWT grant authentication with DocuSign.
+
+:class:`JWTTokenProvider` obtains access tokens with the JWT bearer grant,
+i.e. as an integration impersonating a user, and stores them in a Django
+cache shared by processes. Tokens are refreshed in the background before
+they expire, and concurrent refreshes (in threads or processes) are
+collapsed into one. The account's ``base_uri``, discovered with
+``/oauth/userinfo``, is cached too, so that clients never call
+``/login_information``.
+
+Requires `PyJWT`_ with cryptography: ``pip install django-docusign[jwt]``.
+
+.. _`PyJWT`: https://pypi.org/project/PyJWT/
+
+"""
+from __future__ import unicode_literals
+
+import hashlib
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from pydocusign.exceptions import DocuSignException
+
+from django_docusign.instrumentation import start_call
+from django_docusign.tasks import get_task_runner
+
+try:
+    import jwt
+except ImportError:  # Optional dependency.
+    jwt = None
+
+logger = logging.getLogger(__name__)
+
+#: Default URL of DocuSign's authentication service (demo environment).
+#: Production is ``'https://account.docusign.com'``.
+DEFAULT_JWT_OAUTH_URL = 'https://account-d.docusign.com'
+
+#: Default scopes requested.
+DEFAULT_JWT_SCOPES = ('signature', 'impersonation')
+
+#: Default lifetime, in seconds, of JWT assertions and requested tokens.
+DEFAULT_JWT_LIFETIME = 3600
+
+#: Default number of seconds before expiry tokens are refreshed.
+DEFAULT_JWT_REFRESH_MARGIN = 300
+
+#: Default number of seconds discovered account is cached.
+DEFAULT_JWT_ACCOUNT_CACHE_TIMEOUT = 86400
+
+#: Default number of seconds a refresh lock is held, at most.
+DEFAULT_JWT_LOCK_TIMEOUT = 30
+
+#: Path of REST API on account's ``base_uri``.
+API_PATH = '/restapi/v2'
+
+#: Grant type of JWT bearer grant.
+JWT_GRANT_TYPE = 'urn:ietf:params:oauth:grant-type:jwt-bearer'
+
+
+class JWTTokenProvider(object):
+    """Access tokens of user ``user_id``, for integration
+    ``integrator_key``, signed with RSA ``private_key`` (PEM).
+
+    Tokens are stored in Django cache ``cache_alias``, and memoized in the
+    provider. They are refreshed once they are less than
+    ``refresh_margin`` seconds from expiry: in the background (with the task
+    runner, see :mod:`django_docusign.tasks`) while current token is still
+    valid, else synchronously.
+
+    Account is ``account_id`` if set, else user's default account.
+
+    """
+    def __init__(self, integrator_key, user_id, private_key,
+                 oauth_url=DEFAULT_JWT_OAUTH_URL, scopes=DEFAULT_JWT_SCOPES,
+                 lifetime=DEFAULT_JWT_LIFETIME,
+                 refresh_margin=DEFAULT_JWT_REFRESH_MARGIN,
+                 cache_alias='default', account_id=None,
+                 account_cache_timeout=DEFAULT_JWT_ACCOUNT_CACHE_TIMEOUT,
+                 lock_timeout=DEFAULT_JWT_LOCK_TIMEOUT, timeout=30):
+        self.integrator_key = integrator_key
+        self.user_id = user_id
+        self.private_key = private_key
+        self.oauth_url = oauth_url.rstrip('/')
+        self.scopes = scopes
+        self.lifetime = lifetime
+        self.refresh_margin = refresh_margin
+        self.cache_alias = cache_alias
+        self.account_id = account_id
+        self.account_cache_timeout = account_cache_timeout
+        self.lock_timeout = lock_timeout
+        self.timeout = timeout
+        self.session = requests.Session()
+        digest = hashlib.sha1('{url} {key} {user} {account}'.format(
+            url=self.oauth_url, key=integrator_key, user=user_id,
+            account=account_id or '').encode('utf-8')).hexdigest()
+        #: Key of token in cache.
+        self.token_key = 'docusign:jwt:{digest}:token'.format(digest=digest)
+        #: Key of account in cache.
+        self.account_key = 'docusign:jwt:{digest}:account'.format(
+            digest=digest)
+        self._token = None
+        self._account = None
+        self._refresh_lock = threading.Lock()
+        self._scheduled = False
+        self._scheduled_lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def build_assertion(self, now):
+        """Return JWT assertion, signed with :attr:`private_key`."""
+        if jwt is None:
+            raise ImportError('JWTTokenProvider requires PyJWT. Install it '
+                              'with "pip install django-docusign[jwt]".')
+        assertion = jwt.encode({
+            'iss': self.integrator_key,
+            'sub': self.user_id,
+            'aud': urlparse(self.oauth_url).netloc,
+            'iat': int(now),
+            'exp': int(now) + self.lifetime,
+            'scope': ' '.join(self.scopes),
+        }, self.private_key, algorithm='RS256')
+        if isinstance(assertion, bytes):  # PyJWT < 2.
+            assertion = assertion.decode('ascii')
+        return assertion
+
+    def _call(self, operation, method, path, **kwargs):
+        url = '{oauth_url}{path}'.format(oauth_url=self.oauth_url, path=path)
+        call = start_call(self.__class__, operation, method, url,
+                          kwargs.get('data'), kwargs.get('headers'))
+        try:
+            response = self.session.request(method, url,
+                                            timeout=self.timeout, **kwargs)
+        except requests.exceptions.RequestException as exception:
+            if call is not None:
+                call.finish(exception=exception)
+            msg = 'DocuSign authentication error: {method} {url} failed ; ' \
+                  'Error: {exception}'.format(method=method, url=url,
+                                              exception=exception)
+            logger.error(msg)
+            raise DocuSignException(msg)
+        if call is not None:
+            call.finish(response=response, response_size=len(response.content))
+        if response.status_code != 200:
+            # E.g. "consent_required": user has to grant consent once.
+            msg = 'DocuSign authentication failed: {method} {url} returned ' \
+                  'code {status} ; Message: {message}'.format(
+                      method=method, url=url, status=response.status_code,
+                      message=response.text)
+            logger.error(msg)
+            raise DocuSignException(msg)
+        return response.json()
+
+    def request_token(self):
+        """Request new access token, return ``{'access_token': <str>,
+        'expires_at': <POSIX timestamp>}``."""
+        now = time.time()
+        data = self._call('oauth_token', 'POST', '/oauth/token', data={
+            'grant_type': JWT_GRANT_TYPE,
+            'assertion': self.build_assertion(now),
+        })
+        return {
+            'access_token': data['access_token'],
+            'expires_at': now + int(data.get('expires_in', self.lifetime)),
+        }
+
+    def is_valid(self, token, now):
+        return token is not None and now < token['expires_at']
+
+    def is_fresh(self, token, now):
+        return token is not None \
+            and now < token['expires_at'] - self.refresh_margin
+
+    def refresh(self):
+        """Return a fresh token, requesting one unless another thread or
+        process just did.
+
+        Threads of the process wait for each other. Processes wait for the
+        one holding the lock in cache, at most :attr:`lock_timeout`
+        seconds.
+
+        """
+        with self._refresh_lock:
+            token = self.cache.get(self.token_key)
+            if self.is_fresh(token, time.time()):
+                self._token = token
+                return token
+            lock_key = '{key}:lock'.format(key=self.token_key)
+            while not self.cache.add(lock_key, 1, self.lock_timeout):
+                time.sleep(0.05)
+                token = self.cache.get(self.token_key)
+                if self.is_fresh(token, time.time()):
+                    self._token = token
+                    return token
+            try:
+                token = self.request_token()
+                self.cache.set(
+                    self.token_key, token,
+                    max(int(token['expires_at'] - time.time()), 1))
+            finally:
+                self.cache.delete(lock_key)
+            self._token = token
+            return token
+
+    def schedule_refresh(self):
+        """Refresh token in the background, unless already scheduled."""
+        with self._scheduled_lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+        get_task_runner().apply_async(
+            self._background_refresh,
+            task_id='{key}:refresh'.format(key=self.token_key))
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        finally:
+            with self._scheduled_lock:
+                self._scheduled = False
+
+    def get_token(self):
+        """Return access token (string).
+
+        Tokens about to expire are refreshed in the background. A request
+        waits for a new token only if there is no valid one.
+
+        """
+        now = time.time()
+        token = self._token
+        if not self.is_fresh(token, now):
+            token = self.cache.get(self.token_key) or token
+            if not self.is_valid(token, now):
+                token = self.refresh()
+            elif not self.is_fresh(token, now):
+                self.schedule_refresh()
+            self._token = token
+        return token['access_token']
+
+    def request_account(self):
+        """Return ``{'account_id': <str>, 'base_uri': <str>}`` of account,
+        read from ``/oauth/userinfo``."""
+        data = self._call('oauth_userinfo', 'GET', '/oauth/userinfo', headers={
+            'Authorization': 'Bearer {token}'.format(token=self.get_token()),
+        })
+        accounts = data.get('accounts') or []
+        for account in accounts:
+            if self.account_id:
+                if account['account_id'] == self.account_id:
+                    break
+            elif account.get('is_default'):
+                break
+        else:
+            if self.account_id or not accounts:
+                raise DocuSignException(
+                    'DocuSign account {account} not found for user {user}'
+                    .format(account=self.account_id or '(default)',
+                            user=self.user_id))
+            account = accounts[0]
+        return {'account_id': account['account_id'],
+                'base_uri': account['base_uri'].rstrip('/')}
+
+    def get_account(self):
+        """Return account, see :meth:`request_account`, from cache if
+        possible."""
+        if self._account is None:
+            account = self.cache.get(self.account_key)
+            if account is None:
+                account = self.request_account()
+                self.cache.set(self.account_key, account,
+                               self.account_cache_timeout)
+            self._account = account
+        return self._account
+
+    def get_client_kwargs(self):
+        """Return keyword arguments of DocuSign client: provider, which
+        the client reads tokens from on every request, and account URLs."""
+        account = self.get_account()
+        root_url = '{base_uri}{path}'.format(base_uri=account['base_uri'],
+                                             path=API_PATH)
+        return {
+            'token_provider': self,
+            'root_url': root_url,
+            'account_id': account['account_id'],
+            'account_url': '{root_url}/accounts/{account_id}'.format(
+                root_url=root_url, account_id=account['account_id']),
+        }
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def create_token_provider(**kwargs):
+    """Return new :class:`JWTTokenProvider`, or ``None`` unless
+    ``settings.DOCUSIGN_JWT_USER_ID`` is set.
+
+    Provider is configured with ``settings.DOCUSIGN_INTEGRATOR_KEY``,
+    ``settings.DOCUSIGN_JWT_PRIVATE_KEY`` (PEM) or
+    ``settings.DOCUSIGN_JWT_PRIVATE_KEY_FILE``,
+    ``settings.DOCUSIGN_JWT_OAUTH_URL``, ``settings.DOCUSIGN_JWT_SCOPES``,
+    ``settings.DOCUSIGN_JWT_REFRESH_MARGIN``,
+    ``settings.DOCUSIGN_JWT_CACHE_ALIAS`` and
+    ``settings.DOCUSIGN_JWT_ACCOUNT_ID``. ``kwargs`` override them, e.g.
+    ``account_id`` of a tenant.
+
+    """
+    user_id = getattr(settings, 'DOCUSIGN_JWT_USER_ID', None)
+    if not user_id:
+        return None
+    private_key = getattr(settings, 'DOCUSIGN_JWT_PRIVATE_KEY', None)
+    if private_key is None:
+        with open(settings.DOCUSIGN_JWT_PRIVATE_KEY_FILE) as key_file:
+            private_key = key_file.read()
+    provider_kwargs = {
+        'integrator_key': settings.DOCUSIGN_INTEGRATOR_KEY,
+        'user_id': user_id,
+        'private_key': private_key,
+        'oauth_url': getattr(settings, 'DOCUSIGN_JWT_OAUTH_URL',
+                             DEFAULT_JWT_OAUTH_URL),
+        'scopes': getattr(settings, 'DOCUSIGN_JWT_SCOPES',
+                          DEFAULT_JWT_SCOPES),
+        'refresh_margin': getattr(settings, 'DOCUSIGN_JWT_REFRESH_MARGIN',
+                                  DEFAULT_JWT_REFRESH_MARGIN),
+        'cache_alias': getattr(settings, 'DOCUSIGN_JWT_CACHE_ALIAS',
+                               'default'),
+        'account_id': getattr(settings, 'DOCUSIGN_JWT_ACCOUNT_ID', None),
+    }
+    provider_kwargs.update(kwargs)
+    return JWTTokenProvider(**provider_kwargs)
+
+
+def get_token_provider():
+    """Return process-wide :class:`JWTTokenProvider`, or ``None`` unless
+    ``settings.DOCUSIGN_JWT_USER_ID`` is set.
+
+    Provider is created on first access, see :func:`create_token_provider`.
+
+    """
+    global _provider
+    if not getattr(settings, 'DOCUSIGN_JWT_USER_ID', None):
+        return None
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = create_token_provider()
+    return _provider
+
+
+def reset_token_provider():
+    """Drop process-wide provider. Typically used in tests."""
+    global _provider
+    with _provider_lock:
+        _provider = None
+
+
+@receiver(setting_changed)
+def on_setting_changed(setting, **kwargs):
+    """Reset provider when a ``DOCUSIGN_JWT_*`` or
+    ``DOCUSIGN_INTEGRATOR_KEY`` setting changes."""
+    if setting.startswith('DOCUSIGN_JWT_') \
+            or setting == 'DOCUSIGN_INTEGRATOR_KEY':
+        reset_token_provider()
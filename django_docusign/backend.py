@@ -1,9 +1,147 @@
 from __future__ import unicode_literals
 
+import datetime
+import hashlib
+import math
+import operator
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 import pydocusign
 from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db.models import Prefetch, prefetch_related_objects
+from django.dispatch import receiver
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive
 from django_anysign import api as django_anysign
 
+from django_docusign.auth import get_token_provider
+from django_docusign.cache import (DEFAULT_PAGE_IMAGE_CACHE_TIMEOUT,
+                                   get_document_index_cache,
+                                   get_page_image_cache, get_recipient_cache,
+                                   get_template_cache, get_validator_cache)
+from django_docusign.client import get_client_pool
+from django_docusign.dedup import (DEFAULT_DOCUMENT_INDEX_THRESHOLD,
+                                   DocumentIndex)
+from django_docusign.documents import spool_document
+from django_docusign.tasks import get_task_runner
+from django_docusign.tenants import get_tenant_router
+
+#: Default number of threads sending envelopes in
+#: :meth:`DocuSignBackend.create_signatures`.
+DEFAULT_BULK_MAX_WORKERS = 4
+
+#: Default number of threads downloading documents in
+#: :meth:`DocuSignBackend.get_docusign_documents`.
+DEFAULT_DOCUMENT_WORKERS = 1
+
+#: Default number of seconds a prefetch of page images is claimed, at most,
+#: see :meth:`DocuSignBackend.prefetch_page_images`.
+DEFAULT_PAGE_IMAGE_PREFETCH_TIMEOUT = 600
+
+#: Document ID of DocuSign's "combined" document, i.e. every document of the
+#: envelope in a single PDF.
+COMBINED_DOCUMENT_ID = 'combined'
+
+#: Options of DocuSign client read from ``settings.DOCUSIGN_<OPTION>``.
+CLIENT_SETTINGS = ('root_url', 'username', 'password', 'integrator_key',
+                   'account_id', 'account_url', 'app_token', 'oauth2_token',
+                   'timeout', 'connect_timeout', 'operation_timeouts',
+                   'retries', 'retry_backoff')
+
+_client_settings = None
+
+
+def get_client_settings():
+    """Return dictionary of client options set in ``settings.DOCUSIGN_*``.
+
+    Settings are read once, then the dictionary is reused until a
+    ``DOCUSIGN_*`` setting changes (see :data:`setting_changed`). Do not
+    modify it.
+
+    """
+    global _client_settings
+    if _client_settings is None:
+        client_settings = {}
+        for key in CLIENT_SETTINGS:
+            setting_name = 'DOCUSIGN_{0}'.format(key.upper())
+            try:
+                client_settings[key] = getattr(settings, setting_name)
+            except AttributeError:
+                pass
+        _client_settings = client_settings
+    return _client_settings
+
+
+def reset_client_settings():
+    """Forget client options read from settings."""
+    global _client_settings
+    _client_settings = None
+
+
+@receiver(setting_changed)
+def on_setting_changed(setting, **kwargs):
+    """Reset client options when a ``DOCUSIGN_*`` setting changes, e.g. in
+    tests with ``override_settings``."""
+    if setting.startswith('DOCUSIGN_'):
+        reset_client_settings()
+
+
+def count_pages(document_data):
+    """Return number of pages of document in envelope's document list, or
+    ``None`` if unknown."""
+    pages = document_data.get('pages')
+    if isinstance(pages, list):
+        return len(pages)
+    try:
+        return int(pages)
+    except (TypeError, ValueError):
+        return None
+
+
+def has_prefetched_signers(signature):
+    """Return whether signers of ``signature`` instance have been
+    prefetched."""
+    return 'signers' in getattr(signature, '_prefetched_objects_cache', {})
+
+
+class BulkCreateResult(object):
+    """Result of :meth:`DocuSignBackend.create_signatures`."""
+    def __init__(self):
+        #: List of signatures registered in DocuSign service.
+        self.succeeded = []
+        #: List of ``(signature, exception)`` for failed signatures.
+        self.failed = []
+        #: Duration, in seconds, of DocuSign calls.
+        self.latencies = []
+        #: Total duration, in seconds.
+        self.elapsed = 0.0
+
+    def add(self, signature, exception, latency):
+        self.latencies.append(latency)
+        if exception is None:
+            self.succeeded.append(signature)
+        else:
+            self.failed.append((signature, exception))
+
+    @property
+    def throughput(self):
+        """Number of signatures registered per second."""
+        if not self.elapsed:
+            return 0.0
+        return len(self.succeeded) / self.elapsed
+
+    def latency_percentile(self, percentile):
+        """Return latency (seconds) for ``percentile`` (between 0 and 100).
+        """
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        rank = int(math.ceil(percentile / 100.0 * len(latencies)))
+        return latencies[max(rank, 1) - 1]
+
 
 class DocuSignBackend(django_anysign.SignatureBackend):
     def __init__(self, name='DocuSign', code='docusign',
@@ -13,6 +151,9 @@ class DocuSignBackend(django_anysign.SignatureBackend):
         Additional ``kwargs`` are proxied to
         :class:`pydocusign.DocuSignClient`.
 
+        Clients are shared between backend instances configured with the
+        same options, see :meth:`get_client`.
+
         """
         super(DocuSignBackend, self).__init__(
             name=name,
@@ -20,16 +161,90 @@ class DocuSignBackend(django_anysign.SignatureBackend):
             url_namespace=url_namespace,
         )
         client_kwargs = self.get_client_kwargs(**kwargs)
-        #: Instance of :class:`~pydocusign.client.DocuSignClient`
-        self.docusign_client = pydocusign.DocuSignClient(**client_kwargs)
+        #: Instance of :class:`~django_docusign.client.DocuSignClient`
+        self.docusign_client = self.get_client(**client_kwargs)
+        #: Cache of template definitions, ``None`` if disabled.
+        self.template_cache = self.get_template_cache()
+        #: Cache of envelope recipients, ``None`` if disabled.
+        self.recipient_cache = self.get_recipient_cache()
+        #: Index of documents sent repeatedly, ``None`` if disabled.
+        self.document_index = self.get_document_index()
+        #: Cache of page images, ``None`` if disabled.
+        self.page_image_cache = self.get_page_image_cache()
+        #: Cache of validators of cached content.
+        self.validator_cache = self.get_validator_cache()
+
+    def get_client(self, **client_kwargs):
+        """Return DocuSign client for ``client_kwargs``.
+
+        Default implementation returns a client from process-wide pool, so
+        that HTTP connections are kept alive between requests.
+
+        """
+        return get_client_pool().get(**client_kwargs)
+
+    def get_template_cache(self):
+        """Return cache for template definitions, or ``None``.
+
+        Default implementation returns process-wide cache configured with
+        ``settings.DOCUSIGN_TEMPLATE_CACHE*``.
+
+        """
+        return get_template_cache()
+
+    def get_recipient_cache(self):
+        """Return cache for envelope recipients, or ``None``.
+
+        Default implementation depends on
+        ``settings.DOCUSIGN_RECIPIENT_CACHE*``.
+
+        """
+        return get_recipient_cache()
+
+    def get_page_image_cache(self):
+        """Return cache for page images, or ``None``.
+
+        Default implementation returns process-wide cache, depending on
+        ``settings.DOCUSIGN_PAGE_IMAGE_*``.
+
+        """
+        return get_page_image_cache()
+
+    def get_validator_cache(self):
+        """Return cache for validators of cached content.
+
+        Default implementation returns process-wide cache.
+
+        """
+        return get_validator_cache()
+
+    def get_document_index(self):
+        """Return :class:`~django_docusign.dedup.DocumentIndex`, or ``None``.
+
+        Default implementation depends on
+        ``settings.DOCUSIGN_DOCUMENT_INDEX*``.
+
+        """
+        cache = get_document_index_cache()
+        if cache is None:
+            return None
+        return DocumentIndex(
+            self.docusign_client, cache,
+            threshold=getattr(settings, 'DOCUSIGN_DOCUMENT_INDEX_THRESHOLD',
+                              DEFAULT_DOCUMENT_INDEX_THRESHOLD),
+            timeout=getattr(settings, 'DOCUSIGN_DOCUMENT_INDEX_TIMEOUT',
+                            None))
 
     def get_client_kwargs(self, **kwargs):
         """Return keyword arguments for use with DocuSign client factory.
 
         Uses, in order (the latter override the former):
 
-        1. ``settings.DOCUSIGN_*``
-        2. ``kwargs``
+        1. ``settings.DOCUSIGN_*``, read once, see
+           :func:`get_client_settings`
+        2. token provider and account of :meth:`get_token_provider`, unless
+           ``kwargs`` has an ``oauth2_token``
+        3. ``kwargs``
 
         .. note::
 
@@ -37,24 +252,24 @@ class DocuSignBackend(django_anysign.SignatureBackend):
            variables ``DOCUSIGN_*`` if available.
 
         """
-        client_kwargs = {}
-        for key in ['root_url',
-                    'username',
-                    'password',
-                    'integrator_key',
-                    'account_id',
-                    'account_url',
-                    'app_token',
-                    'oauth2_token',
-                    'timeout']:
-            setting_name = 'DOCUSIGN_{0}'.format(key.upper())
-            try:
-                client_kwargs[key] = getattr(settings, setting_name)
-            except AttributeError:
-                pass
+        client_kwargs = dict(get_client_settings())
+        if 'oauth2_token' not in kwargs:
+            provider = self.get_token_provider()
+            if provider is not None:
+                client_kwargs.update(provider.get_client_kwargs())
         client_kwargs.update(kwargs)
         return client_kwargs
 
+    def get_token_provider(self):
+        """Return :class:`~django_docusign.auth.JWTTokenProvider`, or
+        ``None``.
+
+        Default implementation returns process-wide provider, if
+        ``settings.DOCUSIGN_JWT_*`` are set.
+
+        """
+        return get_token_provider()
+
     def get_docusign_tabs(self, signer):
         """Return list of pydocusign's tabs for Signer instance.
 
@@ -64,15 +279,42 @@ class DocuSignBackend(django_anysign.SignatureBackend):
         """
         return []
 
-    def get_docusign_signers(self, signature):
+    def get_signers_prefetch(self):
+        """Return :class:`~django.db.models.Prefetch` of signers, ordered by
+        ``signing_order``, for ``prefetch_related()``."""
+        return Prefetch(
+            'signers',
+            queryset=django_anysign.get_signer_model().objects.order_by(
+                'signing_order'))
+
+    def get_signers(self, signature):
+        """Return list of ``signature``'s signers, ordered by
+        ``signing_order``.
+
+        Signers are fetched once per ``signature`` instance: they are
+        prefetched, so that next calls do not query database. Signers
+        already prefetched (e.g. with ``prefetch_related('signers')``) are
+        reused.
+
+        """
+        if not has_prefetched_signers(signature):
+            prefetch_related_objects([signature],
+                                     self.get_signers_prefetch())
+        return sorted(signature.signers.all(),
+                      key=operator.attrgetter('signing_order'))
+
+    def get_docusign_signers(self, signature, signers=None):
         """Return list of pydocusign's Signer for Signature instance.
 
-        Default implementation reads name and email from database.
+        Default implementation reads name and email from database, unless
+        ``signers`` (ordered list of signer instances) is given.
 
         """
-        signers = []
+        if signers is None:
+            signers = self.get_signers(signature)
+        docusign_signers = []
         position = 1
-        for signer in signature.signers.all().order_by('signing_order'):
+        for signer in signers:
             tabs = self.get_docusign_tabs(signer)
             signer = pydocusign.Signer(
                 email=signer.email,
@@ -82,44 +324,139 @@ class DocuSignBackend(django_anysign.SignatureBackend):
                 routingOrder=position,
                 tabs=tabs,
             )
-            signers.append(signer)
+            docusign_signers.append(signer)
             position += 1
-        return signers
+        return docusign_signers
+
+    def get_recipient_cache_key(self, envelope_id):
+        """Return key of envelope's recipients in :attr:`recipient_cache`."""
+        return '{root_url}/envelopes/{envelope_id}/recipients'.format(
+            root_url=self.docusign_client.root_url,
+            envelope_id=envelope_id)
+
+    def get_envelope_recipients(self, envelope_id):
+        """Return signers of envelope ``envelope_id``, indexed by
+        ``clientUserId``.
+
+        Recipients are read from :attr:`recipient_cache` if available.
+
+        """
+        if self.recipient_cache is not None:
+            key = self.get_recipient_cache_key(envelope_id)
+            recipients = self.recipient_cache.get(key)
+            if recipients is not None:
+                return recipients
+        response = self.docusign_client.get_envelope_recipients(envelope_id)
+        recipients = self.index_recipients(response)
+        if self.recipient_cache is not None:
+            self.recipient_cache.set(key, recipients)
+        return recipients
+
+    def index_recipients(self, response):
+        """Return signers in DocuSign's recipients ``response``, indexed by
+        ``clientUserId``."""
+        recipients = {}
+        for recipient in response.get('signers', []):
+            if recipient.get('clientUserId'):
+                recipients[recipient['clientUserId']] = recipient
+        return recipients
+
+    def invalidate_recipients(self, envelope_id):
+        """Remove recipients of envelope ``envelope_id`` from cache.
+
+        Backend calls it when it alters the envelope. Call it if you alter
+        envelope's recipients by other means.
+
+        """
+        if self.recipient_cache is not None:
+            self.recipient_cache.delete(
+                self.get_recipient_cache_key(envelope_id))
 
     def get_docusign_recipient(self, signer):
         """
         Get the recipient (dict) matching the given signer
         """
-        response = self.docusign_client.get_envelope_recipients(
+        recipients = self.get_envelope_recipients(
             signer.signature.signature_backend_id)
-
-        # get recipient matching the signer
-        for recipient in response['signers']:
-            if recipient['clientUserId'] == str(signer.pk):
-                return recipient
-        else:
+        try:
+            return recipients[str(signer.pk)]
+        except KeyError:
             raise Exception("Failed to retrieve Signer")
 
-    def is_last_signer(self, signer):
+    def is_last_signer(self, signer, signers=None):
         """Return True if ``signer`` is the last signer for the signature
         request.
+
+        Reads ``signers`` or prefetched signers if available, else queries
+        database.
+
         """
+        if signers is None and has_prefetched_signers(signer.signature):
+            signers = signer.signature.signers.all()
+        if signers is not None:
+            return all(other.signing_order <= signer.signing_order
+                       for other in signers)
         return not signer.signature.signers.filter(
             signing_order__gt=signer.signing_order).exists()
 
-    def get_docusign_roles(self, signature):
+    def get_template_cache_key(self, template_id):
+        """Return key of template ``template_id`` in :attr:`template_cache`.
+
+        Templates belong to accounts, so the key mentions the account.
+
+        """
+        if not self.docusign_client.account_url:
+            self.docusign_client.login_information()
+        return '{account_url}/templates/{template_id}'.format(
+            account_url=self.docusign_client.account_url,
+            template_id=template_id)
+
+    def get_template_definition(self, template_id):
+        """Return definition (dict) of DocuSign template ``template_id``.
+
+        Definitions are read from :attr:`template_cache` if available.
+
+        """
+        if self.template_cache is None:
+            return self.docusign_client.get_template(template_id)
+        key = self.get_template_cache_key(template_id)
+        template_definition = self.template_cache.get(key)
+        if template_definition is None:
+            template_definition = self.docusign_client.get_template(
+                template_id)
+            self.template_cache.set(key, template_definition)
+        return template_definition
+
+    def invalidate_template(self, template_id):
+        """Remove definition of template ``template_id`` from cache.
+
+        Call it when the template is updated on DocuSign side.
+
+        """
+        if self.template_cache is not None:
+            self.template_cache.delete(
+                self.get_template_cache_key(template_id))
+
+    def get_docusign_roles(self, signature, signers=None,
+                           template_definition=None):
         """Return list of pydocusign's Role for Signature instance.
 
-        Default implementation reads name, email and role name from database.
+        Default implementation reads name, email and role name from database,
+        unless ``signers`` (ordered list of signer instances) is given. Role
+        names are read from ``template_definition``, fetched with
+        :meth:`get_template_definition` if not given.
 
         """
+        if signers is None:
+            signers = self.get_signers(signature)
         # Get docusign template definition, to retrieve role names
-        template_definition = self.docusign_client.get_template(
-            signature.signature_type.docusign_template_id)
+        if template_definition is None:
+            template_definition = self.get_template_definition(
+                signature.signature_type.docusign_template_id)
         template_roles = template_definition['recipients']['signers']
         roles = []
         # Build roles
-        for signer in signature.signers.all().order_by('signing_order'):
+        for signer in signers:
             role = pydocusign.Role(
                 email=signer.email,
                 name=signer.full_name,
@@ -129,30 +466,126 @@ class DocuSignBackend(django_anysign.SignatureBackend):
             roles.append(role)
         return roles
 
-    def get_docusign_documents(self, signature):
+    def get_docusign_documents(self, signature, max_workers=None,
+                               combined=False):
         """Generate list of documents for ``signature`` model instance.
 
         Ignores special document "certificate".
 
-        Yields file-like objects.
+        Yields :class:`~django_docusign.documents.SpooledDocument`
+        instances, see :meth:`download_docusign_document`, in the order of
+        envelope's document list.
+
+        With ``max_workers`` greater than 1, documents are downloaded
+        concurrently by a pool of ``max_workers`` threads. Default is
+        ``settings.DOCUSIGN_DOCUMENT_WORKERS``, i.e. ``1``: documents are
+        downloaded one after another, when consumed.
+
+        With ``combined=True``, yields a single document: every document of
+        the envelope in one PDF, downloaded with one request.
 
-        .. warning:: Close returned documents!
+        .. warning:: Close returned documents, and the generator if it is
+           not consumed entirely!
 
         """
         envelope_id = signature.signature_backend_id
+        if combined:
+            yield self.download_docusign_document(signature,
+                                                  COMBINED_DOCUMENT_ID)
+            return
+        if max_workers is None:
+            max_workers = getattr(settings, 'DOCUSIGN_DOCUMENT_WORKERS',
+                                  DEFAULT_DOCUMENT_WORKERS)
         document_list = self.docusign_client \
                             .get_envelope_document_list(envelope_id)
-        for document_data in document_list:
-            document_id = document_data['documentId']
-            if document_id != 'certificate':
-                document = self.docusign_client \
-                               .get_envelope_document(envelope_id, document_id)
+        document_ids = [document_data['documentId']
+                        for document_data in document_list
+                        if document_data['documentId'] != 'certificate']
+        if max_workers <= 1 or len(document_ids) <= 1:
+            for document_id in document_ids:
+                yield self.download_docusign_document(signature, document_id)
+            return
+        executor = ThreadPoolExecutor(
+            max_workers=min(max_workers, len(document_ids)))
+        futures = [executor.submit(self.download_docusign_document,
+                                   signature, document_id)
+                   for document_id in document_ids]
+        yielded = 0
+        try:
+            for future in futures:
+                document = future.result()
+                yielded += 1
                 yield document
+        finally:
+            # Consumer stopped early or a download failed: drop the rest.
+            for future in futures[yielded:]:
+                if not future.cancel() and future.exception() is None:
+                    future.result().close()
+            executor.shutdown()
 
-    def create_signature_from_document(self, signature, subject='', blurb='',
-                                       sobo_email=None, **env_params):
-        """Register ``signature`` in DocuSign service, for a signature from
-        document.
+    def download_docusign_document(self, signature, document_id,
+                                   expected_checksum=None):
+        """Download document ``document_id`` of ``signature``, return
+        :class:`~django_docusign.documents.SpooledDocument`.
+
+        Document is read by chunks, so that memory usage does not depend on
+        document's size. Size announced by DocuSign is verified, and so is
+        SHA-256 ``expected_checksum`` if provided.
+
+        """
+        envelope_id = signature.signature_backend_id
+        stream = self.docusign_client.get_envelope_document(envelope_id,
+                                                            document_id)
+        return spool_document(
+            stream,
+            name='{envelope_id}-{document_id}.pdf'.format(
+                envelope_id=envelope_id, document_id=document_id),
+            expected_checksum=expected_checksum)
+
+    def download_docusign_document_if_modified(self, signature, document_id,
+                                               validators=None,
+                                               expected_checksum=None):
+        """Same as :meth:`download_docusign_document`, unless the document
+        the caller holds is still valid.
+
+        ``validators`` are the ones returned with that document. Return
+        ``(document, validators)``, where ``document`` is ``None`` if the
+        caller's document is still valid. Documents of completed envelopes
+        are not checked again.
+
+        """
+        envelope_id = signature.signature_backend_id
+        if validators and self.get_envelope_completed(envelope_id) is not None:
+            return None, validators
+        stream, validators = self.docusign_client \
+            .get_envelope_document_if_modified(envelope_id, document_id,
+                                               validators=validators)
+        if stream is None:
+            return None, validators
+        document = spool_document(
+            stream,
+            name='{envelope_id}-{document_id}.pdf'.format(
+                envelope_id=envelope_id, document_id=document_id),
+            expected_checksum=expected_checksum)
+        return document, validators
+
+    def save_docusign_document(self, signature, document_id, storage, name,
+                               expected_checksum=None):
+        """Download document ``document_id`` of ``signature`` into Django
+        ``storage``, return name of saved file.
+
+        See :meth:`download_docusign_document`.
+
+        """
+        document = self.download_docusign_document(
+            signature, document_id, expected_checksum=expected_checksum)
+        with document:
+            return storage.save(name, document)
+
+    def build_envelope_from_document(self, signature, subject='', blurb='',
+                                     sobo_email=None, **env_params):
+        """Return envelope (not registered in DocuSign service yet) for a
+        signature from document.
 
         """
         # Prepare signers.
@@ -171,7 +604,7 @@ class DocuSignBackend(django_anysign.SignatureBackend):
             )
             i += 1
         # Create envelope with embedded signing.
-        envelope = pydocusign.Envelope(
+        return pydocusign.Envelope(
             emailSubject=subject,
             emailBlurb=blurb,
             status=pydocusign.Envelope.STATUS_SENT,
@@ -180,20 +613,21 @@ class DocuSignBackend(django_anysign.SignatureBackend):
             sobo_email=sobo_email,
             **env_params
         )
-        envelope.envelopeId = self.docusign_client \
-                                  .create_envelope_from_documents(envelope)
-        return envelope
 
-    def create_signature_from_template(self, signature, subject='', blurb='',
-                                       sobo_email=None, **env_params):
-        """Register ``signature`` in DocuSign service, for a signature from
-        document.
+    def build_envelope_from_template(self, signature, subject='', blurb='',
+                                     sobo_email=None, template_definition=None,
+                                     **env_params):
+        """Return envelope (not registered in DocuSign service yet) for a
+        signature from template.
+
+        ``template_definition`` is passed to :meth:`get_docusign_roles`.
 
         """
         # Prepare roles.
-        roles = self.get_docusign_roles(signature)
+        roles = self.get_docusign_roles(
+            signature, template_definition=template_definition)
         # Create envelope with embedded signing.
-        envelope = pydocusign.Envelope(
+        return pydocusign.Envelope(
             emailSubject=subject,
             emailBlurb=blurb,
             status=pydocusign.Envelope.STATUS_SENT,
@@ -202,6 +636,50 @@ class DocuSignBackend(django_anysign.SignatureBackend):
             sobo_email=sobo_email,
             **env_params
         )
+
+    def create_signature_from_document(self, signature, subject='', blurb='',
+                                       sobo_email=None, **env_params):
+        """Register ``signature`` in DocuSign service, for a signature from
+        document.
+
+        """
+        envelope = self.build_envelope_from_document(
+            signature, subject, blurb, sobo_email, **env_params)
+        envelope.envelopeId = self.send_envelope_from_documents(envelope)
+        return envelope
+
+    def send_envelope_from_documents(self, envelope):
+        """Register ``envelope`` built from documents in DocuSign service,
+        return envelope ID.
+
+        Documents registered in :attr:`document_index` are referenced as
+        composite templates, see
+        :meth:`~django_docusign.dedup.DocumentIndex.build_request`.
+
+        If ``settings.DOCUSIGN_MULTIPART_UPLOAD`` is ``True``, documents are
+        streamed from their file handles in a multipart request, see
+        :meth:`~django_docusign.client.DocuSignClient.create_envelope_from_documents_multipart`.
+        Else they are read in memory and encoded in JSON.
+
+        """
+        if self.document_index is not None:
+            data = self.document_index.build_request(envelope)
+            if data is not None:
+                return self.docusign_client.create_envelope_from_request(
+                    envelope, data)
+        if getattr(settings, 'DOCUSIGN_MULTIPART_UPLOAD', False):
+            return self.docusign_client \
+                       .create_envelope_from_documents_multipart(envelope)
+        return self.docusign_client.create_envelope_from_documents(envelope)
+
+    def create_signature_from_template(self, signature, subject='', blurb='',
+                                       sobo_email=None, **env_params):
+        """Register ``signature`` in DocuSign service, for a signature from
+        document.
+
+        """
+        envelope = self.build_envelope_from_template(
+            signature, subject, blurb, sobo_email, **env_params)
         envelope.envelopeId = self.docusign_client \
                                   .create_envelope_from_template(envelope)
         return envelope
@@ -221,31 +699,462 @@ class DocuSignBackend(django_anysign.SignatureBackend):
                 signature, subject, blurb, sobo_email, **env_params)
         # Update signature instance with backend's ID.
         signature.signature_backend_id = envelope.envelopeId
+        self.invalidate_recipients(envelope.envelopeId)
         signature.save()
+        self.schedule_page_image_prefetch(signature)
         # Return updated object.
         return signature
 
-    def post_recipient_view(self, signer, signer_return_url=None):
+    def create_signatures(self, signatures, subject='', blurb='',
+                          sobo_email=None, max_workers=None, rate_limit=None,
+                          batch_size=None, **env_params):
+        """Register ``signatures`` in DocuSign service, return
+        :class:`BulkCreateResult`.
+
+        Envelopes are built in calling thread (this is where database is
+        queried, see :meth:`build_envelope_from_document` and
+        :meth:`build_envelope_from_template`), then they are sent to DocuSign
+        by a pool of ``max_workers`` threads. At most ``rate_limit``
+        envelopes are sent per second.
+
+        Defaults for ``max_workers`` and ``rate_limit`` are
+        ``settings.DOCUSIGN_BULK_MAX_WORKERS`` and
+        ``settings.DOCUSIGN_BULK_RATE_LIMIT``.
+
+        Failures do not stop the process: they are collected in result.
+        Once every envelope has been sent, ``signature_backend_id`` of
+        successful signatures is saved with a single ``bulk_update()``.
+
+        """
+        if max_workers is None:
+            max_workers = getattr(settings, 'DOCUSIGN_BULK_MAX_WORKERS',
+                                  DEFAULT_BULK_MAX_WORKERS)
+        if rate_limit is None:
+            rate_limit = getattr(settings, 'DOCUSIGN_BULK_RATE_LIMIT', None)
+        result = BulkCreateResult()
+        # Fetch types and signers of every signature with two queries.
+        signatures = list(signatures)
+        prefetch_related_objects(signatures, 'signature_type',
+                                 self.get_signers_prefetch())
+        # Limit number of envelopes in memory (and open documents).
+        max_pending = max_workers * 2
+        pending = set()
+        next_submit = time.monotonic()
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for signature in signatures:
+                try:
+                    if signature.signature_type.docusign_template_id:
+                        envelope = self.build_envelope_from_template(
+                            signature, subject, blurb, sobo_email,
+                            **env_params)
+                        send = self.docusign_client \
+                                   .create_envelope_from_template
+                    else:
+                        envelope = self.build_envelope_from_document(
+                            signature, subject, blurb, sobo_email,
+                            **env_params)
+                        send = self.send_envelope_from_documents
+                except Exception as exception:
+                    result.failed.append((signature, exception))
+                    continue
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result.add(*future.result())
+                if rate_limit:
+                    delay = next_submit - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_submit = max(next_submit, time.monotonic()) \
+                        + 1.0 / rate_limit
+                pending.add(executor.submit(
+                    self._send_envelope, send, signature, envelope))
+            for future in pending:
+                result.add(*future.result())
+        result.elapsed = time.monotonic() - started
+        if result.succeeded:
+            model = type(result.succeeded[0])
+            model.objects.bulk_update(result.succeeded,
+                                      ['signature_backend_id'],
+                                      batch_size=batch_size)
+            for signature in result.succeeded:
+                self.schedule_page_image_prefetch(signature)
+        return result
+
+    def _send_envelope(self, send, signature, envelope):
+        """Call ``send(envelope)``, return (signature, exception, latency)."""
+        started = time.monotonic()
+        try:
+            envelope.envelopeId = send(envelope)
+        except Exception as exception:
+            return (signature, exception, time.monotonic() - started)
+        signature.signature_backend_id = envelope.envelopeId
+        return (signature, None, time.monotonic() - started)
+
+    def has_default_docusign_signers(self):
+        """Return whether :meth:`get_docusign_signers` is not overridden,
+        i.e. whether DocuSign recipients match rows of signer model."""
+        return type(self).get_docusign_signers \
+            is DocuSignBackend.get_docusign_signers
+
+    def get_recipient_view_data(self, signer, envelope_id):
+        """Return identification of ``signer`` for recipient view, as a
+        dictionary of ``clientUserId``, ``email``, ``userId`` and
+        ``userName``.
+
+        Reads cached recipients of envelope if available (without calling
+        DocuSign), else signer's row.
+
+        """
+        data = {
+            'clientUserId': signer.pk,
+            'email': signer.email,
+            'userId': None,
+            'userName': signer.full_name,
+        }
+        if self.recipient_cache is not None:
+            recipients = self.recipient_cache.get(
+                self.get_recipient_cache_key(envelope_id))
+            recipient = (recipients or {}).get(str(signer.pk))
+            if recipient:
+                data['email'] = recipient.get('email') or data['email']
+                data['userId'] = recipient.get('userId')
+                data['userName'] = recipient.get('name') or data['userName']
+        return data
+
+    def post_recipient_view(self, signer, signer_return_url=None,
+                            signers=None):
+        """Return URL of embedded signing view for ``signer``.
+
+        Recipient is identified with ``signer`` alone, see
+        :meth:`get_recipient_view_data`. If :meth:`get_docusign_signers` is
+        overridden or ``signers`` is given, every recipient of envelope is
+        built, so that ``signer``'s recipient is the one of the envelope.
+
+        """
+        envelope_id = signer.signature.signature_backend_id
+        if signer_return_url is None:
+            signer_return_url = self.get_signer_return_url(signer)
+        if signers is None and self.has_default_docusign_signers():
+            response_data = self.docusign_client.post_recipient_view(
+                envelopeId=envelope_id,
+                returnUrl=signer_return_url,
+                **self.get_recipient_view_data(signer, envelope_id))
+            # Signer is about to change recipient's status.
+            self.invalidate_recipients(envelope_id)
+            return response_data['url']
         # Prepare signers.
-        docusign_signers = self.get_docusign_signers(signer.signature)
+        docusign_signers = self.get_docusign_signers(signer.signature,
+                                                     signers=signers)
         # Create envelope with embedded signing.
         envelope = pydocusign.Envelope(
-            envelopeId=signer.signature.signature_backend_id,
+            envelopeId=envelope_id,
             recipients=docusign_signers,
         )
         docusign_signer = [ds for ds in docusign_signers
                            if ds.clientUserId == signer.pk][0]
-        if signer_return_url is None:
-            signer_return_url = self.get_signer_return_url(signer)
-        envelope.get_recipients(client=self.docusign_client)
-        return envelope.post_recipient_view(
+        url = envelope.post_recipient_view(
             client=self.docusign_client,
             recipient=docusign_signer,
             returnUrl=signer_return_url
         )
+        # Signer is about to change recipient's status.
+        self.invalidate_recipients(envelope_id)
+        return url
+
+    def get_page_image_cache_key(self, envelope_id, document_id, page_no,
+                                 dpi=None, max_width=None, max_height=None):
+        """Return key of page image in :attr:`page_image_cache`.
+
+        Images are fetched from the account's API, so the key mentions the
+        account.
+
+        """
+        if not self.docusign_client.account_id:
+            self.docusign_client.login_information()
+        return '{account}/{envelope}/{document}/' \
+               '{page}-{dpi}-{width}x{height}.png'.format(
+                   account=self.docusign_client.account_id,
+                   envelope=envelope_id, document=document_id, page=page_no,
+                   dpi=dpi or '', width=max_width or '',
+                   height=max_height or '')
 
     def get_page_image(self, signature, document_id, page_no, dpi=None,
                        max_width=None, max_height=None):
+        """Return PNG image (bytes) of page ``page_no`` of document.
+
+        Images are kept in :attr:`page_image_cache`, if enabled.
+
+        """
+        return self.get_envelope_page_image(
+            signature.signature_backend_id, document_id, page_no, dpi,
+            max_width, max_height)
+
+    def get_envelope_page_image(self, envelope_id, document_id, page_no,
+                                dpi=None, max_width=None, max_height=None):
+        """Same as :meth:`get_page_image`, with ``envelope_id`` instead of
+        signature model instance."""
+        if self.page_image_cache is None:
+            return self.docusign_client.get_page_image(
+                envelope_id, document_id, page_no, dpi, max_width,
+                max_height)
+        key = self.get_page_image_cache_key(
+            envelope_id, document_id, page_no, dpi, max_width, max_height)
+        image = self.page_image_cache.get(key)
+        if image is not None and self.is_page_image_fresh(envelope_id, key):
+            return image
+        # Revalidate cached image, or fetch it.
+        validators = self.validator_cache.get(key) if image is not None \
+            else None
+        new_image, validators = self.docusign_client \
+            .get_page_image_if_modified(envelope_id, document_id, page_no,
+                                        dpi, max_width, max_height,
+                                        validators=validators)
+        if new_image is not None:
+            image = new_image
+        self.store_page_image(key, image, validators,
+                              modified=new_image is not None)
+        return image
+
+    def is_page_image_fresh(self, envelope_id, key):
+        """Return whether page image cached as ``key`` can be used without
+        asking DocuSign.
+
+        Images of completed envelopes never change. Others are revalidated
+        every ``settings.DOCUSIGN_PAGE_IMAGE_CACHE_TIMEOUT`` seconds.
+
+        """
+        if self.get_envelope_completed(envelope_id) is not None:
+            return True
+        entry = self.validator_cache.get(key)
+        if entry is None:
+            return False
+        timeout = getattr(settings, 'DOCUSIGN_PAGE_IMAGE_CACHE_TIMEOUT',
+                          DEFAULT_PAGE_IMAGE_CACHE_TIMEOUT)
+        return time.time() - entry['checked'] < timeout
+
+    def store_page_image(self, key, image, validators, modified=True):
+        """Record that page image ``key`` was checked now, with
+        ``validators``. Store ``image`` if ``modified``."""
+        if modified:
+            self.page_image_cache.set(key, image)
+        self.validator_cache.set(key, dict(validators or {},
+                                           checked=time.time()))
+
+    def get_envelope_completed_key(self, envelope_id):
+        """Return key of completion date of envelope in
+        :attr:`validator_cache`."""
+        return '{envelope_id}/completed'.format(envelope_id=envelope_id)
+
+    def mark_envelope_completed(self, envelope_id, completed_at=None):
+        """Record that envelope is completed, i.e. that its documents and
+        page images will not change anymore.
+
+        ``completed_at`` is a datetime or an ISO 8601 string, and defaults
+        to now. Naive dates are UTC.
+
+        """
+        if completed_at is None:
+            completed_at = datetime.datetime.now(datetime.timezone.utc)
+        elif not isinstance(completed_at, datetime.datetime):
+            completed_at = parse_datetime(completed_at)
+        if is_naive(completed_at):
+            completed_at = completed_at.replace(tzinfo=datetime.timezone.utc)
+        self.validator_cache.set(self.get_envelope_completed_key(envelope_id),
+                                 completed_at.timestamp())
+
+    def get_envelope_completed(self, envelope_id):
+        """Return completion date of envelope (POSIX timestamp), or ``None``
+        if envelope is not known to be completed."""
+        return self.validator_cache.get(
+            self.get_envelope_completed_key(envelope_id))
+
+    def get_page_image_validators(self, signature, document_id, page_no,
+                                  dpi=None, max_width=None, max_height=None):
+        """Return validators of page image, without fetching it: dictionary
+        with ``etag`` (quoted string) and ``last_modified`` (POSIX
+        timestamp), or empty dictionary if image may change.
+
+        Use it to answer conditional requests of browsers, see
+        :class:`~django_docusign.views.PageImageView`.
+
+        """
         envelope_id = signature.signature_backend_id
-        return self.docusign_client.get_page_image(
+        completed = self.get_envelope_completed(envelope_id)
+        if completed is None:
+            return {}
+        key = self.get_page_image_cache_key(
             envelope_id, document_id, page_no, dpi, max_width, max_height)
+        digest = hashlib.sha256('{key}@{completed}'.format(
+            key=key, completed=completed).encode('utf-8')).hexdigest()
+        return {'etag': '"{digest}"'.format(digest=digest),
+                'last_modified': int(completed)}
+
+    def prefetch_page_images(self, signature, pages, dpi=None,
+                             max_width=None, max_height=None):
+        """Fetch first ``pages`` pages of every document of ``signature``
+        into :attr:`page_image_cache`, in the background.
+
+        Return :class:`concurrent.futures.Future` of the number of images
+        fetched, or ``None`` if cache is disabled or if the same prefetch is
+        pending. Work is done by
+        :func:`~django_docusign.tasks.get_task_runner`.
+
+        Prefetches are claimed in ``settings.DOCUSIGN_IDEMPOTENCY_CACHE_ALIAS``
+        Django cache until they are done, at most
+        ``settings.DOCUSIGN_PAGE_IMAGE_PREFETCH_TIMEOUT`` seconds.
+
+        """
+        if self.page_image_cache is None:
+            return None
+        envelope_id = signature.signature_backend_id
+        task_id = 'docusign:page-images:{key}:{pages}'.format(
+            key=self.get_page_image_cache_key(envelope_id, '*', '*', dpi,
+                                              max_width, max_height),
+            pages=pages)
+        cache = self.get_prefetch_cache()
+        if not cache.add(task_id, 'pending', getattr(
+                settings, 'DOCUSIGN_PAGE_IMAGE_PREFETCH_TIMEOUT',
+                DEFAULT_PAGE_IMAGE_PREFETCH_TIMEOUT)):
+            return None
+        try:
+            return get_task_runner().apply_async(
+                self.prefetch_page_images_task,
+                args=(task_id, envelope_id, pages, dpi, max_width,
+                      max_height),
+                task_id=task_id)
+        except Exception:
+            cache.delete(task_id)
+            raise
+
+    def get_prefetch_cache(self):
+        """Return Django cache where pending prefetches are claimed."""
+        return caches[getattr(settings, 'DOCUSIGN_IDEMPOTENCY_CACHE_ALIAS',
+                              'default')]
+
+    def prefetch_page_images_task(self, task_id, envelope_id, pages,
+                                  dpi=None, max_width=None, max_height=None):
+        """Run :meth:`warm_page_images`, then release ``task_id``."""
+        try:
+            return self.warm_page_images(envelope_id, pages, dpi, max_width,
+                                         max_height)
+        finally:
+            self.get_prefetch_cache().delete(task_id)
+
+    def warm_page_images(self, envelope_id, pages, dpi=None, max_width=None,
+                         max_height=None):
+        """Fetch first ``pages`` pages of every document of envelope into
+        :attr:`page_image_cache`, return the number of images fetched.
+
+        Documents shorter than ``pages`` are detected with envelope's
+        document list, or by the first page DocuSign cannot render.
+
+        """
+        count = 0
+        document_list = self.docusign_client \
+                            .get_envelope_document_list(envelope_id)
+        for document_data in document_list:
+            document_id = document_data['documentId']
+            if document_id == 'certificate':
+                continue
+            total = count_pages(document_data)
+            if total is not None:
+                total = min(total, pages)
+            for page_no in range(1, (total or pages) + 1):
+                try:
+                    self.get_envelope_page_image(
+                        envelope_id, document_id, page_no, dpi, max_width,
+                        max_height)
+                except pydocusign.exceptions.DocuSignException:
+                    if total is not None:
+                        raise
+                    break
+                count += 1
+        return count
+
+    def schedule_page_image_prefetch(self, signature):
+        """Prefetch page images of newly created ``signature``, as configured
+        by ``settings.DOCUSIGN_PAGE_IMAGE_PREFETCH`` (number of pages,
+        defaults to ``0``, i.e. disabled) and
+        ``settings.DOCUSIGN_PAGE_IMAGE_PREFETCH_OPTIONS`` (``dpi``,
+        ``max_width`` and ``max_height`` keyword arguments of
+        :meth:`get_page_image`)."""
+        pages = getattr(settings, 'DOCUSIGN_PAGE_IMAGE_PREFETCH', 0)
+        if not pages:
+            return None
+        options = getattr(settings, 'DOCUSIGN_PAGE_IMAGE_PREFETCH_OPTIONS', {})
+        return self.prefetch_page_images(signature, pages, **options)
+
+
+class TenantDocuSignBackend(DocuSignBackend):
+    """DocuSign backend for many accounts, i.e. tenants.
+
+    ``tenant`` identifies the account, it defaults to ``account_id``
+    argument. Calls are routed to the client of the tenant, which is kept
+    alive with its caches of templates and recipients, and its rate-limit
+    budget, by the process-wide
+    :class:`~django_docusign.tenants.TenantRouter`. Without tenant, backend
+    behaves like :class:`DocuSignBackend`.
+
+    With OAuth2 JWT grant, tokens are requested for account ``account_id``
+    (defaults to ``tenant``), with a token provider of the tenant.
+
+    """
+    def __init__(self, name='DocuSign', code='docusign',
+                 url_namespace='anysign', tenant=None, **kwargs):
+        #: ID of tenant.
+        self.tenant_id = tenant or kwargs.get('account_id')
+        #: ID of tenant's account, for OAuth2 JWT grant.
+        self.tenant_account_id = kwargs.get('account_id') or tenant
+        #: :class:`~django_docusign.tenants.Tenant` instance, ``None`` if
+        #: there is no tenant.
+        self.tenant = None
+        super(TenantDocuSignBackend, self).__init__(
+            name=name, code=code, url_namespace=url_namespace, **kwargs)
+
+    def get_tenant_router(self):
+        """Return :class:`~django_docusign.tenants.TenantRouter`."""
+        return get_tenant_router()
+
+    def get_token_provider(self):
+        """Return token provider of tenant, see
+        :meth:`~django_docusign.tenants.TenantRouter.get_token_provider`."""
+        if not self.tenant_id:
+            return super(TenantDocuSignBackend, self).get_token_provider()
+        return self.get_tenant_router().get_token_provider(
+            self.tenant_id, self.tenant_account_id)
+
+    def get_client(self, **client_kwargs):
+        """Return client of tenant."""
+        if not self.tenant_id:
+            return super(TenantDocuSignBackend, self).get_client(
+                **client_kwargs)
+        self.tenant = self.get_tenant_router().get(self.tenant_id,
+                                                   **client_kwargs)
+        return self.tenant.client
+
+    def get_template_cache(self):
+        """Return cache of template definitions of tenant."""
+        if self.tenant is None:
+            return super(TenantDocuSignBackend, self).get_template_cache()
+        return self.tenant.template_cache
+
+    def get_recipient_cache(self):
+        """Return cache of recipients of tenant, if recipients are shared
+        (see :func:`~django_docusign.cache.get_recipient_cache`)."""
+        if self.tenant is None or self.tenant.recipient_cache is None:
+            return super(TenantDocuSignBackend, self).get_recipient_cache()
+        return self.tenant.recipient_cache
+
+    def get_page_image_cache(self):
+        """Return cache of page images of tenant."""
+        if self.tenant is None:
+            return super(TenantDocuSignBackend, self).get_page_image_cache()
+        return self.tenant.page_image_cache
+
+    def get_validator_cache(self):
+        """Return cache of validators of tenant."""
+        if self.tenant is None:
+            return super(TenantDocuSignBackend, self).get_validator_cache()
+        return self.tenant.validator_cache
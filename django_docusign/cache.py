@@ -0,0 +1,471 @@
+"""Caches for data fetched from DocuSign."""
+from __future__ import unicode_literals
+
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import get_storage_class
+
+#: Default number of seconds template definitions are kept in cache.
+DEFAULT_TEMPLATE_CACHE_TIMEOUT = 3600
+
+#: Default maximum number of template definitions kept in memory.
+DEFAULT_TEMPLATE_CACHE_SIZE = 128
+
+#: Default number of seconds recipients are kept in cache.
+DEFAULT_RECIPIENT_CACHE_TIMEOUT = 30
+
+#: Default maximum number of envelopes whose recipients are kept in memory.
+DEFAULT_RECIPIENT_CACHE_SIZE = 1024
+
+#: Default number of seconds before cached page images are revalidated.
+DEFAULT_PAGE_IMAGE_CACHE_TIMEOUT = 3600
+
+#: Default maximum size, in bytes, of page images kept in memory.
+DEFAULT_PAGE_IMAGE_CACHE_BYTES = 32 * 1024 * 1024
+
+#: Default maximum number of validators kept in memory.
+DEFAULT_VALIDATOR_CACHE_SIZE = 4096
+
+
+class LRUCache(object):
+    """Thread-safe in-process cache with LRU eviction and expiration.
+
+    At most ``maxsize`` items are kept. Items expire ``timeout`` seconds
+    after they have been set (``None`` means never).
+
+    Attributes ``hits`` and ``misses`` count lookups.
+
+    """
+    def __init__(self, maxsize=128, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires <= time.monotonic():
+                self._pop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.timeout is None:
+            expires = None
+        else:
+            expires = time.monotonic() + self.timeout
+        with self._lock:
+            self._pop(key)
+            if not self._admit(value):
+                return
+            self._data[key] = (value, expires)
+            while self._is_full():
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def _pop(self, key):
+        """Remove ``key``, lock held."""
+        self._data.pop(key, None)
+
+    def _admit(self, value):
+        """Account for ``value`` about to be cached, lock held. Return
+        ``False`` to skip it."""
+        return True
+
+    def _is_full(self):
+        """Return whether items have to be evicted, lock held."""
+        return len(self._data) > self.maxsize
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SizedLRUCache(LRUCache):
+    """:class:`LRUCache` of bytes, bounded by total size of values.
+
+    Least recently used items are evicted so that values sum up to at most
+    ``maxbytes`` bytes. Values larger than ``maxbytes`` are not cached.
+
+    """
+    def __init__(self, maxbytes, timeout=None):
+        super(SizedLRUCache, self).__init__(maxsize=None, timeout=timeout)
+        self.maxbytes = maxbytes
+        #: Total size of cached values, in bytes.
+        self.size = 0
+
+    def _pop(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= len(item[0])
+
+    def _admit(self, value):
+        if len(value) > self.maxbytes:
+            return False
+        self.size += len(value)
+        return True
+
+    def _is_full(self):
+        return self.size > self.maxbytes
+
+    def clear(self):
+        with self._lock:
+            self.size = 0
+        super(SizedLRUCache, self).clear()
+
+
+class StorageCache(object):
+    """Same interface as :class:`LRUCache`, for bytes, backed by a Django
+    file storage.
+
+    Keys are relative paths, files are saved under ``location`` in
+    ``storage``. Files older than ``timeout`` seconds are ignored (and
+    deleted) if ``storage`` supports ``get_modified_time()``.
+
+    """
+    def __init__(self, storage, timeout=None, location='docusign'):
+        self.storage = storage
+        self.timeout = timeout
+        self.location = location
+        self.hits = 0
+        self.misses = 0
+
+    def get_name(self, key):
+        return '{location}/{key}'.format(location=self.location, key=key)
+
+    def is_expired(self, name):
+        if self.timeout is None:
+            return False
+        try:
+            modified = self.storage.get_modified_time(name)
+        except NotImplementedError:
+            return False
+        age = (datetime.datetime.now(modified.tzinfo) - modified)
+        return age.total_seconds() > self.timeout
+
+    def get(self, key, default=None):
+        name = self.get_name(key)
+        try:
+            if self.is_expired(name):
+                self.storage.delete(name)
+                raise FileNotFoundError(name)
+            with self.storage.open(name, 'rb') as cached_file:
+                value = cached_file.read()
+        except (OSError, ValueError):
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        name = self.get_name(key)
+        # Storages do not overwrite files: they pick another name.
+        self.storage.delete(name)
+        self.storage.save(name, ContentFile(value))
+
+    def delete(self, key):
+        self.storage.delete(self.get_name(key))
+
+    def clear(self):
+        """Reset counters. Files are left in storage."""
+        self.hits = 0
+        self.misses = 0
+
+
+class TieredCache(object):
+    """Same interface as :class:`LRUCache`, chaining ``caches``, fastest
+    first.
+
+    Values found in a cache are copied into the faster ones.
+
+    """
+    def __init__(self, caches):
+        self.caches = caches
+
+    @property
+    def hits(self):
+        return sum(cache.hits for cache in self.caches)
+
+    @property
+    def misses(self):
+        return self.caches[-1].misses
+
+    def get(self, key, default=None):
+        for position, cache in enumerate(self.caches):
+            value = cache.get(key)
+            if value is not None:
+                for faster_cache in self.caches[:position]:
+                    faster_cache.set(key, value)
+                return value
+        return default
+
+    def set(self, key, value):
+        for cache in self.caches:
+            cache.set(key, value)
+
+    def delete(self, key):
+        for cache in self.caches:
+            cache.delete(key)
+
+    def clear(self):
+        for cache in self.caches:
+            cache.clear()
+
+
+class DjangoCache(object):
+    """Same interface as :class:`LRUCache`, backed by Django's cache framework.
+
+    Use it to share cached data between processes. ``alias`` is the name of
+    the cache in ``settings.CACHES``.
+
+    """
+    def __init__(self, alias='default', timeout=None, key_prefix='docusign'):
+        self.alias = alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def make_key(self, key):
+        return '{prefix}:{key}'.format(prefix=self.key_prefix, key=key)
+
+    def get(self, key, default=None):
+        value = self.cache.get(self.make_key(key))
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.cache.set(self.make_key(key), value, self.timeout)
+
+    def delete(self, key):
+        self.cache.delete(self.make_key(key))
+
+    def clear(self):
+        """Reset counters. Cached data is left to Django cache's expiration.
+        """
+        self.hits = 0
+        self.misses = 0
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_shared_cache(name, maxsize, timeout, alias=None):
+    """Return process-wide cache ``name``, create it on first access.
+
+    If ``alias`` is ``None``, cache is a :class:`LRUCache`. Else it is a
+    :class:`DjangoCache` using Django cache ``alias``.
+
+    """
+    try:
+        return _caches[name]
+    except KeyError:
+        pass
+    with _caches_lock:
+        if name not in _caches:
+            if alias is None:
+                _caches[name] = LRUCache(maxsize=maxsize, timeout=timeout)
+            else:
+                _caches[name] = DjangoCache(
+                    alias=alias,
+                    timeout=timeout,
+                    key_prefix='docusign:{name}'.format(name=name),
+                )
+        return _caches[name]
+
+
+def get_template_cache():
+    """Return process-wide cache for template definitions.
+
+    Returns ``None`` if ``settings.DOCUSIGN_TEMPLATE_CACHE`` is ``False``.
+
+    Cache is configured on first access, with
+    ``settings.DOCUSIGN_TEMPLATE_CACHE_TIMEOUT``,
+    ``settings.DOCUSIGN_TEMPLATE_CACHE_SIZE`` and
+    ``settings.DOCUSIGN_TEMPLATE_CACHE_ALIAS``.
+
+    """
+    if not getattr(settings, 'DOCUSIGN_TEMPLATE_CACHE', True):
+        return None
+    return get_shared_cache(
+        'template',
+        maxsize=getattr(settings, 'DOCUSIGN_TEMPLATE_CACHE_SIZE',
+                        DEFAULT_TEMPLATE_CACHE_SIZE),
+        timeout=getattr(settings, 'DOCUSIGN_TEMPLATE_CACHE_TIMEOUT',
+                        DEFAULT_TEMPLATE_CACHE_TIMEOUT),
+        alias=getattr(settings, 'DOCUSIGN_TEMPLATE_CACHE_ALIAS', None),
+    )
+
+
+def get_recipient_cache():
+    """Return cache for envelope recipients, or ``None``.
+
+    Depends on ``settings.DOCUSIGN_RECIPIENT_CACHE``:
+
+    * ``'request'`` (default): a new cache is returned on every call. Since
+      backends are usually instantiated for every request, recipients are
+      cached for the duration of the request.
+
+    * ``'shared'``: process-wide cache is returned, so recipients are shared
+      between requests. If ``settings.DOCUSIGN_RECIPIENT_CACHE_ALIAS`` is set,
+      recipients are stored in this Django cache, so they are shared between
+      processes.
+
+    * ``None``: recipients are not cached.
+
+    Recipients expire after ``settings.DOCUSIGN_RECIPIENT_CACHE_TIMEOUT``
+    seconds.
+
+    """
+    mode = getattr(settings, 'DOCUSIGN_RECIPIENT_CACHE', 'request')
+    if mode is None:
+        return None
+    maxsize = getattr(settings, 'DOCUSIGN_RECIPIENT_CACHE_SIZE',
+                      DEFAULT_RECIPIENT_CACHE_SIZE)
+    timeout = getattr(settings, 'DOCUSIGN_RECIPIENT_CACHE_TIMEOUT',
+                      DEFAULT_RECIPIENT_CACHE_TIMEOUT)
+    if mode == 'request':
+        return LRUCache(maxsize=maxsize, timeout=timeout)
+    if mode == 'shared':
+        return get_shared_cache(
+            'recipient',
+            maxsize=maxsize,
+            timeout=timeout,
+            alias=getattr(settings, 'DOCUSIGN_RECIPIENT_CACHE_ALIAS', None),
+        )
+    raise ValueError(
+        'Invalid value for settings.DOCUSIGN_RECIPIENT_CACHE: {mode!r}'
+        .format(mode=mode))
+
+
+def get_document_index_cache():
+    """Return Django cache for index of documents, or ``None``.
+
+    Returns ``None`` unless ``settings.DOCUSIGN_DOCUMENT_INDEX`` is ``True``.
+    Then ``settings.DOCUSIGN_DOCUMENT_INDEX_ALIAS`` is required: index must
+    be shared by every process, else every process would register templates
+    of its own.
+
+    """
+    if not getattr(settings, 'DOCUSIGN_DOCUMENT_INDEX', False):
+        return None
+    alias = getattr(settings, 'DOCUSIGN_DOCUMENT_INDEX_ALIAS', None)
+    if alias is None:
+        raise ImproperlyConfigured(
+            'settings.DOCUSIGN_DOCUMENT_INDEX requires '
+            'settings.DOCUSIGN_DOCUMENT_INDEX_ALIAS, a Django cache shared '
+            'by every process.')
+    from django.core.cache import caches
+    return caches[alias]
+
+
+def get_page_image_cache():
+    """Return process-wide cache for page images, or ``None``.
+
+    Returns ``None`` unless ``settings.DOCUSIGN_PAGE_IMAGE_CACHE`` is
+    ``True``.
+
+    Cache is configured on first access. Page images are kept in memory, up
+    to ``settings.DOCUSIGN_PAGE_IMAGE_CACHE_BYTES`` bytes. If
+    ``settings.DOCUSIGN_PAGE_IMAGE_STORAGE`` is set (dotted path to a Django
+    storage class), images evicted from memory are still read from this
+    storage.
+
+    Images do not expire: backends revalidate them, see
+    :func:`get_validator_cache`.
+
+    """
+    if not getattr(settings, 'DOCUSIGN_PAGE_IMAGE_CACHE', False):
+        return None
+    try:
+        return _caches['page_image']
+    except KeyError:
+        pass
+    with _caches_lock:
+        if 'page_image' not in _caches:
+            _caches['page_image'] = create_page_image_cache()
+        return _caches['page_image']
+
+
+def create_page_image_cache():
+    """Return new cache for page images, configured with
+    ``settings.DOCUSIGN_PAGE_IMAGE_CACHE_BYTES`` and
+    ``settings.DOCUSIGN_PAGE_IMAGE_STORAGE``, see
+    :func:`get_page_image_cache`."""
+    cache = SizedLRUCache(
+        maxbytes=getattr(settings, 'DOCUSIGN_PAGE_IMAGE_CACHE_BYTES',
+                         DEFAULT_PAGE_IMAGE_CACHE_BYTES))
+    storage = getattr(settings, 'DOCUSIGN_PAGE_IMAGE_STORAGE', None)
+    if storage:
+        cache = TieredCache([
+            cache,
+            StorageCache(get_storage_class(storage)(),
+                         location='docusign/page-images'),
+        ])
+    return cache
+
+
+def get_validator_cache():
+    """Return process-wide cache for validators of cached content.
+
+    Validators are ETag and Last-Modified returned by DocuSign, the date
+    content was last checked, and completion dates of envelopes, whose
+    content does not change anymore.
+
+    Cache is configured on first access, with
+    ``settings.DOCUSIGN_VALIDATOR_CACHE_SIZE`` and
+    ``settings.DOCUSIGN_VALIDATOR_CACHE_ALIAS``. Entries never expire.
+
+    """
+    return get_shared_cache(
+        'validator',
+        maxsize=getattr(settings, 'DOCUSIGN_VALIDATOR_CACHE_SIZE',
+                        DEFAULT_VALIDATOR_CACHE_SIZE),
+        timeout=None,
+        alias=getattr(settings, 'DOCUSIGN_VALIDATOR_CACHE_ALIAS', None),
+    )
+
+
+def reset_caches():
+    """Drop process-wide caches. Next access reads settings again.
+
+    Typically used in tests.
+
+    """
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.clear()
+        _caches.clear()
@@ -0,0 +1,547 @@
+"""DocuSign client with pooled HTTP connections, and registry of clients."""
+from __future__ import unicode_literals
+
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+from urllib.parse import urlencode
+
+import pydocusign
+import requests
+from pydocusign import exceptions
+
+from django_docusign.documents import MultipartEnvelopeBody
+from django_docusign.instrumentation import start_call
+from django_docusign.resilience import (DEFAULT_RETRY_BACKOFF, RetryPolicy,
+                                        get_circuit_breaker, get_operation)
+from django_docusign.throttle import get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+#: Default number of keep-alive connections kept per DocuSign host.
+DEFAULT_POOL_SIZE = 10
+
+#: Default number of seconds after which an unused client is evicted.
+DEFAULT_POOL_MAX_IDLE = 300
+
+
+def get_validators(response):
+    """Return dictionary of cache validators of :class:`requests.Response`,
+    with ``etag`` and ``last_modified`` items, if any."""
+    validators = {}
+    if response.headers.get('ETag'):
+        validators['etag'] = response.headers['ETag']
+    if response.headers.get('Last-Modified'):
+        validators['last_modified'] = response.headers['Last-Modified']
+    return validators
+
+
+def get_conditional_headers(validators):
+    """Return headers of a conditional GET for ``validators`` (as returned
+    by :func:`get_validators`)."""
+    headers = {}
+    if not validators:
+        return headers
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+
+class DocuSignClient(pydocusign.DocuSignClient):
+    """:class:`pydocusign.DocuSignClient` using a :class:`requests.Session`.
+
+    Upstream client performs every HTTP request with module-level
+    ``requests`` functions, i.e. with a new connection (and TLS handshake)
+    each time. This client keeps connections alive in a pool of
+    ``pool_size`` connections, so that it can be shared between threads and
+    requests.
+
+    """
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, connect_timeout=None,
+                 operation_timeouts=None, retries=0,
+                 retry_backoff=DEFAULT_RETRY_BACKOFF, rate_limit_key=None,
+                 token_provider=None, **kwargs):
+        #: :class:`~django_docusign.auth.JWTTokenProvider` of
+        #: :attr:`oauth2_token`, ``None`` if token is static.
+        self.token_provider = token_provider
+        self._oauth2_token = None
+        super(DocuSignClient, self).__init__(**kwargs)
+        #: Key of rate limiter's bucket, ``None`` means
+        #: :meth:`get_rate_limit_key`.
+        self.rate_limit_key = rate_limit_key
+        #: Timeout, in seconds, of connections. Defaults to :attr:`timeout`.
+        self.connect_timeout = connect_timeout
+        #: Read timeouts, in seconds, by operation (see
+        #: :func:`~django_docusign.resilience.get_operation`). Defaults to
+        #: :attr:`timeout`.
+        self.operation_timeouts = operation_timeouts or {}
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        #: :class:`~django_docusign.resilience.RetryPolicy` of requests.
+        self.retry_policy = RetryPolicy(retries=retries,
+                                        backoff=retry_backoff)
+        #: Process-wide :class:`~django_docusign.resilience.CircuitBreaker`
+        #: of DocuSign API, ``None`` if disabled.
+        self.circuit_breaker = get_circuit_breaker(self.root_url)
+        #: HTTP session, holds the pool of keep-alive connections.
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        #: :class:`~django_docusign.throttle.RateLimiter` taken before every
+        #: call, ``None`` if calls are not limited.
+        self.rate_limiter = get_rate_limiter(
+            rate_limit_key or self.get_rate_limit_key())
+
+    @property
+    def oauth2_token(self):
+        """OAuth2 access token, read from :attr:`token_provider` on every
+        request if set, so that a pooled client follows token refreshes."""
+        if self.token_provider is not None:
+            return self.token_provider.get_token()
+        return self._oauth2_token
+
+    @oauth2_token.setter
+    def oauth2_token(self, value):
+        self._oauth2_token = value
+
+    def get_rate_limit_key(self):
+        """Return key of rate limiter's bucket: one bucket per DocuSign
+        user and integration."""
+        return hashlib.sha1('{root_url} {integrator_key} {username}'.format(
+            root_url=self.root_url, integrator_key=self.integrator_key,
+            username=self.username).encode('utf-8')).hexdigest()
+
+    def throttle(self):
+        """Wait for :attr:`rate_limiter`, or raise
+        :class:`~django_docusign.throttle.RateLimitExceeded`."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+    def observe_rate_limit(self, response):
+        """Adapt :attr:`rate_limiter` to ``response``'s headers."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.observe(response.status_code, response.headers)
+
+    def close(self):
+        """Close pooled connections."""
+        self.session.close()
+
+    def get_operation_timeout(self, operation):
+        """Return ``(connect, read)`` timeouts of ``operation``."""
+        read_timeout = self.operation_timeouts.get(operation, self.timeout)
+        if isinstance(read_timeout, (tuple, list)):
+            return tuple(read_timeout)
+        connect_timeout = self.connect_timeout
+        if connect_timeout is None:
+            connect_timeout = read_timeout
+        return (connect_timeout, read_timeout)
+
+    def perform(self, method, url, **kwargs):
+        """Perform HTTP request to ``url`` with :attr:`session`, return
+        :class:`requests.Response`, whatever its status.
+
+        Every attempt goes through :attr:`circuit_breaker` and
+        :attr:`rate_limiter`. Failed attempts are retried according to
+        :attr:`retry_policy`. Raise
+        :class:`pydocusign.exceptions.DocuSignException` if request fails.
+
+        """
+        operation = get_operation(method, url)
+        call = start_call(self.__class__, operation, method, url,
+                          kwargs.get('data'), kwargs.get('headers'))
+        try:
+            response = self._perform(operation, call, method, url, **kwargs)
+        except Exception as exception:
+            if call is not None:
+                call.finish(exception=exception)
+            raise
+        if call is not None:
+            call.finish(response=response, response_size=None
+                        if kwargs.get('stream') else len(response.content))
+        return response
+
+    def _perform(self, operation, call, method, url, **kwargs):
+        attempt = 0
+        while True:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.before_call()
+            self.throttle()
+            try:
+                response = self.session.request(
+                    method, url,
+                    timeout=self.get_operation_timeout(operation),
+                    **kwargs)
+            except requests.exceptions.RequestException as exception:
+                self.record_outcome(failed=True)
+                if attempt < self.retry_policy.retries \
+                        and self.retry_policy.can_retry_exception(
+                            method, exception, kwargs.get('data')):
+                    attempt += 1
+                    if call is not None:
+                        call.retries = attempt
+                    self.wait_before_retry(method, url, attempt)
+                    continue
+                msg = "DocuSign request error: " \
+                      "{method} {url} failed ; " \
+                      "Error: {exception}" \
+                      .format(method=method, url=url, exception=exception)
+                logger.error(msg)
+                raise exceptions.DocuSignException(msg)
+            self.observe_rate_limit(response)
+            self.record_outcome(failed=response.status_code >= 500)
+            if attempt < self.retry_policy.retries \
+                    and self.retry_policy.can_retry_response(method,
+                                                             response):
+                attempt += 1
+                if call is not None:
+                    call.retries = attempt
+                self.wait_before_retry(method, url, attempt, response)
+                response.close()
+                continue
+            return response
+
+    def record_outcome(self, failed):
+        """Record outcome of a request in :attr:`circuit_breaker`."""
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record(failed)
+
+    def wait_before_retry(self, method, url, attempt, response=None):
+        delay = self.retry_policy.get_delay(attempt, response)
+        logger.warning('Retrying DocuSign request %s %s in %.2f seconds '
+                       '(retry %d of %d)', method, url, delay, attempt,
+                       self.retry_policy.retries)
+        time.sleep(delay)
+
+    def _request(self, url, method='GET', headers=None, data=None,
+                 json_data=None, expected_status_code=200, sobo_email=None):
+        """Shortcut to perform HTTP requests, using :attr:`session`."""
+        if data is not None:
+            data = json.dumps(data)
+        response = self._send(url, method=method, headers=headers, data=data,
+                              json_data=json_data,
+                              expected_status_code=expected_status_code,
+                              sobo_email=sobo_email)
+        content_type = response.headers.get('Content-Type', '')
+        if content_type.startswith('application/json'):
+            return response.json()
+        elif content_type.startswith('image/'):
+            return response.content
+        return response.text
+
+    def _send(self, url, method='GET', headers=None, data=None,
+              json_data=None, expected_status_code=200, sobo_email=None,
+              stream=False):
+        """Perform HTTP request with raw ``data`` (string, bytes or iterable
+        of bytes), return :class:`requests.Response`.
+
+        Raise :class:`pydocusign.exceptions.DocuSignException` if request
+        fails or if response's status is not ``expected_status_code`` (an
+        integer, or a tuple of integers).
+
+        """
+        do_url = '{root}{path}'.format(root=self.root_url, path=url)
+        do_headers = self.base_headers(sobo_email)
+        do_headers.update(headers or {})
+        if not isinstance(expected_status_code, tuple):
+            expected_status_code = (expected_status_code,)
+        response = self.perform(method, do_url, headers=do_headers,
+                                data=data, json=json_data, stream=stream)
+        if response.status_code not in expected_status_code:
+            msg = "DocuSign request failed: " \
+                  "{method} {url} returned code {status} " \
+                  "while expecting code {expected}; " \
+                  "Message: {message} ; " \
+                  .format(
+                      method=method,
+                      url=do_url,
+                      status=response.status_code,
+                      expected=' or '.join(
+                          str(code) for code in expected_status_code),
+                      message=response.text,
+                  )
+            logger.error(msg)
+            raise exceptions.DocuSignException(msg)
+        return response
+
+    def create_envelope_from_documents_multipart(self, envelope):
+        """POST ``envelope`` to /envelopes as a multipart request, return
+        created envelope ID.
+
+        Unlike :meth:`create_envelope_from_documents`, documents are not
+        loaded in memory nor encoded in base64: they are streamed from
+        their file handles, see
+        :class:`~django_docusign.documents.MultipartEnvelopeBody`. Size of
+        request body is set as ``envelope.payload_size``.
+
+        """
+        if not self.account_url:
+            self.login_information()
+        url = '/accounts/{accountId}/envelopes'.format(
+            accountId=self.account_id)
+        body = MultipartEnvelopeBody(envelope)
+        headers = {'Content-Type': body.content_type}
+        response = self._send(url, method='POST', headers=headers, data=body,
+                              expected_status_code=201)
+        envelope.payload_size = body.size
+        envelope_id = response.json()['envelopeId']
+        if not envelope.client:
+            envelope.client = self
+        if not envelope.envelopeId:
+            envelope.envelopeId = envelope_id
+        return envelope_id
+
+    def get_envelope_document(self, envelopeId, documentId):
+        """Download one document in envelope, return file-like object.
+
+        Raise :class:`pydocusign.exceptions.DocuSignException` unless
+        DocuSign answers "200 OK", so that error messages are never taken
+        for documents.
+
+        """
+        if not self.account_url:
+            self.login_information()
+        url = '/accounts/{accountId}/envelopes/{envelopeId}' \
+              '/documents/{documentId}' \
+              .format(accountId=self.account_id,
+                      envelopeId=envelopeId,
+                      documentId=documentId)
+        response = self._send(url, expected_status_code=200, stream=True)
+        # Let reader get decompressed content.
+        response.raw.decode_content = True
+        return response.raw
+
+    def get_page_image_if_modified(self, envelopeId, documentId, pageId,
+                                   dpi=None, max_width=None, max_height=None,
+                                   validators=None):
+        """Same as :meth:`get_page_image`, as a conditional request.
+
+        Return ``(image, validators)``. ``image`` is ``None`` if DocuSign
+        answered "304 Not Modified" to ``validators``, i.e. the image the
+        caller holds is still valid.
+
+        """
+        if not self.account_url:
+            self.login_information()
+        url = '/accounts/{accountId}/envelopes/{envelopeId}/documents/' \
+              '{documentId}/pages/{pageId}/page_image' \
+              .format(accountId=self.account_id,
+                      envelopeId=envelopeId,
+                      documentId=documentId,
+                      pageId=pageId)
+        params = [('dpi', dpi), ('max_width', max_width),
+                  ('max_height', max_height)]
+        params = [(name, value) for name, value in params
+                  if value is not None]
+        if params:
+            url += '?' + urlencode(params)
+        response = self._send(url, headers=get_conditional_headers(validators),
+                              expected_status_code=(200, 304))
+        if response.status_code == 304:
+            return None, dict(validators, **get_validators(response))
+        return response.content, get_validators(response)
+
+    def get_envelope_document_if_modified(self, envelopeId, documentId,
+                                          validators=None):
+        """Same as :meth:`get_envelope_document`, as a conditional request.
+
+        Return ``(stream, validators)``. ``stream`` is ``None`` if DocuSign
+        answered "304 Not Modified" to ``validators``.
+
+        """
+        if not self.account_url:
+            self.login_information()
+        url = '/accounts/{accountId}/envelopes/{envelopeId}' \
+              '/documents/{documentId}' \
+              .format(accountId=self.account_id,
+                      envelopeId=envelopeId,
+                      documentId=documentId)
+        response = self._send(url, headers=get_conditional_headers(validators),
+                              expected_status_code=(200, 304), stream=True)
+        if response.status_code == 304:
+            response.close()
+            return None, dict(validators, **get_validators(response))
+        # Let reader get decompressed content.
+        response.raw.decode_content = True
+        return response.raw, get_validators(response)
+
+    def create_template(self, name, document, description=''):
+        """POST to /templates a template made of ``document`` (a
+        :class:`pydocusign.Document`, which keeps its ``documentId``),
+        without recipients. Return template ID."""
+        if not self.account_url:
+            self.login_information()
+        url = '/accounts/{accountId}/templates'.format(
+            accountId=self.account_id)
+        data = {
+            'envelopeTemplateDefinition': {
+                'name': name,
+                'description': description,
+            },
+            'documents': [{
+                'documentId': str(document.documentId),
+                'name': document.name,
+                'fileExtension': 'pdf',
+                'documentBase64': base64.b64encode(
+                    document.data.read()).decode('utf-8'),
+            }],
+        }
+        response_data = self._request(url, method='POST', json_data=data,
+                                      expected_status_code=201)
+        return response_data['templateId']
+
+    def create_envelope_from_request(self, envelope, data):
+        """POST ``data`` of ``envelope`` to /envelopes, return created
+        envelope ID.
+
+        Use it to send requests built by hand, e.g. with composite
+        templates. Like :meth:`create_envelope_from_documents`, it sets
+        ``envelopeId`` and ``client`` of ``envelope`` if they are empty.
+
+        """
+        return self._create_envelope(envelope, data)
+
+    def find_templates(self, search_text):
+        """GET templates of account matching ``search_text``. Return list of
+        templates (dictionaries with ``templateId``, ``name`` and
+        ``description`` items)."""
+        if not self.account_url:
+            self.login_information()
+        url = '/accounts/{accountId}/templates?{query}'.format(
+            accountId=self.account_id,
+            query=urlencode([('search_text', search_text)]))
+        return self.get(url).get('envelopeTemplates') or []
+
+    def get_envelopes_status(self, from_date, start_position=0, count=None,
+                             include='recipients'):
+        """GET envelopes whose status changed since ``from_date``.
+
+        ``from_date`` is a datetime or an ISO 8601 string. Envelopes are
+        sorted by date of last status change (``statusChangedDateTime``),
+        oldest first, i.e. the date ``from_date`` filters on. Response is a
+        page of ``count`` envelopes starting at ``start_position``, see
+        ``resultSetSize``, ``totalSetSize`` and ``endPosition`` items.
+
+        """
+        if not self.account_url:
+            self.login_information()
+        if hasattr(from_date, 'isoformat'):
+            from_date = from_date.isoformat()
+        params = [
+            ('from_date', from_date),
+            ('start_position', start_position),
+            ('order_by', 'status_changed'),
+            ('order', 'asc'),
+        ]
+        if count is not None:
+            params.append(('count', count))
+        if include:
+            params.append(('include', include))
+        url = '/accounts/{accountId}/envelopes?{query}'.format(
+            accountId=self.account_id, query=urlencode(params))
+        return self.get(url)
+
+
+class ClientPool(object):
+    """Thread-safe registry of shared :class:`DocuSignClient` instances.
+
+    Clients are indexed by the keyword arguments used to create them, so
+    that every backend configured with the same credentials shares the same
+    client, hence the same keep-alive connections. Clients of a
+    ``token_provider`` are indexed by provider, not by token: they are kept
+    when tokens are refreshed.
+
+    Clients which have not been used for ``max_idle`` seconds are evicted
+    (and their connections closed) the next time the pool is accessed.
+
+    """
+    def __init__(self, client_class=DocuSignClient,
+                 pool_size=DEFAULT_POOL_SIZE, max_idle=DEFAULT_POOL_MAX_IDLE):
+        self.client_class = client_class
+        self.pool_size = pool_size
+        self.max_idle = max_idle
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get_key(self, **client_kwargs):
+        """Return hashable key for ``client_kwargs``."""
+        return tuple(sorted(
+            (key, repr(value)) for key, value in client_kwargs.items()))
+
+    def get(self, **client_kwargs):
+        """Return client for ``client_kwargs``, create it if necessary."""
+        key = self.get_key(**client_kwargs)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            try:
+                client = self._clients[key][0]
+            except KeyError:
+                client = self.client_class(pool_size=self.pool_size,
+                                           **client_kwargs)
+            self._clients[key] = (client, now)
+        return client
+
+    def _evict_idle(self, now):
+        if self.max_idle is None:
+            return
+        for key, (client, last_used) in list(self._clients.items()):
+            if now - last_used > self.max_idle:
+                del self._clients[key]
+                client.close()
+
+    def clear(self):
+        """Close and forget every client. Useful in tests."""
+        with self._lock:
+            for client, last_used in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+    def __len__(self):
+        return len(self._clients)
+
+
+_client_pool = None
+_client_pool_lock = threading.Lock()
+
+
+def get_client_pool():
+    """Return process-wide :class:`ClientPool`.
+
+    Pool is configured on first access, with
+    ``settings.DOCUSIGN_POOL_SIZE`` and ``settings.DOCUSIGN_POOL_MAX_IDLE``.
+
+    """
+    global _client_pool
+    if _client_pool is None:
+        from django.conf import settings
+        with _client_pool_lock:
+            if _client_pool is None:
+                _client_pool = ClientPool(
+                    pool_size=getattr(settings, 'DOCUSIGN_POOL_SIZE',
+                                      DEFAULT_POOL_SIZE),
+                    max_idle=getattr(settings, 'DOCUSIGN_POOL_MAX_IDLE',
+                                     DEFAULT_POOL_MAX_IDLE),
+                )
+    return _client_pool
+
+
+def reset_client_pool():
+    """Close every pooled client and drop process-wide pool.
+
+    Next call to :func:`get_client_pool` creates a new pool, reading
+    settings again. Typically used in tests.
+
+    """
+    global _client_pool
+    with _client_pool_lock:
+        if _client_pool is not None:
+            _client_pool.clear()
+        _client_pool = None
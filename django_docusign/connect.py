@@ -0,0 +1,201 @@
+"""Parse and authenticate DocuSign Connect (webhook) notifications.
+
+Notifications are normalized to dictionaries shaped like DocuSign REST API
+resources, whatever the payload format (XML or JSON)::
+
+    {
+        'envelopeId': '...',
+        'status': 'completed',
+        'completedDateTime': '2020-01-01T10:00:00.000Z',
+        'recipients': [
+            {'clientUserId': '6', 'email': '...', 'status': 'completed',
+             'declinedReason': ''},
+        ],
+    }
+
+"""
+from __future__ import unicode_literals
+
+import base64
+import hashlib
+import hmac
+import json
+import re
+from xml.etree import ElementTree
+
+
+class ConnectPayloadError(Exception):
+    """Notification cannot be parsed."""
+
+
+#: Order of envelope and recipient statuses. Notifications may arrive out of
+#: order: statuses ranked below the current one are outdated. Final statuses
+#: share the highest rank.
+STATUS_RANKS = {
+    'draft': 0,
+    'created': 0,
+    'sent': 1,
+    'delivered': 2,
+    'auto_responded': 2,
+    'signed': 3,
+    'completed': 4,
+    'declined': 4,
+    'voided': 4,
+}
+
+
+def is_outdated(status, current_status):
+    """Return whether ``status`` is older than ``current_status``.
+
+    Unknown statuses are never outdated.
+
+    >>> is_outdated('sent', 'completed')
+    True
+    >>> is_outdated('completed', 'sent')
+    False
+
+    """
+    rank = STATUS_RANKS.get(status)
+    current_rank = STATUS_RANKS.get(current_status)
+    if rank is None or current_rank is None:
+        return False
+    return rank < current_rank
+
+
+def normalize_status(status):
+    """Return REST API status for Connect XML ``status``.
+
+    >>> normalize_status('AutoResponded')
+    'auto_responded'
+
+    """
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', status or '').lower()
+
+
+def local_name(tag):
+    """Return ``tag`` without XML namespace."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def child_texts(element):
+    """Return dictionary of text of ``element``'s children, by local name."""
+    return {local_name(child.tag): (child.text or '').strip()
+            for child in element}
+
+
+class ConnectHMAC(object):
+    """Compute HMAC-SHA256 of a payload, read by chunks, with every key."""
+    def __init__(self, keys):
+        self.hmacs = [hmac.new(key.encode('utf-8'), digestmod=hashlib.sha256)
+                      for key in keys]
+
+    def update(self, chunk):
+        for digest in self.hmacs:
+            digest.update(chunk)
+
+    def verify(self, signatures):
+        """Return whether one of ``signatures`` (base64 strings, as in
+        ``X-DocuSign-Signature-*`` headers) matches one of the keys."""
+        expected = [base64.b64encode(digest.digest()) for digest in self.hmacs]
+        for signature in signatures:
+            signature = signature.strip().encode('ascii', 'replace')
+            for value in expected:
+                if hmac.compare_digest(signature, value):
+                    return True
+        return False
+
+
+class ConnectXMLParser(object):
+    """Incremental parser of Connect XML notifications.
+
+    Call :meth:`feed` with chunks of payload, then :meth:`close` to get the
+    envelope. Elements are discarded once read, so that memory usage does
+    not grow with embedded documents.
+
+    """
+    def __init__(self):
+        self.parser = ElementTree.XMLPullParser(events=('start', 'end'))
+        self.path = []
+        self.envelope = {'envelopeId': None, 'status': None,
+                         'completedDateTime': None, 'recipients': []}
+
+    def feed(self, chunk):
+        try:
+            self.parser.feed(chunk)
+        except ElementTree.ParseError as exception:
+            raise ConnectPayloadError(exception)
+        for event, element in self.parser.read_events():
+            if event == 'start':
+                self.path.append(local_name(element.tag))
+            else:
+                self.handle_end(element)
+
+    def handle_end(self, element):
+        tag = self.path.pop()
+        parent = self.path[-1] if self.path else None
+        if tag == 'RecipientStatus':
+            texts = child_texts(element)
+            self.envelope['recipients'].append({
+                'clientUserId': texts.get('ClientUserId', ''),
+                'email': texts.get('Email', ''),
+                'userName': texts.get('UserName', ''),
+                'status': normalize_status(texts.get('Status')),
+                'declinedReason': texts.get('DeclineReason', ''),
+            })
+        elif parent == 'EnvelopeStatus' and tag == 'EnvelopeID':
+            self.envelope['envelopeId'] = (element.text or '').strip()
+        elif parent == 'EnvelopeStatus' and tag == 'Status':
+            self.envelope['status'] = normalize_status(element.text)
+        elif parent == 'EnvelopeStatus' and tag == 'Completed':
+            self.envelope['completedDateTime'] = \
+                (element.text or '').strip() or None
+        if 'RecipientStatus' not in self.path:
+            element.clear()
+
+    def close(self):
+        """Return envelope dictionary."""
+        try:
+            self.parser.close()
+        except ElementTree.ParseError as exception:
+            raise ConnectPayloadError(exception)
+        if not self.envelope['envelopeId']:
+            raise ConnectPayloadError('Notification has no EnvelopeID.')
+        return self.envelope
+
+
+class ConnectJSONParser(object):
+    """Parser of Connect JSON notifications (``envelopeSummary`` data).
+
+    JSON is not parsed incrementally: chunks are buffered until
+    :meth:`close`, so bound the size of payloads.
+
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def feed(self, chunk):
+        self.chunks.append(chunk)
+
+    def close(self):
+        """Return envelope dictionary."""
+        try:
+            payload = json.loads(b''.join(self.chunks).decode('utf-8'))
+            data = payload['data']
+            envelope_id = data['envelopeId']
+        except (ValueError, TypeError, KeyError) as exception:
+            raise ConnectPayloadError(exception)
+        summary = data.get('envelopeSummary') or {}
+        signers = (summary.get('recipients') or {}).get('signers') or []
+        return {
+            'envelopeId': envelope_id,
+            'status': summary.get('status'),
+            'completedDateTime': summary.get('completedDateTime'),
+            'recipients': [
+                {'clientUserId': str(signer.get('clientUserId') or ''),
+                 'email': signer.get('email', ''),
+                 'userName': signer.get('name', ''),
+                 'status': signer.get('status'),
+                 'declinedReason': signer.get('declinedReason', '')}
+                for signer in signers
+            ],
+        }
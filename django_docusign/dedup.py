@@ -0,0 +1,255 @@
+"""Register documents sent repeatedly as DocuSign templates.
+
+:class:`DocumentIndex` identifies documents by their SHA-256 checksum. Once a
+document has been sent ``threshold`` times, it is registered as a server
+template, and next envelopes reference the template (as a composite
+template) instead of uploading the document again.
+
+"""
+from __future__ import unicode_literals
+
+import base64
+import copy
+import hashlib
+import logging
+
+from pydocusign.exceptions import DocuSignException
+
+from django_docusign.documents import get_chunk_size
+
+logger = logging.getLogger(__name__)
+
+#: Default number of times a document is sent before it is registered as a
+#: template.
+DEFAULT_DOCUMENT_INDEX_THRESHOLD = 2
+
+#: Default number of seconds a document is locked while it is registered.
+DEFAULT_DOCUMENT_INDEX_LOCK_TIMEOUT = 60
+
+
+def hash_stream(stream, chunk_size=None):
+    """Return hexadecimal SHA-256 digest of file-like ``stream``, or
+    ``None`` if ``stream`` cannot be rewound.
+
+    ``stream`` is read by chunks, then rewound to its initial position.
+
+    """
+    if chunk_size is None:
+        chunk_size = get_chunk_size()
+    try:
+        position = stream.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+    digest = hashlib.sha256()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+    stream.seek(position)
+    return digest.hexdigest()
+
+
+class DocumentIndex(object):
+    """Index of documents sent to DocuSign, by checksum, stored in Django
+    ``cache``.
+
+    ``cache`` must be shared by every process (e.g. Memcached or Redis), so
+    that a document is registered once. Counts are incremented atomically,
+    and a lock makes sure only one sender registers a document: others
+    upload it meanwhile. Before a template is created, templates of the
+    account are searched for the checksum, so that templates registered
+    before the index lost its entries are reused.
+
+    Documents are indexed by checksum and ``documentId``: templates keep
+    the ``documentId`` of the document, so that envelopes keep theirs. If
+    DocuSign fails to find or register a template, the document is
+    uploaded.
+
+    Entries expire after ``timeout`` seconds (``None`` means never).
+
+    """
+    def __init__(self, client, cache,
+                 threshold=DEFAULT_DOCUMENT_INDEX_THRESHOLD, timeout=None,
+                 lock_timeout=DEFAULT_DOCUMENT_INDEX_LOCK_TIMEOUT):
+        #: :class:`~django_docusign.client.DocuSignClient` instance.
+        self.client = client
+        self.cache = cache
+        self.threshold = threshold
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+
+    def get_key(self, checksum, document_id):
+        """Return key of document in :attr:`cache`.
+
+        Templates belong to accounts, so the key mentions the account.
+
+        """
+        if not self.client.account_url:
+            self.client.login_information()
+        return 'docusign:document:{account_url}/documents/{checksum}/' \
+               '{document_id}'.format(account_url=self.client.account_url,
+                                      checksum=checksum,
+                                      document_id=document_id)
+
+    def get_marker(self, checksum, document_id):
+        """Return text identifying template of document ``checksum``, in
+        template's name and description."""
+        return 'sha256:{checksum}#{document_id}'.format(
+            checksum=checksum, document_id=document_id)
+
+    def count(self, key):
+        """Increment count of document ``key``, return it."""
+        count_key = '{key}:count'.format(key=key)
+        self.cache.add(count_key, 0, self.timeout)
+        try:
+            return self.cache.incr(count_key)
+        except ValueError:  # Evicted meanwhile.
+            self.cache.set(count_key, 1, self.timeout)
+            return 1
+
+    def find_template(self, checksum, document_id):
+        """Return ID of existing template holding document ``checksum``, or
+        ``None``."""
+        marker = self.get_marker(checksum, document_id)
+        for template in self.client.find_templates(marker):
+            if template.get('description') == marker:
+                return template['templateId']
+        return None
+
+    def register(self, document, checksum):
+        """Return ID of template holding ``document``, creating it unless
+        it exists."""
+        template_id = self.find_template(checksum, document.documentId)
+        if template_id is None:
+            marker = self.get_marker(checksum, document.documentId)
+            template_id = self.client.create_template(
+                name='{name} ({marker})'.format(name=document.name,
+                                                marker=marker),
+                document=document,
+                description=marker)
+            logger.info('Registered document %s as DocuSign template %s',
+                        checksum, template_id)
+        return template_id
+
+    def get_template_id(self, document):
+        """Count ``document`` (a :class:`pydocusign.Document`), return ID of
+        template holding it, or ``None``.
+
+        Registers the template when document reaches :attr:`threshold`. If
+        DocuSign fails, ``document`` is rewound and ``None`` is returned, so
+        that it is uploaded.
+
+        """
+        checksum = hash_stream(document.data)
+        if checksum is None:
+            return None
+        key = self.get_key(checksum, document.documentId)
+        template_key = '{key}:template'.format(key=key)
+        template_id = self.cache.get(template_key)
+        if template_id is not None:
+            return template_id
+        if self.count(key) < self.threshold:
+            return None
+        lock_key = '{key}:lock'.format(key=key)
+        if not self.cache.add(lock_key, 1, self.lock_timeout):
+            # Another sender registers document: upload it this time.
+            return None
+        position = document.data.tell()
+        try:
+            template_id = self.cache.get(template_key)
+            if template_id is None:
+                template_id = self.register(document, checksum)
+                self.cache.set(template_key, template_id, self.timeout)
+        except DocuSignException:
+            logger.warning('Could not register document %s as DocuSign '
+                           'template, uploading it', checksum, exc_info=True)
+            document.data.seek(position)
+            return None
+        finally:
+            self.cache.delete(lock_key)
+        return template_id
+
+    def build_request(self, envelope):
+        """Return data of POST /envelopes for ``envelope`` with composite
+        templates, or ``None`` if no document of ``envelope`` is registered.
+
+        Composite templates follow the order of documents: consecutive
+        uploaded documents share one composite template, with recipients
+        and their tabs on these documents. Registered documents get one
+        composite template each, with recipients but no tabs. Documents
+        referenced by tabs are always uploaded.
+
+        """
+        tabbed = set()
+        for recipient in envelope.recipients:
+            for tab in getattr(recipient, 'tabs', None) or []:
+                tabbed.add(str(tab.documentId))
+        # List of uploaded documents, or template ID, in documents' order.
+        parts = []
+        registered = False
+        for document in envelope.documents:
+            template_id = None
+            if str(document.documentId) not in tabbed:
+                template_id = self.get_template_id(document)
+            if template_id is not None:
+                parts.append(template_id)
+                registered = True
+            elif parts and isinstance(parts[-1], list):
+                parts[-1].append(document)
+            else:
+                parts.append([document])
+        if not registered:
+            return None
+        data = envelope.to_dict()
+        recipients = data.pop('recipients', {})
+        data.pop('documents', None)
+        untabbed_recipients = filter_tabs(recipients, ())
+        composites = []
+        for part in parts:
+            if isinstance(part, list):
+                composites.append({
+                    'inlineTemplates': [{
+                        'sequence': '1',
+                        'recipients': filter_tabs(
+                            recipients,
+                            [str(document.documentId) for document in part]),
+                        'documents': [
+                            {'documentId': document.documentId,
+                             'name': document.name,
+                             'fileExtension': 'pdf',
+                             'documentBase64': base64.b64encode(
+                                 document.data.read()).decode('utf-8')}
+                            for document in part
+                        ],
+                    }],
+                })
+            else:
+                composites.append({
+                    'serverTemplates': [{'sequence': '1',
+                                         'templateId': part}],
+                    'inlineTemplates': [{'sequence': '2',
+                                         'recipients': untabbed_recipients}],
+                })
+        for position, composite in enumerate(composites, 1):
+            composite['compositeTemplateId'] = str(position)
+        data['compositeTemplates'] = composites
+        return data
+
+
+def filter_tabs(recipients, document_ids):
+    """Return copy of ``recipients`` (as in envelope's data), with tabs on
+    documents ``document_ids`` only."""
+    recipients = copy.deepcopy(recipients)
+    for recipients_list in recipients.values():
+        for recipient in recipients_list:
+            tabs = {}
+            for tabs_name, tabs_list in (recipient.pop('tabs', None)
+                                         or {}).items():
+                tabs_list = [tab for tab in tabs_list
+                             if str(tab.get('documentId')) in document_ids]
+                if tabs_list:
+                    tabs[tabs_name] = tabs_list
+            if tabs:
+                recipient['tabs'] = tabs
+    return recipients
@@ -0,0 +1,241 @@
+"""Transfer of documents with bounded memory usage."""
+from __future__ import unicode_literals
+
+import hashlib
+import io
+import json
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+
+#: Default size, in bytes, of chunks read from DocuSign.
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+#: Default size, in bytes, above which documents are spooled to disk.
+DEFAULT_SPOOL_SIZE = 2621440  # 2.5 MB, like FILE_UPLOAD_MAX_MEMORY_SIZE.
+
+
+class DocumentIntegrityError(Exception):
+    """Downloaded document does not match expected size or checksum."""
+
+
+class SpooledDocument(File):
+    """Downloaded document.
+
+    Content is kept in memory until it exceeds
+    ``settings.DOCUSIGN_DOCUMENT_SPOOL_SIZE``, then it is written to a
+    temporary file.
+
+    Attribute ``checksum`` is the hexadecimal SHA-256 digest of content.
+
+    """
+    checksum = None
+
+
+def get_chunk_size():
+    """Return ``settings.DOCUSIGN_DOCUMENT_CHUNK_SIZE``."""
+    return getattr(settings, 'DOCUSIGN_DOCUMENT_CHUNK_SIZE',
+                   DEFAULT_CHUNK_SIZE)
+
+
+def get_content_length(stream):
+    """Return size announced by HTTP ``stream``, or ``None``.
+
+    Size is not reliable if content is encoded (e.g. compressed).
+
+    """
+    headers = getattr(stream, 'headers', None) or {}
+    if headers.get('Content-Encoding', 'identity') != 'identity':
+        return None
+    try:
+        return int(headers['Content-Length'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class DocumentSpooler(object):
+    """Write chunks of a document to a :class:`SpooledDocument`, computing
+    checksum on the way.
+
+    Call :meth:`write` for each chunk, then :meth:`finish` to check integrity
+    and get the document.
+
+    """
+    def __init__(self, name=None, max_memory_size=None, expected_size=None,
+                 expected_checksum=None):
+        if max_memory_size is None:
+            max_memory_size = getattr(settings, 'DOCUSIGN_DOCUMENT_SPOOL_SIZE',
+                                      DEFAULT_SPOOL_SIZE)
+        self.name = name
+        self.expected_size = expected_size
+        self.expected_checksum = expected_checksum
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory_size)
+
+    def write(self, chunk):
+        self._digest.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def finish(self):
+        """Return :class:`SpooledDocument`, rewound.
+
+        Raise :class:`DocumentIntegrityError` if size or checksum do not
+        match expected values.
+
+        """
+        checksum = self._digest.hexdigest()
+        if self.expected_size is not None and self.size != self.expected_size:
+            self._file.close()
+            raise DocumentIntegrityError(
+                'Document {name} is {size} bytes long, expected {expected}'
+                .format(name=self.name, size=self.size,
+                        expected=self.expected_size))
+        if self.expected_checksum is not None \
+                and checksum != self.expected_checksum.lower():
+            self._file.close()
+            raise DocumentIntegrityError(
+                'Document {name} has checksum {checksum}, expected {expected}'
+                .format(name=self.name, checksum=checksum,
+                        expected=self.expected_checksum))
+        self._file.seek(0)
+        document = SpooledDocument(self._file, name=self.name)
+        document.size = self.size
+        document.checksum = checksum
+        return document
+
+
+def spool_document(stream, name=None, chunk_size=None, max_memory_size=None,
+                   expected_size=None, expected_checksum=None):
+    """Read file-like ``stream`` by chunks, return :class:`SpooledDocument`.
+
+    ``stream`` is closed once read. If ``expected_size`` is ``None``, size
+    announced by ``stream`` (HTTP ``Content-Length`` header) is verified.
+
+    """
+    if chunk_size is None:
+        chunk_size = get_chunk_size()
+    if expected_size is None:
+        expected_size = get_content_length(stream)
+    spooler = DocumentSpooler(name=name,
+                              max_memory_size=max_memory_size,
+                              expected_size=expected_size,
+                              expected_checksum=expected_checksum)
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            spooler.write(chunk)
+    finally:
+        stream.close()
+    return spooler.finish()
+
+
+def get_stream_size(stream):
+    """Return number of bytes left in file-like ``stream``, or ``None``."""
+    try:
+        position = stream.tell()
+        end = stream.seek(0, io.SEEK_END)
+        stream.seek(position)
+        return end - position
+    except (AttributeError, OSError, ValueError):
+        return getattr(stream, 'size', None)
+
+
+class MultipartEnvelopeBody(object):
+    """Body of a ``multipart/form-data`` request creating ``envelope``.
+
+    First part is envelope's definition (JSON), next parts are documents,
+    read from their file handles (``document.data``) by chunks when body is
+    iterated.
+
+    Attribute ``size`` is the size of body in bytes. It is ``None`` if the
+    size of a document cannot be known (stream is not seekable), in which
+    case it is set once body has been iterated.
+
+    """
+    def __init__(self, envelope, chunk_size=None, boundary=None):
+        self.chunk_size = chunk_size or get_chunk_size()
+        self.boundary = boundary or uuid.uuid4().hex
+        definition = envelope.to_dict()
+        definition['documents'] = [
+            {'documentId': document.documentId,
+             'name': document.name,
+             'fileExtension': 'pdf'}
+            for document in envelope.documents
+        ]
+        self.parts = [(
+            self.part_header('application/json', 'form-data'),
+            json.dumps(definition).encode('utf-8'),
+        )]
+        for document in envelope.documents:
+            disposition = 'file; filename="{name}"; documentid={id}'.format(
+                name=str(document.name).replace('"', '\\"'),
+                id=document.documentId)
+            self.parts.append((self.part_header('application/pdf',
+                                                disposition),
+                               document.data))
+        self.closing = '--{boundary}--\r\n'.format(
+            boundary=self.boundary).encode('ascii')
+        self.size = self.get_size()
+
+    @property
+    def content_type(self):
+        return 'multipart/form-data; boundary={boundary}'.format(
+            boundary=self.boundary)
+
+    def part_header(self, content_type, disposition):
+        header = '--{boundary}\r\n' \
+                 'Content-Type: {content_type}\r\n' \
+                 'Content-Disposition: {disposition}\r\n' \
+                 '\r\n'
+        return header.format(boundary=self.boundary,
+                             content_type=content_type,
+                             disposition=disposition).encode('utf-8')
+
+    def get_size(self):
+        """Return size of body, or ``None`` if unknown."""
+        size = len(self.closing)
+        for header, payload in self.parts:
+            if isinstance(payload, bytes):
+                payload_size = len(payload)
+            else:
+                payload_size = get_stream_size(payload)
+                if payload_size is None:
+                    return None
+            size += len(header) + payload_size + 2
+        return size
+
+    def __len__(self):
+        # Zero makes `requests` use chunked transfer encoding.
+        return self.size or 0
+
+    def __iter__(self):
+        sent = 0
+        for header, payload in self.parts:
+            yield header
+            sent += len(header)
+            if isinstance(payload, bytes):
+                yield payload
+                sent += len(payload)
+            else:
+                while True:
+                    chunk = payload.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+                    sent += len(chunk)
+            yield b'\r\n'
+            sent += 2
+        yield self.closing
+        sent += len(self.closing)
+        if self.size is None:
+            self.size = sent
+        elif sent != self.size:
+            raise DocumentIntegrityError(
+                'Sent {sent} bytes, announced {size}'.format(
+                    sent=sent, size=self.size))
@@ -0,0 +1,273 @@
+"""Latency and payload instrumentation of DocuSign API calls.
+
+Clients describe every call of DocuSign API as a :class:`Call`: operation,
+envelope, duration, status code, number of retries and sizes of request and
+response. Calls are reported to receivers of
+:data:`~django_docusign.signals.docusign_call` and to observers listed in
+``settings.DOCUSIGN_INSTRUMENTATION``, such as :class:`OpenTelemetryObserver`
+and :class:`PrometheusObserver`.
+
+When there is neither receiver nor observer, calls are not measured.
+
+"""
+from __future__ import unicode_literals
+
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from django_docusign.signals import docusign_call
+
+try:
+    from opentelemetry import trace
+except ImportError:  # Optional dependency.
+    trace = None
+
+try:
+    import prometheus_client
+except ImportError:  # Optional dependency.
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+#: Extracts envelope ID from URLs of DocuSign API.
+ENVELOPE_ID_PATTERN = re.compile(r'/envelopes/([^/?]+)')
+
+#: Buckets, in seconds, of :class:`PrometheusObserver`'s histogram.
+DEFAULT_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+                            60.0)
+
+
+def get_envelope_id(url):
+    """Return ID of envelope ``url`` is about, or ``None``."""
+    match = ENVELOPE_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+def get_size(data, headers=None):
+    """Return size, in bytes, of request ``data``, or ``None`` if unknown."""
+    if headers and 'Content-Length' in headers:
+        return int(headers['Content-Length'])
+    if isinstance(data, bytes):
+        return len(data)
+    if isinstance(data, str):
+        return len(data.encode('utf-8'))
+    return getattr(data, 'size', None)
+
+
+class Call(object):
+    """One call of DocuSign API, including its retries."""
+    def __init__(self, sender, operation, method, url, request_size=None):
+        #: Client class.
+        self.sender = sender
+        #: Name of operation, see
+        #: :func:`~django_docusign.resilience.get_operation`.
+        self.operation = operation
+        self.method = method
+        self.url = url
+        self.envelope_id = get_envelope_id(url)
+        #: Date the call started (POSIX timestamp).
+        self.started = time.time()
+        #: Duration, in seconds, including retries.
+        self.duration = None
+        #: Status code of last response, ``None`` if there was no response.
+        self.status_code = None
+        #: Number of retries.
+        self.retries = 0
+        #: Size of request body, in bytes, ``None`` if unknown.
+        self.request_size = request_size
+        #: Size of response body, in bytes, ``None`` if unknown.
+        self.response_size = None
+        #: Exception raised by the call, if any.
+        self.exception = None
+        self._clock = time.perf_counter()
+
+    def finish(self, response=None, exception=None, response_size=None):
+        """Record outcome of call, and report it.
+
+        ``response`` is a :mod:`requests` or :mod:`httpx` response. Its
+        size is read from ``Content-Length`` header, else defaults to
+        ``response_size``. Size of request is read from the request that was
+        actually sent, if unknown.
+
+        """
+        self.duration = time.perf_counter() - self._clock
+        self.exception = exception
+        if response is not None:
+            self.status_code = response.status_code
+            if self.request_size is None:
+                self.request_size = get_size(None, response.request.headers)
+            if 'Content-Length' in response.headers:
+                response_size = int(response.headers['Content-Length'])
+        self.response_size = response_size
+        report(self)
+
+    @property
+    def failed(self):
+        """Whether call raised an exception or got an error response."""
+        return self.exception is not None or self.status_code is None \
+            or self.status_code >= 400
+
+
+_observers = None
+_observers_lock = threading.Lock()
+
+
+def get_observers():
+    """Return process-wide list of observers.
+
+    Observers are callables which take a :class:`Call`, configured as
+    dotted paths in ``settings.DOCUSIGN_INSTRUMENTATION``. Classes are
+    instantiated without arguments.
+
+    """
+    global _observers
+    if _observers is None:
+        with _observers_lock:
+            if _observers is None:
+                observers = []
+                for path in getattr(settings, 'DOCUSIGN_INSTRUMENTATION', []):
+                    observer = import_string(path)
+                    if isinstance(observer, type):
+                        observer = observer()
+                    observers.append(observer)
+                _observers = observers
+    return _observers
+
+
+def reset_observers():
+    """Drop process-wide observers. Typically used in tests."""
+    global _observers
+    with _observers_lock:
+        _observers = None
+
+
+def start_call(sender, operation, method, url, data=None, headers=None):
+    """Return a :class:`Call`, or ``None`` if nobody listens to calls."""
+    if not get_observers() and not docusign_call.has_listeners():
+        return None
+    return Call(sender, operation, method, url,
+                request_size=get_size(data, headers))
+
+
+def report(call):
+    """Send ``call`` to signal receivers and observers.
+
+    Failures of receivers and observers are logged, they never make the
+    call fail.
+
+    """
+    for receiver, result in docusign_call.send_robust(call.sender,
+                                                      call=call):
+        if isinstance(result, Exception):
+            logger.error('Receiver %r of docusign_call failed: %r',
+                         receiver, result)
+    for observer in get_observers():
+        try:
+            observer(call)
+        except Exception:
+            logger.exception('DocuSign instrumentation observer %r failed',
+                             observer)
+
+
+class OpenTelemetryObserver(object):
+    """Record every call as a client span, with OpenTelemetry.
+
+    Requires `opentelemetry-api`_.
+
+    .. _`opentelemetry-api`: https://pypi.org/project/opentelemetry-api/
+
+    """
+    def __init__(self, tracer=None):
+        if trace is None:
+            raise ImportError('OpenTelemetryObserver requires '
+                              'opentelemetry-api.')
+        self.tracer = tracer or trace.get_tracer(__name__)
+
+    def get_attributes(self, call):
+        attributes = {
+            'http.method': call.method,
+            'http.url': call.url,
+            'docusign.operation': call.operation,
+            'docusign.retries': call.retries,
+        }
+        optional = {
+            'http.status_code': call.status_code,
+            'http.request_content_length': call.request_size,
+            'http.response_content_length': call.response_size,
+            'docusign.envelope_id': call.envelope_id,
+        }
+        attributes.update((key, value) for key, value in optional.items()
+                          if value is not None)
+        return attributes
+
+    def __call__(self, call):
+        started = int(call.started * 1e9)
+        span = self.tracer.start_span(
+            'DocuSign {operation}'.format(operation=call.operation),
+            kind=trace.SpanKind.CLIENT,
+            start_time=started,
+            attributes=self.get_attributes(call))
+        if call.exception is not None:
+            span.record_exception(call.exception)
+        if call.failed:
+            span.set_status(trace.Status(trace.StatusCode.ERROR))
+        span.end(end_time=started + int(call.duration * 1e9))
+
+
+#: Prometheus metrics, by registry.
+_prometheus_metrics = {}
+_prometheus_metrics_lock = threading.Lock()
+
+
+class PrometheusObserver(object):
+    """Count calls, bytes and observe durations, with Prometheus.
+
+    Metrics are ``docusign_calls_total`` (by operation and status),
+    ``docusign_call_duration_seconds`` (by operation) and
+    ``docusign_call_bytes_total`` (by operation and direction). Requires
+    `prometheus-client`_.
+
+    .. _`prometheus-client`: https://pypi.org/project/prometheus-client/
+
+    """
+    def __init__(self, registry=None, buckets=DEFAULT_DURATION_BUCKETS):
+        if prometheus_client is None:
+            raise ImportError('PrometheusObserver requires '
+                              'prometheus-client.')
+        if registry is None:
+            registry = prometheus_client.REGISTRY
+        # Metrics can be registered only once per registry.
+        with _prometheus_metrics_lock:
+            if id(registry) not in _prometheus_metrics:
+                _prometheus_metrics[id(registry)] = (
+                    prometheus_client.Counter(
+                        'docusign_calls_total',
+                        'Calls of DocuSign API.',
+                        ['operation', 'status'], registry=registry),
+                    prometheus_client.Histogram(
+                        'docusign_call_duration_seconds',
+                        'Duration of calls of DocuSign API, with retries.',
+                        ['operation'], buckets=buckets, registry=registry),
+                    prometheus_client.Counter(
+                        'docusign_call_bytes_total',
+                        'Bytes sent to and received from DocuSign API.',
+                        ['operation', 'direction'], registry=registry),
+                )
+            self.calls, self.durations, self.bytes = \
+                _prometheus_metrics[id(registry)]
+
+    def __call__(self, call):
+        status = 'error' if call.status_code is None \
+            else str(call.status_code)
+        self.calls.labels(call.operation, status).inc()
+        self.durations.labels(call.operation).observe(call.duration)
+        if call.request_size:
+            self.bytes.labels(call.operation, 'sent').inc(call.request_size)
+        if call.response_size:
+            self.bytes.labels(call.operation, 'received') \
+                .inc(call.response_size)
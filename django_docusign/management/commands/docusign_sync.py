@@ -0,0 +1,62 @@
+"""Management command to reconcile statuses with DocuSign."""
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+from django_anysign import api as django_anysign
+
+from django_docusign.sync import FileCheckpoint, get_checkpoint
+
+
+class Command(BaseCommand):
+    help = 'Update signatures and signers with statuses read from DocuSign.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from-date',
+            help='ISO 8601 date to synchronize from. Defaults to checkpoint.')
+        parser.add_argument(
+            '--backend', default='docusign',
+            help='Code of signature backend. Defaults to "docusign".')
+        parser.add_argument(
+            '--checkpoint-file',
+            help='File where checkpoint is stored. Defaults to '
+                 'settings.DOCUSIGN_SYNC_CHECKPOINT_FILE, or cache.')
+        parser.add_argument(
+            '--page-size', type=int,
+            help='Number of envelopes per page.')
+        parser.add_argument(
+            '--max-pages', type=int,
+            help='Stop after this number of pages.')
+
+    def handle(self, *args, **options):
+        backend = django_anysign.get_signature_backend(options['backend'])
+        if options['checkpoint_file']:
+            checkpoint = FileCheckpoint(options['checkpoint_file'])
+        else:
+            try:
+                checkpoint = get_checkpoint()
+            except ImproperlyConfigured as exception:
+                raise CommandError(exception)
+        sync_class = import_string(getattr(
+            settings, 'DOCUSIGN_SYNC_CLASS',
+            'django_docusign.sync.EnvelopeSync'))
+        sync = sync_class(backend, checkpoint=checkpoint,
+                          page_size=options['page_size'])
+        try:
+            result = sync.run(from_date=options['from_date'],
+                              max_pages=options['max_pages'])
+        except ValueError as exception:
+            raise CommandError(exception)
+        self.stdout.write(
+            'Synchronized {envelopes} envelopes ({signatures} signatures, '
+            '{signers} signers updated) in {elapsed:.2f}s: '
+            '{throughput:.1f} envelopes/s. Checkpoint: {checkpoint}.'.format(
+                envelopes=result.envelopes,
+                signatures=result.signatures,
+                signers=result.signers,
+                elapsed=result.elapsed,
+                throughput=result.throughput,
+                checkpoint=result.checkpoint))
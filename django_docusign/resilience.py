@@ -0,0 +1,251 @@
+"""Retries, circuit breaker and per-operation timeouts of DocuSign calls.
+
+:class:`RetryPolicy` retries idempotent calls that failed because of the
+network or of DocuSign's availability, with jittered exponential backoff.
+:class:`CircuitBreaker` makes calls fail fast once too many of them failed,
+so that workers do not pile up behind an unavailable DocuSign.
+
+"""
+from __future__ import unicode_literals
+
+import collections
+import random
+import re
+import threading
+import time
+
+import requests
+from django.conf import settings
+from pydocusign.exceptions import DocuSignException
+
+try:
+    import httpx
+except ImportError:  # Optional dependency.
+    httpx = None
+
+#: Default base delay, in seconds, between retries.
+DEFAULT_RETRY_BACKOFF = 0.5
+
+#: Default maximum delay, in seconds, between retries.
+DEFAULT_RETRY_MAX_BACKOFF = 10.0
+
+#: Default error rate (between 0 and 1) above which circuit opens.
+DEFAULT_CIRCUIT_BREAKER_THRESHOLD = 0.5
+
+#: Default minimum number of calls in window before circuit may open.
+DEFAULT_CIRCUIT_BREAKER_MIN_CALLS = 10
+
+#: Default number of seconds of calls considered by circuit breaker.
+DEFAULT_CIRCUIT_BREAKER_WINDOW = 60
+
+#: Default number of seconds circuit stays open.
+DEFAULT_CIRCUIT_BREAKER_COOLDOWN = 30
+
+#: HTTP methods which can be repeated safely.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+#: Status codes of responses which are worth retrying.
+RETRYABLE_STATUS_CODES = frozenset([429, 502, 503, 504])
+
+#: Exceptions raised when connection to DocuSign could not be established,
+#: i.e. nothing was sent.
+CONNECT_ERRORS = (requests.exceptions.ConnectTimeout,)
+
+#: Exceptions raised when request or response was lost.
+TRANSPORT_ERRORS = (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout)
+
+if httpx is not None:
+    CONNECT_ERRORS += (httpx.ConnectError, httpx.ConnectTimeout)
+    TRANSPORT_ERRORS += (httpx.TransportError,)
+
+#: Operations, by HTTP method and pattern of API path. First match wins.
+OPERATIONS = [
+    ('GET', re.compile(r'/login_information'), 'login'),
+    ('GET', re.compile(r'/envelopes/[^/]+/recipients$'), 'recipients'),
+    ('POST', re.compile(r'/envelopes/[^/]+/views/'), 'recipient_view'),
+    ('GET', re.compile(r'/documents/[^/]+/pages/'), 'page_image'),
+    ('GET', re.compile(r'/envelopes/[^/]+/documents$'), 'document_list'),
+    ('GET', re.compile(r'/envelopes/[^/]+/documents/'), 'document'),
+    ('POST', re.compile(r'/envelopes$'), 'create_envelope'),
+    ('GET', re.compile(r'/envelopes$'), 'envelopes_status'),
+    ('GET', re.compile(r'/templates/'), 'template'),
+]
+
+
+def get_operation(method, url):
+    """Return name of operation performed by request, e.g. ``'recipients'``,
+    or ``'default'``."""
+    path = url.split('?', 1)[0]
+    for operation_method, pattern, name in OPERATIONS:
+        if method == operation_method and pattern.search(path):
+            return name
+    return 'default'
+
+
+class CircuitOpen(DocuSignException):
+    """Call was not performed, since DocuSign is deemed unavailable."""
+    def __init__(self, message, retry_after):
+        super(CircuitOpen, self).__init__(message)
+        #: Number of seconds until circuit lets a call through.
+        self.retry_after = retry_after
+
+
+class RetryPolicy(object):
+    """Decide whether and when failed calls are retried.
+
+    At most ``retries`` retries. Delay before retry ``n`` is drawn between 0
+    and ``backoff * 2 ** (n - 1)`` seconds, capped at ``max_backoff``
+    ("full jitter"), unless DocuSign sent a ``Retry-After`` header.
+
+    """
+    def __init__(self, retries=0, backoff=DEFAULT_RETRY_BACKOFF,
+                 max_backoff=DEFAULT_RETRY_MAX_BACKOFF):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def can_retry_exception(self, method, exception, data=None):
+        """Return whether request failed with ``exception`` can be
+        repeated.
+
+        Idempotent requests can. Others only if connection could not be
+        established, and if body can be sent again.
+
+        """
+        if method in IDEMPOTENT_METHODS:
+            return isinstance(exception, TRANSPORT_ERRORS)
+        return isinstance(exception, CONNECT_ERRORS) \
+            and (data is None or isinstance(data, (bytes, str)))
+
+    def can_retry_response(self, method, response):
+        """Return whether request which got ``response`` can be repeated."""
+        return method in IDEMPOTENT_METHODS \
+            and response.status_code in RETRYABLE_STATUS_CODES
+
+    def get_delay(self, attempt, response=None):
+        """Return number of seconds to wait before retry ``attempt``
+        (starting at 1)."""
+        if response is not None:
+            try:
+                return min(float(response.headers['Retry-After']),
+                           self.max_backoff)
+            except (KeyError, ValueError):
+                pass
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker(object):
+    """Fail fast once error rate of calls exceeds ``threshold``.
+
+    Outcomes of calls of the last ``window`` seconds are recorded. When
+    there are at least ``min_calls`` of them, and the rate of failures
+    reaches ``threshold``, circuit opens: calls raise :class:`CircuitOpen`
+    for ``cooldown`` seconds. Then one trial call is let through: circuit
+    closes if it succeeds, opens again if it fails.
+
+    """
+    def __init__(self, threshold=DEFAULT_CIRCUIT_BREAKER_THRESHOLD,
+                 min_calls=DEFAULT_CIRCUIT_BREAKER_MIN_CALLS,
+                 window=DEFAULT_CIRCUIT_BREAKER_WINDOW,
+                 cooldown=DEFAULT_CIRCUIT_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.opened_at = None
+        #: Date the pending trial call started, if any.
+        self.trial_started = None
+        self._calls = collections.deque()
+        self._failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """``'closed'``, ``'open'`` or ``'half-open'``."""
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() < self.opened_at + self.cooldown:
+            return 'open'
+        return 'half-open'
+
+    def before_call(self):
+        """Raise :class:`CircuitOpen` unless call may be performed."""
+        now = time.monotonic()
+        with self._lock:
+            if self.opened_at is None:
+                return
+            retry_after = self.opened_at + self.cooldown - now
+            # A trial call which never reported (e.g. it was throttled) is
+            # given up after cooldown.
+            if retry_after <= 0 and (
+                    self.trial_started is None
+                    or now - self.trial_started > self.cooldown):
+                self.trial_started = now
+                return
+            raise CircuitOpen(
+                'DocuSign calls suspended after too many failures',
+                max(retry_after, 0))
+
+    def record(self, failed):
+        """Record outcome of a call."""
+        now = time.monotonic()
+        with self._lock:
+            if self.opened_at is not None:
+                if self.trial_started is not None:
+                    # Outcome of trial call decides.
+                    self.trial_started = None
+                    self.opened_at = now if failed else None
+                    self._calls.clear()
+                    self._failures = 0
+                return
+            self._calls.append((now, failed))
+            self._failures += failed
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._failures -= self._calls.popleft()[1]
+            if len(self._calls) >= self.min_calls \
+                    and self._failures >= self.threshold * len(self._calls):
+                self.opened_at = now
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(key):
+    """Return process-wide :class:`CircuitBreaker` for ``key`` (e.g. the
+    root URL of DocuSign API), or ``None`` unless
+    ``settings.DOCUSIGN_CIRCUIT_BREAKER`` is ``True``.
+
+    Breakers are configured on first access, with
+    ``settings.DOCUSIGN_CIRCUIT_BREAKER_THRESHOLD``,
+    ``settings.DOCUSIGN_CIRCUIT_BREAKER_MIN_CALLS``,
+    ``settings.DOCUSIGN_CIRCUIT_BREAKER_WINDOW`` and
+    ``settings.DOCUSIGN_CIRCUIT_BREAKER_COOLDOWN``.
+
+    """
+    if not getattr(settings, 'DOCUSIGN_CIRCUIT_BREAKER', False):
+        return None
+    with _circuit_breakers_lock:
+        if key not in _circuit_breakers:
+            _circuit_breakers[key] = CircuitBreaker(
+                threshold=getattr(settings,
+                                  'DOCUSIGN_CIRCUIT_BREAKER_THRESHOLD',
+                                  DEFAULT_CIRCUIT_BREAKER_THRESHOLD),
+                min_calls=getattr(settings,
+                                  'DOCUSIGN_CIRCUIT_BREAKER_MIN_CALLS',
+                                  DEFAULT_CIRCUIT_BREAKER_MIN_CALLS),
+                window=getattr(settings, 'DOCUSIGN_CIRCUIT_BREAKER_WINDOW',
+                               DEFAULT_CIRCUIT_BREAKER_WINDOW),
+                cooldown=getattr(settings,
+                                 'DOCUSIGN_CIRCUIT_BREAKER_COOLDOWN',
+                                 DEFAULT_CIRCUIT_BREAKER_COOLDOWN),
+            )
+        return _circuit_breakers[key]
+
+
+def reset_circuit_breakers():
+    """Drop process-wide circuit breakers. Typically used in tests."""
+    with _circuit_breakers_lock:
+        _circuit_breakers.clear()
@@ -0,0 +1,10 @@
+"""Signals sent by django-docusign."""
+from __future__ import unicode_literals
+
+from django.dispatch import Signal
+
+#: Sent after every call of DocuSign API, whether it succeeded or not.
+#:
+#: ``sender`` is the client class, ``call`` is a
+#: :class:`~django_docusign.instrumentation.Call` instance.
+docusign_call = Signal()
@@ -0,0 +1,286 @@
+"""Reconcile statuses of signatures and signers with DocuSign.
+
+:class:`EnvelopeSync` lists envelopes whose status changed since a date, and
+updates matching signatures and signers. Envelopes are read in order of
+``statusChangedDateTime``, and the latest one seen is saved as a checkpoint,
+so that next run resumes from there.
+
+"""
+from __future__ import unicode_literals
+
+import datetime
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, now
+from django_anysign import api as django_anysign
+
+#: Default number of envelopes per page of DocuSign's listing.
+DEFAULT_SYNC_PAGE_SIZE = 100
+
+#: Default number of days scanned by first synchronization.
+DEFAULT_SYNC_FROM_DAYS = 30
+
+#: Default key of checkpoint in Django's cache.
+DEFAULT_SYNC_CHECKPOINT_KEY = 'docusign:sync:checkpoint'
+
+
+def parse_date(value):
+    """Return aware datetime for ``value``, a datetime or an ISO 8601
+    string such as DocuSign's ``'2020-01-01T10:00:00.0000000Z'``.
+
+    Naive dates are UTC. Raise :class:`ValueError` if ``value`` is invalid.
+
+    """
+    if not isinstance(value, datetime.datetime):
+        date = parse_datetime(value or '')
+        if date is None:
+            raise ValueError('Invalid date: {value!r}'.format(value=value))
+        value = date
+    if is_naive(value):
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
+class CacheCheckpoint(object):
+    """Checkpoint stored in a Django cache.
+
+    Cache must be persistent: raise :class:`ImproperlyConfigured` for
+    local-memory and dummy caches, which would lose checkpoints with the
+    process, so that every run would scan the whole period again.
+
+    """
+    def __init__(self, alias='default', key=DEFAULT_SYNC_CHECKPOINT_KEY):
+        self.cache = caches[alias]
+        if isinstance(self.cache, (LocMemCache, DummyCache)):
+            raise ImproperlyConfigured(
+                'Cache {alias!r} does not persist DocuSign sync checkpoint: '
+                'set settings.DOCUSIGN_SYNC_CHECKPOINT_FILE, or '
+                'settings.DOCUSIGN_SYNC_CACHE_ALIAS to a persistent cache.'
+                .format(alias=alias))
+        self.key = key
+
+    def load(self):
+        return self.cache.get(self.key)
+
+    def save(self, value):
+        self.cache.set(self.key, value, None)
+
+
+class FileCheckpoint(object):
+    """Checkpoint stored in a file."""
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as checkpoint_file:
+                return checkpoint_file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def save(self, value):
+        # Write then rename, so that the file is never half-written.
+        tmp_path = '{path}.tmp'.format(path=self.path)
+        with open(tmp_path, 'w') as checkpoint_file:
+            checkpoint_file.write(value)
+        os.replace(tmp_path, self.path)
+
+
+def get_checkpoint():
+    """Return checkpoint configured in settings.
+
+    ``settings.DOCUSIGN_SYNC_CHECKPOINT_FILE`` if set, else
+    ``settings.DOCUSIGN_SYNC_CACHE_ALIAS`` cache (defaults to ``'default'``),
+    which must be persistent, see :class:`CacheCheckpoint`.
+
+    """
+    path = getattr(settings, 'DOCUSIGN_SYNC_CHECKPOINT_FILE', None)
+    if path:
+        return FileCheckpoint(path)
+    return CacheCheckpoint(getattr(settings, 'DOCUSIGN_SYNC_CACHE_ALIAS',
+                                   'default'))
+
+
+class SyncResult(object):
+    """Result of :meth:`EnvelopeSync.run`."""
+    def __init__(self):
+        #: Number of envelopes read from DocuSign.
+        self.envelopes = 0
+        #: Number of pages read from DocuSign.
+        self.pages = 0
+        #: Number of signatures updated.
+        self.signatures = 0
+        #: Number of signers updated.
+        self.signers = 0
+        #: Date of the latest change seen (aware datetime), i.e. the new
+        #: checkpoint.
+        self.checkpoint = None
+        #: Total duration, in seconds.
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        """Number of envelopes processed per second."""
+        if not self.elapsed:
+            return 0.0
+        return self.envelopes / self.elapsed
+
+
+class EnvelopeSync(object):
+    """Update signatures and signers with statuses read from DocuSign.
+
+    Default implementation copies envelope's and recipients' ``status`` into
+    ``status`` field of signature and signer models, if they have one.
+    Override :meth:`update_signature`, :meth:`update_signer` and
+    ``*_fields`` attributes to adapt it to your models.
+
+    """
+    #: Fields of signature model saved by ``bulk_update()``.
+    signature_fields = ['status']
+
+    #: Fields of signer model saved by ``bulk_update()``.
+    signer_fields = ['status']
+
+    def __init__(self, backend, checkpoint=None, page_size=None,
+                 batch_size=None):
+        #: :class:`~django_docusign.backend.DocuSignBackend` instance.
+        self.backend = backend
+        self.checkpoint = get_checkpoint() if checkpoint is None \
+            else checkpoint
+        self.page_size = page_size or getattr(
+            settings, 'DOCUSIGN_SYNC_PAGE_SIZE', DEFAULT_SYNC_PAGE_SIZE)
+        self.batch_size = batch_size
+
+    def get_from_date(self):
+        """Return checkpoint, or date of first synchronization."""
+        from_date = self.checkpoint.load()
+        if from_date is None:
+            return now() - datetime.timedelta(days=DEFAULT_SYNC_FROM_DAYS)
+        return parse_date(from_date)
+
+    def run(self, from_date=None, max_pages=None):
+        """Read envelopes changed since ``from_date`` (defaults to
+        checkpoint), page by page, and apply changes.
+
+        Checkpoint is saved after each page, so that an interrupted run
+        resumes where it stopped. Return :class:`SyncResult`.
+
+        """
+        result = SyncResult()
+        started = time.monotonic()
+        if from_date is None:
+            from_date = self.get_from_date()
+        else:
+            from_date = parse_date(from_date)
+        start_position = 0
+        while True:
+            page = self.backend.docusign_client.get_envelopes_status(
+                from_date, start_position=start_position,
+                count=self.page_size)
+            envelopes = page.get('envelopes') or []
+            result.pages += 1
+            result.envelopes += len(envelopes)
+            if envelopes:
+                self.apply(envelopes, result)
+                changes = [self.get_change_date(envelope)
+                           for envelope in envelopes]
+                result.checkpoint = max(
+                    [result.checkpoint or from_date]
+                    + [change for change in changes if change is not None])
+                self.checkpoint.save(result.checkpoint.isoformat())
+            end_position = int(page.get('endPosition',
+                                        start_position + len(envelopes) - 1))
+            total = int(page.get('totalSetSize', 0))
+            if not envelopes or end_position + 1 >= total \
+                    or (max_pages and result.pages >= max_pages):
+                break
+            start_position = end_position + 1
+        result.elapsed = time.monotonic() - started
+        return result
+
+    def get_change_date(self, envelope):
+        """Return date of latest status change of ``envelope`` (aware
+        datetime), or ``None``.
+
+        Envelopes are listed in this order, see
+        :meth:`~django_docusign.client.DocuSignClient.get_envelopes_status`.
+
+        """
+        value = envelope.get('statusChangedDateTime')
+        return parse_date(value) if value else None
+
+    def apply(self, envelopes, result):
+        """Update signatures and signers matching ``envelopes``, with two
+        queries to read and ``bulk_update()`` to write."""
+        envelopes = {envelope['envelopeId']: envelope
+                     for envelope in envelopes}
+        signature_model = django_anysign.get_signature_model()
+        signatures = signature_model.objects \
+            .filter(signature_backend_id__in=list(envelopes)) \
+            .prefetch_related('signers')
+        changed_signatures = []
+        changed_signers = []
+        for signature in signatures:
+            envelope = envelopes[signature.signature_backend_id]
+            if self.update_signature(signature, envelope):
+                changed_signatures.append(signature)
+            recipients = self.backend.index_recipients(
+                envelope.get('recipients') or {})
+            for signer in signature.signers.all():
+                recipient = recipients.get(str(signer.pk))
+                if recipient and self.update_signer(signer, recipient):
+                    changed_signers.append(signer)
+            self.backend.invalidate_recipients(
+                signature.signature_backend_id)
+            if envelope.get('status') == 'completed':
+                self.backend.mark_envelope_completed(
+                    signature.signature_backend_id,
+                    envelope.get('completedDateTime')
+                    or self.get_change_date(envelope))
+        with transaction.atomic():
+            if changed_signatures:
+                signature_model.objects.bulk_update(
+                    changed_signatures, self.signature_fields,
+                    batch_size=self.batch_size)
+            if changed_signers:
+                django_anysign.get_signer_model().objects.bulk_update(
+                    changed_signers, self.signer_fields,
+                    batch_size=self.batch_size)
+        result.signatures += len(changed_signatures)
+        result.signers += len(changed_signers)
+
+    def update_signature(self, signature, envelope):
+        """Update ``signature`` with ``envelope`` (dict), in memory.
+
+        Return ``True`` if ``signature`` changed. Signatures without
+        ``status`` attribute are left unchanged.
+
+        """
+        status = envelope.get('status')
+        if not status or not hasattr(signature, 'status') \
+                or signature.status == status:
+            return False
+        signature.status = status
+        return True
+
+    def update_signer(self, signer, recipient):
+        """Update ``signer`` with ``recipient`` (dict), in memory.
+
+        Return ``True`` if ``signer`` changed. Signers without ``status``
+        attribute are left unchanged.
+
+        """
+        status = recipient.get('status')
+        if not status or not hasattr(signer, 'status') \
+                or signer.status == status:
+            return False
+        signer.status = status
+        return True
@@ -0,0 +1,95 @@
+"""Run work in the background, out of the request/response cycle.
+
+Task runners expose ``apply_async(func, args=(), kwargs=None,
+task_id=None)``, after Celery's ``Task.apply_async``. Configure runner with
+``settings.DOCUSIGN_TASK_RUNNER``, the dotted path to a runner class.
+
+"""
+from __future__ import unicode_literals
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+#: Default number of threads of :class:`ThreadPoolTaskRunner`.
+DEFAULT_TASK_MAX_WORKERS = 4
+
+
+class ThreadPoolTaskRunner(object):
+    """Run tasks in a pool of threads of current process.
+
+    Size of pool is ``settings.DOCUSIGN_TASK_MAX_WORKERS``.
+
+    """
+    def __init__(self, max_workers=None):
+        if max_workers is None:
+            max_workers = getattr(settings, 'DOCUSIGN_TASK_MAX_WORKERS',
+                                  DEFAULT_TASK_MAX_WORKERS)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def apply_async(self, func, args=(), kwargs=None, task_id=None):
+        """Schedule ``func(*args, **kwargs)``, return
+        :class:`concurrent.futures.Future`."""
+        return self.executor.submit(self.run, func, args, kwargs or {},
+                                    task_id)
+
+    def run(self, func, args, kwargs, task_id):
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            logger.exception('DocuSign task %s failed', task_id or func)
+            raise
+        finally:
+            # Threads of the pool outlive requests.
+            connections.close_all()
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+class ImmediateTaskRunner(object):
+    """Run tasks synchronously, in calling thread. Useful in tests."""
+    def apply_async(self, func, args=(), kwargs=None, task_id=None):
+        future = Future()
+        try:
+            future.set_result(func(*args, **(kwargs or {})))
+        except Exception as exception:
+            future.set_exception(exception)
+        return future
+
+
+_task_runner = None
+_task_runner_lock = threading.Lock()
+
+
+def get_task_runner():
+    """Return process-wide task runner.
+
+    Runner is an instance of ``settings.DOCUSIGN_TASK_RUNNER``, which
+    defaults to :class:`ThreadPoolTaskRunner`.
+
+    """
+    global _task_runner
+    if _task_runner is None:
+        with _task_runner_lock:
+            if _task_runner is None:
+                runner_class = import_string(getattr(
+                    settings, 'DOCUSIGN_TASK_RUNNER',
+                    'django_docusign.tasks.ThreadPoolTaskRunner'))
+                _task_runner = runner_class()
+    return _task_runner
+
+
+def reset_task_runner():
+    """Drop process-wide task runner. Typically used in tests."""
+    global _task_runner
+    with _task_runner_lock:
+        if isinstance(_task_runner, ThreadPoolTaskRunner):
+            _task_runner.shutdown()
+        _task_runner = None
@@ -0,0 +1,281 @@
+"""Route DocuSign calls of many accounts (tenants) to dedicated clients.
+
+:class:`TenantRouter` keeps one :class:`Tenant` per account: a pooled
+client, caches of templates, recipients and page images, and a rate-limit
+bucket of its own. At most ``max_tenants`` tenants are kept alive, least
+recently used ones are evicted.
+
+:class:`~django_docusign.backend.TenantDocuSignBackend` is the backend
+which uses the router.
+
+"""
+from __future__ import unicode_literals
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from django_docusign.auth import create_token_provider
+from django_docusign.cache import (DEFAULT_RECIPIENT_CACHE_SIZE,
+                                   DEFAULT_RECIPIENT_CACHE_TIMEOUT,
+                                   DEFAULT_TEMPLATE_CACHE_SIZE,
+                                   DEFAULT_TEMPLATE_CACHE_TIMEOUT,
+                                   DEFAULT_VALIDATOR_CACHE_SIZE, DjangoCache,
+                                   LRUCache, create_page_image_cache)
+from django_docusign.client import DEFAULT_POOL_SIZE, DocuSignClient
+
+#: Default maximum number of tenants kept alive.
+DEFAULT_TENANT_MAX = 100
+
+#: Client options which can change without creating a new client.
+MUTABLE_CLIENT_OPTIONS = frozenset(['oauth2_token'])
+
+
+class Tenant(object):
+    """DocuSign account of a tenant: client and caches."""
+    def __init__(self, tenant_id, client_kwargs, client, template_cache=None,
+                 recipient_cache=None, page_image_cache=None,
+                 validator_cache=None):
+        self.tenant_id = tenant_id
+        #: Options ``client`` was created with.
+        self.client_kwargs = client_kwargs
+        #: :class:`~django_docusign.client.DocuSignClient` of tenant.
+        self.client = client
+        #: Cache of template definitions, ``None`` if disabled.
+        self.template_cache = template_cache
+        #: Cache of envelope recipients, ``None`` if not shared.
+        self.recipient_cache = recipient_cache
+        #: Cache of page images, ``None`` if disabled.
+        self.page_image_cache = page_image_cache
+        #: Cache of validators of cached content.
+        self.validator_cache = validator_cache
+
+    def close(self):
+        """Close connections and drop cached data."""
+        self.client.close()
+        for cache in (self.template_cache, self.recipient_cache,
+                      self.page_image_cache, self.validator_cache):
+            if cache is not None:
+                cache.clear()
+
+
+class TenantRouter(object):
+    """Thread-safe registry of :class:`Tenant` instances, by tenant ID.
+
+    At most ``max_tenants`` tenants are kept: when a new one is needed, the
+    least recently used one is forgotten. Its client is not closed, since
+    it may still be in use: connections are released once its last user
+    drops it.
+
+    Every tenant gets a rate-limit bucket of its own (see
+    :mod:`django_docusign.throttle`), so that a busy tenant does not use up
+    the budget of others.
+
+    Template definitions are cached per tenant unless
+    ``settings.DOCUSIGN_TEMPLATE_CACHE`` is ``False``. Recipients are cached
+    per tenant when ``settings.DOCUSIGN_RECIPIENT_CACHE`` is ``'shared'``.
+    Page images (if ``settings.DOCUSIGN_PAGE_IMAGE_CACHE`` is ``True``) and
+    their validators are cached per tenant too. Caches use the settings of
+    shared caches, see :mod:`django_docusign.cache`.
+
+    With OAuth2 JWT grant (see :mod:`django_docusign.auth`), every tenant
+    gets a token provider of its own, so that tokens and account URL of a
+    tenant are never used for another.
+
+    """
+    def __init__(self, max_tenants=DEFAULT_TENANT_MAX,
+                 client_class=DocuSignClient, pool_size=DEFAULT_POOL_SIZE):
+        self.max_tenants = max_tenants
+        self.client_class = client_class
+        self.pool_size = pool_size
+        self._tenants = OrderedDict()
+        self._token_providers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_rate_limit_key(self, tenant_id):
+        """Return key of rate-limit bucket of tenant ``tenant_id``."""
+        return 'tenant:{tenant_id}'.format(tenant_id=tenant_id)
+
+    def create_client(self, tenant_id, **client_kwargs):
+        return self.client_class(
+            pool_size=self.pool_size,
+            rate_limit_key=self.get_rate_limit_key(tenant_id),
+            **client_kwargs)
+
+    def create_cache(self, tenant_id, name, maxsize, timeout, alias=None):
+        """Return cache ``name`` of tenant: a :class:`LRUCache`, or a
+        :class:`DjangoCache` using Django cache ``alias`` if set."""
+        if alias is None:
+            return LRUCache(maxsize=maxsize, timeout=timeout)
+        return DjangoCache(
+            alias=alias,
+            timeout=timeout,
+            key_prefix='docusign:{name}:tenant:{tenant_id}'.format(
+                name=name, tenant_id=tenant_id))
+
+    def create_template_cache(self, tenant_id):
+        if not getattr(settings, 'DOCUSIGN_TEMPLATE_CACHE', True):
+            return None
+        return self.create_cache(
+            tenant_id, 'template',
+            maxsize=getattr(settings, 'DOCUSIGN_TEMPLATE_CACHE_SIZE',
+                            DEFAULT_TEMPLATE_CACHE_SIZE),
+            timeout=getattr(settings, 'DOCUSIGN_TEMPLATE_CACHE_TIMEOUT',
+                            DEFAULT_TEMPLATE_CACHE_TIMEOUT),
+            alias=getattr(settings, 'DOCUSIGN_TEMPLATE_CACHE_ALIAS', None))
+
+    def create_recipient_cache(self, tenant_id):
+        if getattr(settings, 'DOCUSIGN_RECIPIENT_CACHE', 'request') \
+                != 'shared':
+            return None
+        return self.create_cache(
+            tenant_id, 'recipient',
+            maxsize=getattr(settings, 'DOCUSIGN_RECIPIENT_CACHE_SIZE',
+                            DEFAULT_RECIPIENT_CACHE_SIZE),
+            timeout=getattr(settings, 'DOCUSIGN_RECIPIENT_CACHE_TIMEOUT',
+                            DEFAULT_RECIPIENT_CACHE_TIMEOUT),
+            alias=getattr(settings, 'DOCUSIGN_RECIPIENT_CACHE_ALIAS', None))
+
+    def create_page_image_cache(self, tenant_id):
+        if not getattr(settings, 'DOCUSIGN_PAGE_IMAGE_CACHE', False):
+            return None
+        return create_page_image_cache()
+
+    def create_validator_cache(self, tenant_id):
+        return self.create_cache(
+            tenant_id, 'validator',
+            maxsize=getattr(settings, 'DOCUSIGN_VALIDATOR_CACHE_SIZE',
+                            DEFAULT_VALIDATOR_CACHE_SIZE),
+            timeout=None,
+            alias=getattr(settings, 'DOCUSIGN_VALIDATOR_CACHE_ALIAS', None))
+
+    def get_token_provider(self, tenant_id, account_id):
+        """Return :class:`~django_docusign.auth.JWTTokenProvider` of
+        account ``account_id`` for tenant ``tenant_id``, or ``None`` if
+        OAuth2 JWT grant is not configured.
+
+        Providers of the ``max_tenants`` most recently used tenants are
+        kept, so that tokens are memoized.
+
+        """
+        key = (tenant_id, account_id)
+        with self._lock:
+            provider = self._token_providers.get(key)
+            if provider is None:
+                provider = create_token_provider(account_id=account_id)
+                if provider is None:
+                    return None
+                self._token_providers[key] = provider
+                while len(self._token_providers) > self.max_tenants:
+                    self._token_providers.popitem(last=False)
+            self._token_providers.move_to_end(key)
+        return provider
+
+    def clear_token_providers(self):
+        """Forget token providers, e.g. when settings change."""
+        with self._lock:
+            self._token_providers.clear()
+
+    def is_compatible(self, tenant, client_kwargs):
+        """Return whether ``tenant``'s client can serve ``client_kwargs``,
+        once options of :data:`MUTABLE_CLIENT_OPTIONS` are updated."""
+        keys = (set(tenant.client_kwargs) | set(client_kwargs)) \
+            - MUTABLE_CLIENT_OPTIONS
+        return all(tenant.client_kwargs.get(key) == client_kwargs.get(key)
+                   for key in keys)
+
+    def get(self, tenant_id, **client_kwargs):
+        """Return :class:`Tenant` ``tenant_id``, create it if necessary.
+
+        If ``client_kwargs`` changed since tenant was created, e.g. because
+        credentials rotated, the OAuth2 token of the client is updated, or a
+        new client is created.
+
+        """
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is None:
+                tenant = Tenant(
+                    tenant_id, client_kwargs,
+                    self.create_client(tenant_id, **client_kwargs),
+                    template_cache=self.create_template_cache(tenant_id),
+                    recipient_cache=self.create_recipient_cache(tenant_id),
+                    page_image_cache=self.create_page_image_cache(tenant_id),
+                    validator_cache=self.create_validator_cache(tenant_id))
+                self._tenants[tenant_id] = tenant
+                while len(self._tenants) > self.max_tenants:
+                    # Client may still be in use: let it go with its last
+                    # user.
+                    self._tenants.popitem(last=False)
+            elif tenant.client_kwargs != client_kwargs:
+                if self.is_compatible(tenant, client_kwargs):
+                    for key in MUTABLE_CLIENT_OPTIONS & set(client_kwargs):
+                        setattr(tenant.client, key, client_kwargs[key])
+                else:
+                    # Previous client may still be in use: let it go with
+                    # its last user.
+                    tenant.client = self.create_client(tenant_id,
+                                                       **client_kwargs)
+                tenant.client_kwargs = client_kwargs
+            self._tenants.move_to_end(tenant_id)
+        return tenant
+
+    def clear(self):
+        """Close and forget every tenant. Useful in tests."""
+        with self._lock:
+            tenants = list(self._tenants.values())
+            self._tenants.clear()
+            self._token_providers.clear()
+        for tenant in tenants:
+            tenant.close()
+
+    def __contains__(self, tenant_id):
+        return tenant_id in self._tenants
+
+    def __len__(self):
+        return len(self._tenants)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_tenant_router():
+    """Return process-wide :class:`TenantRouter`.
+
+    Router is configured on first access, with
+    ``settings.DOCUSIGN_TENANT_MAX`` and ``settings.DOCUSIGN_POOL_SIZE``.
+
+    """
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = TenantRouter(
+                    max_tenants=getattr(settings, 'DOCUSIGN_TENANT_MAX',
+                                        DEFAULT_TENANT_MAX),
+                    pool_size=getattr(settings, 'DOCUSIGN_POOL_SIZE',
+                                      DEFAULT_POOL_SIZE))
+    return _router
+
+
+def reset_tenant_router():
+    """Close every tenant and drop process-wide router. Typically used in
+    tests."""
+    global _router
+    with _router_lock:
+        if _router is not None:
+            _router.clear()
+        _router = None
+
+
+@receiver(setting_changed)
+def on_setting_changed(setting, **kwargs):
+    """Forget token providers of tenants when a ``DOCUSIGN_JWT_*`` or
+    ``DOCUSIGN_INTEGRATOR_KEY`` setting changes."""
+    if _router is not None and (setting.startswith('DOCUSIGN_JWT_')
+                                or setting == 'DOCUSIGN_INTEGRATOR_KEY'):
+        _router.clear_token_providers()
@@ -0,0 +1,332 @@
+"""Rate limiting of DocuSign API calls.
+
+DocuSign enforces hourly and burst quotas per account. :class:`RateLimiter`
+is a token bucket, taken before every call of
+:class:`~django_docusign.client.DocuSignClient`. Its state lives in a
+store, shared by every thread of the process (:class:`LocalBucketStore`),
+by every process of the host (:class:`FileBucketStore`), or by every host
+(:class:`CacheBucketStore`).
+
+The bucket also follows DocuSign's ``X-RateLimit-*`` and
+``X-BurstLimit-*`` response headers, so that calls slow down before
+DocuSign starts rejecting them.
+
+"""
+from __future__ import unicode_literals
+
+import functools
+import json
+import threading
+import time
+import uuid
+from email.utils import parsedate_to_datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from pydocusign.exceptions import DocuSignException
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows.
+    fcntl = None
+
+#: Default number of calls allowed in a burst.
+DEFAULT_RATE_LIMIT_BURST = 10
+
+#: Default number of seconds a lock of :class:`CacheBucketStore` is held, at
+#: most.
+DEFAULT_RATE_LIMIT_LOCK_TIMEOUT = 5
+
+
+class RateLimitExceeded(DocuSignException):
+    """Call would exceed rate limit, and limiter does not wait."""
+    def __init__(self, message, wait):
+        super(RateLimitExceeded, self).__init__(message)
+        #: Number of seconds until a call is allowed.
+        self.wait = wait
+
+
+class LocalBucketStore(object):
+    """Buckets in memory of current process."""
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def update(self, key, func):
+        """Replace state of bucket ``key`` by ``func(state)[0]``, atomically,
+        return ``func(state)[1]``. ``state`` is ``None`` for new buckets."""
+        with self._lock:
+            state, result = func(self._states.get(key))
+            self._states[key] = state
+            return result
+
+
+class CacheBucketStore(object):
+    """Buckets in a Django cache, shared by every process using the cache.
+
+    Updates are serialized by a lock claimed with ``cache.add()``, which is
+    atomic in memcached and Redis backends. Locks expire after
+    ``lock_timeout`` seconds, should their holder die: a holder whose lock
+    expired meanwhile does not write its state, and retries. Callers which
+    cannot claim the lock within ``lock_timeout`` seconds get
+    :class:`RateLimitExceeded`, instead of waiting forever for a cache which
+    is down or overloaded.
+
+    """
+    def __init__(self, alias='default',
+                 lock_timeout=DEFAULT_RATE_LIMIT_LOCK_TIMEOUT):
+        self.alias = alias
+        self.lock_timeout = lock_timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def claim(self, lock_key, deadline):
+        """Take lock ``lock_key`` before ``deadline``, return its token."""
+        token = uuid.uuid4().hex
+        while not self.cache.add(lock_key, token, self.lock_timeout):
+            if time.time() >= deadline:
+                raise RateLimitExceeded(
+                    'DocuSign rate limit bucket is locked: gave up after '
+                    '{wait:.2f} seconds'.format(wait=self.lock_timeout),
+                    self.lock_timeout)
+            time.sleep(0.005)
+        return token
+
+    def release(self, lock_key, token):
+        """Release lock ``lock_key``, unless it expired and was claimed by
+        another caller."""
+        if self.cache.get(lock_key) == token:
+            self.cache.delete(lock_key)
+
+    def update(self, key, func):
+        """Same as :meth:`LocalBucketStore.update`."""
+        lock_key = '{key}:lock'.format(key=key)
+        deadline = time.time() + self.lock_timeout
+        while True:
+            token = self.claim(lock_key, deadline)
+            try:
+                state, result = func(self.cache.get(key))
+                if self.cache.get(lock_key) == token:
+                    self.cache.set(key, state, None)
+                    return result
+            finally:
+                self.release(lock_key, token)
+
+
+class FileBucketStore(object):
+    """Buckets in a JSON file, shared by every process of the host.
+
+    Updates are serialized by an exclusive ``flock()`` of the file (POSIX
+    only).
+
+    """
+    def __init__(self, path):
+        if fcntl is None:
+            raise ImportError('FileBucketStore requires fcntl (POSIX).')
+        self.path = path
+
+    def update(self, key, func):
+        """Same as :meth:`LocalBucketStore.update`."""
+        with open(self.path, 'a+') as bucket_file:
+            fcntl.flock(bucket_file, fcntl.LOCK_EX)
+            try:
+                bucket_file.seek(0)
+                content = bucket_file.read()
+                states = json.loads(content) if content else {}
+                state, result = func(states.get(key))
+                states[key] = state
+                bucket_file.seek(0)
+                bucket_file.truncate()
+                bucket_file.write(json.dumps(states))
+                bucket_file.flush()
+                return result
+            finally:
+                fcntl.flock(bucket_file, fcntl.LOCK_UN)
+
+
+def get_header(headers, name):
+    """Return header ``name`` as a float, or ``None``."""
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def get_retry_after(headers, now):
+    """Return date (POSIX timestamp) of ``Retry-After`` header, or
+    ``None``."""
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return now + float(value)
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter(object):
+    """Token bucket, with state in ``store``.
+
+    Bucket holds at most ``burst`` tokens, and is refilled with ``rate``
+    tokens per second. Every call takes one token. When bucket is empty,
+    callers wait for next token if ``block`` is true (at most ``max_wait``
+    seconds), else :class:`RateLimitExceeded` is raised.
+
+    Times are POSIX timestamps, so that buckets can be shared between hosts
+    with synchronized clocks.
+
+    """
+    def __init__(self, store, key, rate, burst=DEFAULT_RATE_LIMIT_BURST,
+                 block=True, max_wait=None):
+        self.store = store
+        self.key = key
+        #: Number of calls per second.
+        self.rate = rate
+        self.burst = burst
+        self.block = block
+        self.max_wait = max_wait
+
+    def refill(self, state, now):
+        """Return ``state`` of bucket, refilled until ``now``."""
+        if state is None:
+            return {'tokens': self.burst, 'updated': now, 'rate': self.rate,
+                    'rate_until': 0, 'blocked_until': 0}
+        state = dict(state)
+        rate = state['rate'] if now < state['rate_until'] else self.rate
+        elapsed = max(now - state['updated'], 0)
+        state['tokens'] = min(self.burst, state['tokens'] + elapsed * rate)
+        state['updated'] = now
+        return state
+
+    def take(self, now, state):
+        state = self.refill(state, now)
+        rate = state['rate'] if now < state['rate_until'] else self.rate
+        wait = max((1 - state['tokens']) / rate, state['blocked_until'] - now,
+                   0)
+        if wait > 0 and (not self.block or (self.max_wait is not None
+                                            and wait > self.max_wait)):
+            raise RateLimitExceeded(
+                'DocuSign rate limit exceeded: next call allowed in '
+                '{wait:.2f} seconds'.format(wait=wait), wait)
+        # Reserve the token, even if caller has to wait for it, so that
+        # waiting callers are served in turn.
+        state['tokens'] -= 1
+        return state, wait
+
+    def reserve(self):
+        """Take a token, return number of seconds to wait before the call.
+
+        Raise :class:`RateLimitExceeded` if caller may not wait.
+
+        """
+        return self.store.update(self.key,
+                                 functools.partial(self.take, time.time()))
+
+    def acquire(self):
+        """Take a token, wait for it if necessary."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def adapt(self, now, status_code, headers, state):
+        state = self.refill(state, now)
+        remaining = get_header(headers, 'X-RateLimit-Remaining')
+        reset = get_header(headers, 'X-RateLimit-Reset')
+        burst_remaining = get_header(headers, 'X-BurstLimit-Remaining')
+        if status_code == 429 or remaining == 0:
+            blocked_until = get_retry_after(headers, now) or reset \
+                or now + 1.0 / self.rate
+            state['blocked_until'] = max(state['blocked_until'],
+                                         blocked_until)
+            state['tokens'] = min(state['tokens'], 0)
+        elif remaining is not None and reset is not None and reset > now:
+            # Spread remaining quota until reset.
+            rate = remaining / (reset - now)
+            if rate < self.rate:
+                state['rate'] = rate
+                state['rate_until'] = reset
+            state['tokens'] = min(state['tokens'], remaining)
+        if burst_remaining is not None:
+            state['tokens'] = min(state['tokens'], burst_remaining)
+        return state, None
+
+    def observe(self, status_code, headers):
+        """Adapt bucket to ``headers`` of a DocuSign response."""
+        self.store.update(self.key, functools.partial(
+            self.adapt, time.time(), status_code, headers))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    """Return process-wide store of buckets.
+
+    Depends on ``settings.DOCUSIGN_RATE_LIMIT_STORE``:
+
+    * ``'local'`` (default): :class:`LocalBucketStore`.
+
+    * ``'cache'``: :class:`CacheBucketStore` using Django cache
+      ``settings.DOCUSIGN_RATE_LIMIT_CACHE_ALIAS`` (defaults to
+      ``'default'``).
+
+    * ``'file'``: :class:`FileBucketStore` using file
+      ``settings.DOCUSIGN_RATE_LIMIT_FILE``.
+
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                kind = getattr(settings, 'DOCUSIGN_RATE_LIMIT_STORE', 'local')
+                if kind == 'local':
+                    _store = LocalBucketStore()
+                elif kind == 'cache':
+                    _store = CacheBucketStore(getattr(
+                        settings, 'DOCUSIGN_RATE_LIMIT_CACHE_ALIAS',
+                        'default'))
+                elif kind == 'file':
+                    _store = FileBucketStore(settings.DOCUSIGN_RATE_LIMIT_FILE)
+                else:
+                    raise ValueError(
+                        'Invalid value for settings.DOCUSIGN_RATE_LIMIT_STORE:'
+                        ' {kind!r}'.format(kind=kind))
+    return _store
+
+
+def get_rate_limiter(key):
+    """Return :class:`RateLimiter` for bucket ``key``, or ``None`` if
+    ``settings.DOCUSIGN_RATE_LIMIT`` (calls per second) is not set.
+
+    Limiter is configured with ``settings.DOCUSIGN_RATE_LIMIT_BURST``,
+    ``settings.DOCUSIGN_RATE_LIMIT_BLOCK`` (defaults to ``True``) and
+    ``settings.DOCUSIGN_RATE_LIMIT_MAX_WAIT`` (defaults to ``None``, i.e.
+    wait as long as necessary).
+
+    """
+    rate = getattr(settings, 'DOCUSIGN_RATE_LIMIT', None)
+    if not rate:
+        return None
+    return RateLimiter(
+        get_bucket_store(),
+        key='docusign:rate-limit:{key}'.format(key=key),
+        rate=rate,
+        burst=getattr(settings, 'DOCUSIGN_RATE_LIMIT_BURST',
+                      DEFAULT_RATE_LIMIT_BURST),
+        block=getattr(settings, 'DOCUSIGN_RATE_LIMIT_BLOCK', True),
+        max_wait=getattr(settings, 'DOCUSIGN_RATE_LIMIT_MAX_WAIT', None),
+    )
+
+
+def reset_bucket_store():
+    """Drop process-wide store of buckets. Typically used in tests."""
+    global _store
+    with _store_lock:
+        _store = None
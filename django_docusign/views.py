@@ -1,16 +1,58 @@
 from __future__ import unicode_literals
 
+import asyncio
+import functools
+from contextlib import closing
+import hashlib
+import logging
+import tempfile
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.views.generic.base import RedirectView
+from django.http import (HttpResponse, HttpResponseBadRequest,
+                         HttpResponseForbidden, HttpResponseGone,
+                         HttpResponsePermanentRedirect, HttpResponseRedirect)
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic.base import RedirectView, View
 from django.views.generic.detail import SingleObjectMixin
 from django_anysign import api as django_anysign
 
+from django_docusign.connect import (ConnectHMAC, ConnectJSONParser,
+                                     ConnectPayloadError, ConnectXMLParser,
+                                     is_outdated)
+from django_docusign.documents import (SpooledDocument, get_chunk_size,
+                                       spool_document)
+from django_docusign.tasks import get_task_runner
+
+try:
+    from asgiref.sync import sync_to_async
+except ImportError:  # Django < 3.0 does not depend on asgiref.
+    sync_to_async = None
+
+#: Default number of seconds idempotency keys are kept.
+DEFAULT_IDEMPOTENCY_TIMEOUT = 86400
+
+#: Default number of seconds idempotency keys are kept until the task
+#: succeeds.
+DEFAULT_IDEMPOTENCY_PENDING_TIMEOUT = 600
+
+logger = logging.getLogger(__name__)
+
 
 class SignerReturnView(SingleObjectMixin, RedirectView):
     """Handle return of signer on project after document signing/reject.
     """
     permanent = False
 
+    #: Whether to download signed document in the background, see
+    #: :meth:`defer_signer_signed`.
+    defer_signed_document = False
+
     def get_queryset(self):
         model = django_anysign.get_signer_model()
         return model.objects.all()
@@ -123,9 +165,18 @@ class SignerReturnView(SingleObjectMixin, RedirectView):
         raise NotImplementedError()
 
     def get_signed_document(self):
+        """Return signed document, as a
+        :class:`~django_docusign.documents.SpooledDocument`."""
         # In our model, there is only one doc.
         backend = self.signature_backend
-        return next(backend.get_docusign_documents(self.signature))
+        # Close generator, so that pending downloads are dropped.
+        with closing(backend.get_docusign_documents(self.signature)) \
+                as documents:
+            document = next(documents)
+        if not isinstance(document, SpooledDocument):
+            # Backends which yield streams.
+            document = spool_document(document)
+        return document
 
     def replace_document(self, signed_document):
         """Replace original document by signed one."""
@@ -139,15 +190,119 @@ class SignerReturnView(SingleObjectMixin, RedirectView):
     def signer_signed(self):
         """Handle 'Completed' status for signer.
         """
+        if self.defer_signed_document:
+            return self.defer_signer_signed()
         backend = self.signature_backend
         is_last_signer = backend.is_last_signer(self.get_object())
         # download signed document out of the atomic block
         signed_document = self.get_signed_document()
-        with transaction.atomic():
-            self.replace_document(signed_document)
-            self.update_signer(status='completed')
-            if is_last_signer:
-                self.signature_completed()
+        self.signer_completed(signed_document, is_last_signer)
+
+    def signer_completed(self, signed_document, is_last_signer):
+        """Replace document and update statuses, once signed document has
+        been downloaded. ``signed_document`` is closed."""
+        try:
+            with transaction.atomic():
+                self.replace_document(signed_document)
+                self.update_signer(status='completed')
+                if is_last_signer:
+                    self.signature_completed()
+        finally:
+            signed_document.close()
+
+    def get_idempotency_key(self):
+        """Return key identifying retrieval of signed document."""
+        return 'docusign:signed-document:{envelope_id}:{signer_id}'.format(
+            envelope_id=self.signature.signature_backend_id,
+            signer_id=self.get_object().pk)
+
+    def get_idempotency_cache(self):
+        """Return Django cache where idempotency keys are stored.
+
+        Default is ``settings.DOCUSIGN_IDEMPOTENCY_CACHE_ALIAS``, i.e.
+        ``'default'``. Use a cache shared by all processes.
+
+        """
+        return caches[getattr(settings, 'DOCUSIGN_IDEMPOTENCY_CACHE_ALIAS',
+                              'default')]
+
+    def defer_signer_signed(self):
+        """Handle 'Completed' status for signer, downloading signed document
+        in the background.
+
+        Signer's status is updated right now, then :meth:`signed_document_task`
+        is scheduled with task runner, once transaction is committed. If
+        signed document has already been scheduled (e.g. signer reloaded the
+        page), nothing happens.
+
+        Idempotency key is claimed in the transaction, and released if the
+        transaction fails, if the task cannot be scheduled (e.g. broker is
+        down) or if the task fails. Until the task succeeds, it expires after
+        ``settings.DOCUSIGN_IDEMPOTENCY_PENDING_TIMEOUT`` seconds, so that
+        signers can retry if the task is lost (e.g. process died).
+
+        """
+        backend = self.signature_backend
+        is_last_signer = backend.is_last_signer(self.get_object())
+        key = self.get_idempotency_key()
+        cache = self.get_idempotency_cache()
+        timeout = getattr(settings, 'DOCUSIGN_IDEMPOTENCY_PENDING_TIMEOUT',
+                          DEFAULT_IDEMPOTENCY_PENDING_TIMEOUT)
+        claimed = False
+
+        def schedule():
+            try:
+                self.schedule_signed_document_task(key, is_last_signer)
+            except Exception:
+                cache.delete(key)
+                raise
+
+        try:
+            with transaction.atomic():
+                claimed = cache.add(key, 'pending', timeout)
+                if not claimed:
+                    return
+                self.update_signer(status='completed')
+                transaction.on_commit(schedule)
+        except Exception:
+            if claimed:
+                cache.delete(key)
+            raise
+
+    def schedule_signed_document_task(self, key, is_last_signer):
+        """Send :meth:`signed_document_task` to task runner.
+
+        Default implementation passes bound method to task runner, which
+        suits runners working in current process, such as the default
+        :class:`~django_docusign.tasks.ThreadPoolTaskRunner`. Override it to
+        send a serializable task to remote runners such as Celery: the remote
+        task has to release idempotency ``key`` when it fails, as
+        :meth:`signed_document_task` does.
+
+        """
+        get_task_runner().apply_async(self.signed_document_task,
+                                      args=(key, is_last_signer),
+                                      task_id=key)
+
+    def signed_document_task(self, key, is_last_signer):
+        """Download signed document, replace document and complete signature.
+
+        On failure, idempotency ``key`` is released, so that next return of
+        signer tries again.
+
+        """
+        try:
+            with self.get_signed_document() as signed_document:
+                with transaction.atomic():
+                    self.replace_document(signed_document)
+                    if is_last_signer:
+                        self.signature_completed()
+        except Exception:
+            self.get_idempotency_cache().delete(key)
+            raise
+        self.get_idempotency_cache().set(
+            key, 'done', getattr(settings, 'DOCUSIGN_IDEMPOTENCY_TIMEOUT',
+                                 DEFAULT_IDEMPOTENCY_TIMEOUT))
 
     def signer_authenticationfailed(self):
         """Handle 'AuthenticationFailed' status for signer."""
@@ -156,3 +311,380 @@ class SignerReturnView(SingleObjectMixin, RedirectView):
     def signer_autoresponded(self):
         """Handle 'AutoResponded' status for signer."""
         self.update_signer(status='auto_responded')
+
+
+class AsyncSignerReturnView(SignerReturnView):
+    """Asynchronous :class:`SignerReturnView`, for ASGI deployments.
+
+    Calls to DocuSign API are awaited, using signature backend's ``async``
+    methods if available (see
+    :class:`~django_docusign.async_backend.AsyncDocuSignBackend`).
+    Database operations, including ``signer_*`` and ``update_*`` hooks, are
+    run with ``sync_to_async``: hooks are the same as in
+    :class:`SignerReturnView`.
+
+    Requires `asgiref`_ (installed with Django >= 3.0), see ``async``
+    extra.
+
+    .. _`asgiref`: https://pypi.org/project/asgiref/
+
+    """
+    http_method_names = ['get', 'head', 'options']
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        """Return coroutine function, so that Django runs view in event loop.
+        """
+        if sync_to_async is None:
+            raise ImportError('AsyncSignerReturnView requires asgiref.')
+        view = super(AsyncSignerReturnView, cls).as_view(**initkwargs)
+        if asyncio.iscoroutinefunction(view):
+            return view
+
+        async def async_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            # Synchronous handlers, e.g. ``http_method_not_allowed``, return
+            # responses.
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        functools.update_wrapper(async_view, view)
+        return async_view
+
+    async def get(self, request, *args, **kwargs):
+        url = await self.aget_redirect_url(*args, **kwargs)
+        if url:
+            if self.permanent:
+                return HttpResponsePermanentRedirect(url)
+            else:
+                return HttpResponseRedirect(url)
+        return HttpResponseGone()
+
+    async def head(self, request, *args, **kwargs):
+        return await self.get(request, *args, **kwargs)
+
+    async def aget_docusign_recipient(self, signer):
+        """Return recipient (dict) matching ``signer``."""
+        backend = self.signature_backend
+        try:
+            aget_docusign_recipient = backend.aget_docusign_recipient
+        except AttributeError:
+            aget_docusign_recipient = sync_to_async(
+                backend.get_docusign_recipient)
+        return await aget_docusign_recipient(signer)
+
+    async def aget_redirect_url(self, *args, **kwargs):
+        """Async version of :meth:`get_redirect_url`."""
+        signer = await sync_to_async(self.get_object)()
+
+        docusign_event = self.request.GET.get('event')
+        if docusign_event == 'cancel':
+            return self.get_signer_canceled_url(docusign_event, '')
+
+        # get signer infos on docusign side
+        await sync_to_async(getattr)(self, 'signature_backend')
+        recipient = await self.aget_docusign_recipient(signer)
+        status = self.get_recipient_status(recipient)
+
+        if status == 'authentication_failed':
+            await sync_to_async(self.signer_authenticationfailed)()
+            return self.get_signer_error_url(docusign_event, status)
+
+        if status == 'auto_responded':
+            await sync_to_async(self.signer_autoresponded)()
+            return self.get_signer_error_url(docusign_event, status)
+
+        if status == 'completed':
+            await self.asigner_signed()
+            return self.get_signer_signed_url(docusign_event, status)
+
+        if status == 'declined':
+            decline_message = recipient['declinedReason']
+            await sync_to_async(self.signer_declined)(decline_message)
+            return self.get_signer_declined_url(docusign_event, status)
+
+        # other status: redirect to canceled page as if action was canceled
+        return self.get_signer_canceled_url(docusign_event, status)
+
+    async def aget_signed_document(self):
+        """Async version of :meth:`get_signed_document`."""
+        backend = self.signature_backend
+        signature = await sync_to_async(getattr)(self, 'signature')
+        try:
+            documents = backend.aget_docusign_documents(signature)
+        except AttributeError:
+            return await sync_to_async(self.get_signed_document)()
+        try:
+            return await documents.__anext__()
+        finally:
+            await documents.aclose()
+
+    async def asigner_signed(self):
+        """Async version of :meth:`signer_signed`."""
+        if self.defer_signed_document:
+            return await sync_to_async(self.defer_signer_signed)()
+        backend = self.signature_backend
+        signer = await sync_to_async(self.get_object)()
+        is_last_signer = await sync_to_async(backend.is_last_signer)(signer)
+        # download signed document out of the atomic block
+        signed_document = await self.aget_signed_document()
+        await sync_to_async(self.signer_completed)(signed_document,
+                                                   is_last_signer)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class DocuSignConnectView(View):
+    """Receive DocuSign Connect notifications (webhook).
+
+    Payload, XML or JSON, is read by chunks into a temporary file, and
+    authenticated with HMAC signatures (``X-DocuSign-Signature-*`` headers),
+    using keys in ``settings.DOCUSIGN_CONNECT_HMAC_KEYS``. It is parsed only
+    once authenticated. Payloads larger than :meth:`get_max_size` are
+    rejected with "413 Payload Too Large".
+
+    Statuses of the envelope's recipients are passed, at once, to
+    :meth:`update_signers`, then envelope's status is passed to
+    :meth:`update_signature`, in a single transaction. DocuSign does not
+    guarantee the order of notifications: statuses older than the ones
+    returned by :meth:`get_signer_status` and :meth:`get_signature_status`
+    (a delayed "sent" after "completed") are ignored.
+
+    """
+    http_method_names = ['post']
+
+    #: Whether to reject notifications without valid HMAC signature.
+    verify_hmac = True
+
+    def get_hmac_keys(self):
+        """Return list of secret keys used to sign notifications."""
+        return getattr(settings, 'DOCUSIGN_CONNECT_HMAC_KEYS', [])
+
+    def get_hmac_signatures(self):
+        """Return list of signatures sent by DocuSign."""
+        return [value for key, value in sorted(self.request.headers.items())
+                if key.lower().startswith('x-docusign-signature-')]
+
+    def get_max_size(self):
+        """Return maximum size of payloads, in bytes, or ``None``.
+
+        Default is ``settings.DOCUSIGN_CONNECT_MAX_SIZE``, which defaults to
+        ``settings.DATA_UPLOAD_MAX_MEMORY_SIZE``.
+
+        """
+        return getattr(settings, 'DOCUSIGN_CONNECT_MAX_SIZE',
+                       settings.DATA_UPLOAD_MAX_MEMORY_SIZE)
+
+    def get_parser(self):
+        """Return payload parser, depending on content type."""
+        if self.request.content_type == 'application/json':
+            return ConnectJSONParser()
+        return ConnectXMLParser()
+
+    def post(self, request, *args, **kwargs):
+        max_size = self.get_max_size()
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return HttpResponseBadRequest()
+        if max_size is not None and content_length > max_size:
+            return HttpResponse(status=413)
+        digest = ConnectHMAC(self.get_hmac_keys()) if self.verify_hmac \
+            else None
+        chunk_size = get_chunk_size()
+        with tempfile.SpooledTemporaryFile(max_size=chunk_size) as payload:
+            size = 0
+            while True:
+                chunk = request.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    return HttpResponse(status=413)
+                if digest is not None:
+                    digest.update(chunk)
+                payload.write(chunk)
+            if digest is not None and \
+                    not digest.verify(self.get_hmac_signatures()):
+                logger.warning('DocuSign Connect notification with invalid '
+                               'HMAC')
+                return HttpResponseForbidden()
+            payload.seek(0)
+            parser = self.get_parser()
+            try:
+                for chunk in iter(lambda: payload.read(chunk_size), b''):
+                    parser.feed(chunk)
+                envelope = parser.close()
+            except ConnectPayloadError as exception:
+                logger.warning('Invalid DocuSign Connect payload: %s',
+                               exception)
+                return HttpResponseBadRequest()
+        self.handle_envelope(envelope)
+        return HttpResponse()
+
+    def get_signature(self, envelope_id):
+        """Return signature model instance for ``envelope_id``, or ``None``.
+        """
+        model = django_anysign.get_signature_model()
+        return model.objects.filter(signature_backend_id=envelope_id).first()
+
+    def get_signers(self, signature, client_user_ids):
+        """Return dictionary of ``signature``'s signers, by
+        ``clientUserId``.
+
+        ``clientUserId`` values which are not primary keys of signers (set by
+        another application on the same account) are ignored.
+
+        """
+        pk_field = signature.signers.model._meta.pk
+        ids = []
+        for client_user_id in client_user_ids:
+            if not client_user_id:
+                continue
+            try:
+                ids.append(pk_field.to_python(client_user_id))
+            except ValidationError:
+                continue
+        return {str(pk): signer
+                for pk, signer in signature.signers.in_bulk(ids).items()}
+
+    def get_signature_status(self, signature):
+        """Return current status of ``signature``, or ``None`` if unknown.
+        """
+        return getattr(signature, 'status', None)
+
+    def get_signer_status(self, signer):
+        """Return current status of ``signer``, or ``None`` if unknown."""
+        return getattr(signer, 'status', None)
+
+    def handle_envelope(self, envelope):
+        """Apply statuses of ``envelope`` (dictionary) to models."""
+        signature = self.get_signature(envelope['envelopeId'])
+        if signature is None:
+            logger.info('DocuSign Connect notification for unknown envelope '
+                        '%s', envelope['envelopeId'])
+            return
+        recipients = envelope['recipients']
+        signers = self.get_signers(
+            signature, [recipient['clientUserId'] for recipient in recipients])
+        updates = [(signers[recipient['clientUserId']], recipient)
+                   for recipient in recipients
+                   if recipient['clientUserId'] in signers]
+        updates = [(signer, recipient) for signer, recipient in updates
+                   if not is_outdated(recipient['status'],
+                                      self.get_signer_status(signer))]
+        status = envelope['status']
+        if status and is_outdated(status,
+                                  self.get_signature_status(signature)):
+            logger.info('Outdated DocuSign Connect notification for envelope '
+                        '%s: %s', envelope['envelopeId'], status)
+            status = None
+        with transaction.atomic():
+            if updates:
+                self.update_signers(signature, updates)
+            if status:
+                self.update_signature(signature, status)
+        # Recipients changed on DocuSign side.
+        signature.signature_backend.invalidate_recipients(
+            envelope['envelopeId'])
+        if envelope['status'] == 'completed':
+            signature.signature_backend.mark_envelope_completed(
+                envelope['envelopeId'], envelope.get('completedDateTime'))
+
+    def update_signers(self, signature, updates):
+        """Update signers of ``signature``.
+
+        ``updates`` is a list of ``(signer, recipient)``, where recipient is
+        a dictionary with ``status`` and ``declinedReason`` items. Default
+        implementation calls :meth:`update_signer` for each signer: override
+        it to update every signer with one query.
+
+        """
+        for signer, recipient in updates:
+            self.update_signer(signer, recipient['status'],
+                               recipient.get('declinedReason') or '')
+
+    def update_signer(self, signer, status, message=''):
+        """Update ``signer`` with ``status``."""
+        raise NotImplementedError()
+
+    def update_signature(self, signature, status):
+        """Update ``signature`` with ``status``."""
+        raise NotImplementedError()
+
+
+class PageImageView(SingleObjectMixin, View):
+    """Serve PNG image of a page of a signature's document.
+
+    URL captures signature's ``pk``, ``document_id`` and ``page_no``. Query
+    string may set ``dpi``, ``max_width`` and ``max_height``.
+
+    Responses have ``ETag`` (and, once envelope is completed,
+    ``Last-Modified``) headers, so that conditional requests of browsers
+    get "304 Not Modified". Images of completed envelopes are not even
+    fetched, see
+    :meth:`~django_docusign.backend.DocuSignBackend.get_page_image_validators`.
+
+    .. warning::
+
+       Override :meth:`get_queryset` to restrict signatures to the ones
+       current user may see.
+
+    """
+    http_method_names = ['get', 'head']
+
+    #: Number of seconds browsers may use an image without asking again.
+    max_age = 0
+
+    #: Image options read from query string.
+    image_options = ('dpi', 'max_width', 'max_height')
+
+    def get_queryset(self):
+        model = django_anysign.get_signature_model()
+        return model.objects.all()
+
+    def get_image_options(self):
+        """Return keyword arguments for
+        :meth:`~django_docusign.backend.DocuSignBackend.get_page_image`.
+
+        Raise :class:`ValueError` for invalid values.
+
+        """
+        options = {}
+        for name in self.image_options:
+            value = self.request.GET.get(name)
+            if value:
+                options[name] = int(value)
+        return options
+
+    def get_signature_backend(self, signature):
+        """Return signature backend instance."""
+        return signature.signature_backend
+
+    def get(self, request, *args, **kwargs):
+        signature = self.get_object()
+        backend = self.get_signature_backend(signature)
+        try:
+            options = self.get_image_options()
+        except ValueError:
+            return HttpResponseBadRequest()
+        image_args = (signature, kwargs['document_id'], kwargs['page_no'])
+        validators = backend.get_page_image_validators(*image_args,
+                                                       **options)
+        image = None
+        if not validators:
+            image = backend.get_page_image(*image_args, **options)
+            validators = {'etag': '"{digest}"'.format(
+                digest=hashlib.sha256(image).hexdigest())}
+        response = get_conditional_response(
+            request, etag=validators['etag'],
+            last_modified=validators.get('last_modified'))
+        if response is None:
+            if image is None:
+                image = backend.get_page_image(*image_args, **options)
+            response = HttpResponse(image, content_type='image/png')
+        response['ETag'] = validators['etag']
+        if validators.get('last_modified'):
+            response['Last-Modified'] = http_date(validators['last_modified'])
+        patch_cache_control(response, private=True, max_age=self.max_age)
+        return response
@@ -54,7 +54,11 @@ KEYWORDS = [
     'pydocusign',
     'django-anysign',
 ]
-PACKAGES = [NAME.replace('-', '_')]
+PACKAGES = [
+    NAME.replace('-', '_'),
+    '{}.management'.format(NAME.replace('-', '_')),
+    '{}.management.commands'.format(NAME.replace('-', '_')),
+]
 REQUIREMENTS = [
     'Django>=2.2.27,<3.3',
     'django-anysign>=1.2,<2.0',
@@ -70,6 +74,8 @@ if IS_PYTHON2:
     ])
 CMDCLASS = {'test': Tox}
 EXTRA_REQUIREMENTS = {
+    'async': ['asgiref', 'httpx'],
+    'jwt': ['PyJWT[crypto]'],
     'test': TEST_REQUIREMENTS,
 }
 